@@ -0,0 +1,130 @@
+"""
+上传大目录期间 /search/ 的延迟基准测试。
+
+把应用目录复制到临时目录（不影响真实数据），使用NumPy向量存储启动服务，
+在 /upload-directory/ 导入大量文档的同时每隔一段时间请求一次 /search/，统计搜索延迟的p50/p99/最大值。
+
+用法（需要 httpx，FastAPI的TestClient已依赖它）：
+    python benchmarks/search_latency.py [应用目录]
+
+对比修改前后：把旧版本检出到另一个目录，分别运行
+    git worktree add /tmp/before <提交>
+    python benchmarks/search_latency.py "/tmp/before/<应用目录>"
+    python benchmarks/search_latency.py
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在复制的应用目录中启动服务的脚本
+LAUNCHER = """
+import config
+config.VECTOR_STORE_BACKEND = "numpy"
+import uvicorn, main
+uvicorn.run(main.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def make_files(n_files: int, n_questions: int):
+    """n_files 个文件，每个文件 n_questions 道题；每个文件的内容不同，不会被按内容去重跳过"""
+    files = []
+    for n in range(n_files):
+        questions = [{
+            "id": i, "type": "choice",
+            "content": f"函数f(x)在区间上的单调性第{n}套第{i}题，设函数满足条件" * 3,
+            "options": ["A. 1", "B. 2", "C. 3", "D. 4"],
+            "knowledge_points": ["函数"]
+        } for i in range(n_questions)]
+        payload = json.dumps(questions, ensure_ascii=False).encode("utf-8")
+        files.append(("files", (f"bench/{n}.json", payload, "application/json")))
+    return files
+
+
+async def measure(base_url: str, files, interval: float):
+    async with httpx.AsyncClient(timeout=600) as client:
+        latencies = []
+        done = asyncio.Event()
+
+        async def upload():
+            start = time.perf_counter()
+            response = await client.post(f"{base_url}/upload-directory/", files=files)
+            done.set()
+            return response.status_code, time.perf_counter() - start
+
+        async def search():
+            await asyncio.sleep(0.05)
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get(f"{base_url}/search/", params={"keyword": "复数", "limit": 3})
+                latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(interval)
+
+        (status, upload_time), _ = await asyncio.gather(upload(), search())
+        return status, upload_time, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上传大目录期间 /search/ 的延迟")
+    parser.add_argument("app_dir", nargs="?", default=APP_DIR, help="应用目录（包含main.py）")
+    parser.add_argument("--files", type=int, default=40, help="上传的文件数")
+    parser.add_argument("--questions", type=int, default=400, help="每个文件的题目数")
+    parser.add_argument("--interval", type=float, default=0.01, help="两次搜索之间的间隔（秒）")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    app_dir = os.path.join(work, "app")
+    shutil.copytree(args.app_dir, app_dir, ignore=shutil.ignore_patterns("__pycache__", "benchmarks", "tests"))
+    port = free_port()
+    with open(os.path.join(app_dir, "_bench_server.py"), "w", encoding="utf-8") as f:
+        f.write(LAUNCHER.format(port=port))
+    server = subprocess.Popen([sys.executable, "_bench_server.py"], cwd=app_dir,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(150):
+            try:
+                httpx.get(f"{base_url}/subjects/")
+                break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        else:
+            raise RuntimeError("服务启动失败")
+
+        status, upload_time, latencies = asyncio.run(
+            measure(base_url, make_files(args.files, args.questions), args.interval)
+        )
+        if not latencies:
+            raise RuntimeError("上传期间没有完成任何搜索")
+        print(f"上传 {args.files} 个文件 x {args.questions} 道题: 状态码 {status}，耗时 {upload_time:.2f} s")
+        print(f"/search/ 共 {len(latencies)} 次: p50 {percentile(latencies, 0.5):.1f} ms, "
+              f"p99 {percentile(latencies, 0.99):.1f} ms, 最大 {max(latencies):.1f} ms")
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+错题文档元数据目录。
+
+文档的学科、大小、创建时间和预览内容在入库时写入SQLite，
+/documents/ 列表直接分页查询目录，不再逐个解析存储目录中的文件。
+
+目录同时记录每个文档的内容哈希（内容相同的上传直接对应已有文档），内容与已有文档重复的文档及其版本
+（启动时不再重复解析），以及 /upload-history/ 同步过的来源文件和版本（未变化的来源直接跳过）。
+"""
+import os
+import json
+import hashlib
+import base64
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from search_index import subject_from_filename
+
+logger = logging.getLogger(__name__)
+
+
+def build_preview(json_data: Union[Dict, List]) -> str:
+    """生成文档的预览内容（第一道题的题干或第一个非空值，截取前100个字符）"""
+    preview = ""
+    if isinstance(json_data, list) and len(json_data) > 0:
+        first_item = json_data[0]
+        if isinstance(first_item, dict):
+            # 尝试获取内容字段
+            for field in ['content', 'question', 'title', 'description']:
+                if field in first_item and first_item[field]:
+                    preview = str(first_item[field])[:100] + '...'
+                    break
+            # 如果没有找到特定字段，使用第一个非空值
+            if not preview and first_item:
+                for value in first_item.values():
+                    if value:
+                        preview = str(value)[:100] + '...'
+                        break
+    elif isinstance(json_data, dict):
+        values = list(json_data.values())
+        if values:
+            preview = str(values[0])[:100] + '...'
+    return preview
+
+
+def content_hash(json_data: Any) -> str:
+    """文档内容的SHA-256，键排序后的紧凑JSON，格式和键顺序不同的相同内容得到相同的哈希"""
+    canonical = json.dumps(json_data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def doc_id_from_filename(file_name: str) -> str:
+    """从文件名中提取文档ID，支持学科_ID格式(math_1.json)和数字序号格式(1.json)"""
+    if '_' in file_name:
+        file_name = file_name.split('_', 1)[1]
+    return file_name.split('.')[0]  # 去掉.json后缀
+
+
+def encode_token(value: Any) -> str:
+    """把可以JSON序列化的翻页状态编码为不透明的游标字符串"""
+    raw = json.dumps(value, ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_token(token: str) -> Any:
+    """解析 encode_token 生成的游标，格式错误时抛出ValueError"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except Exception:
+        raise ValueError(f"无效的游标: {token}")
+
+
+def encode_cursor(created: float, file_name: str) -> str:
+    """把最后一条记录的排序键编码为不透明的游标"""
+    return encode_token([created, file_name])
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """解析游标，格式错误时抛出ValueError"""
+    try:
+        created, file_name = decode_token(cursor)
+        return float(created), str(file_name)
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的游标: {cursor}")
+
+
+class DocumentCatalog:
+    """基于SQLite的文档元数据目录，按 (创建时间, 文件名) 倒序做游标分页"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    file_name TEXT PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    preview TEXT NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_documents_created ON documents (created DESC, file_name DESC)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_documents_subject ON documents (subject, created DESC, file_name DESC)"
+            )
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS content_hashes (
+                    hash TEXT PRIMARY KEY,
+                    file_name TEXT NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_content_hashes_file ON content_hashes (file_name)"
+            )
+            # 内容哈希已登记到其他文档的文档，按存储版本校验，文档变化后重新计算哈希
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS duplicate_contents (
+                    file_name TEXT PRIMARY KEY,
+                    hash TEXT NOT NULL,
+                    version TEXT NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_duplicate_contents_hash ON duplicate_contents (hash)"
+            )
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_sources (
+                    source TEXT PRIMARY KEY,
+                    version TEXT NOT NULL,
+                    file_name TEXT NOT NULL
+                )
+            """)
+
+    def upsert(self, file_name: str, subject: str, size: int, created: float, preview: str):
+        """写入或更新一个文档的元数据"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (file_name, doc_id, subject, size, created, preview) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (file_name, doc_id_from_filename(file_name), subject, size, created, preview)
+            )
+
+    def remove(self, file_name: str):
+        """删除一个文档的元数据"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documents WHERE file_name = ?", (file_name,))
+            self._forget_duplicates_of(file_name)
+            self._conn.execute("DELETE FROM content_hashes WHERE file_name = ?", (file_name,))
+            self._conn.execute("DELETE FROM duplicate_contents WHERE file_name = ?", (file_name,))
+
+    def _forget_duplicates_of(self, file_name: str, digest: Optional[str] = None):
+        """文档不再持有内容哈希时，删除与它重复的文档记录，下一次同步时由其中一个文档重新登记哈希"""
+        if digest is None:
+            self._conn.execute(
+                "DELETE FROM duplicate_contents WHERE hash IN (SELECT hash FROM content_hashes WHERE file_name = ?)",
+                (file_name,)
+            )
+        else:
+            self._conn.execute(
+                "DELETE FROM duplicate_contents WHERE hash = ? AND EXISTS "
+                "(SELECT 1 FROM content_hashes WHERE hash = ? AND file_name = ?)",
+                (digest, digest, file_name)
+            )
+
+    def clear(self):
+        """清空目录"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.execute("DELETE FROM content_hashes")
+            self._conn.execute("DELETE FROM duplicate_contents")
+            self._conn.execute("DELETE FROM sync_sources")
+
+    def find_by_hash(self, digest: str) -> Optional[str]:
+        """返回内容哈希对应的文档名，没有时返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT file_name FROM content_hashes WHERE hash = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def claim_hash(self, digest: str, file_name: str) -> str:
+        """
+        把内容哈希登记到 file_name，哈希已被其他文档登记时不修改
+        返回最终登记的文档名，与 file_name 不同说明相同内容已经（或正在被并发请求）保存
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO content_hashes (hash, file_name) VALUES (?, ?)", (digest, file_name)
+            )
+            return self._conn.execute("SELECT file_name FROM content_hashes WHERE hash = ?", (digest,)).fetchone()[0]
+
+    def release_hash(self, digest: str, file_name: str):
+        """取消登记（保存失败或登记的文档已不存在时调用）"""
+        with self._lock, self._conn:
+            self._forget_duplicates_of(file_name, digest)
+            self._conn.execute("DELETE FROM content_hashes WHERE hash = ? AND file_name = ?", (digest, file_name))
+
+    def record_duplicate(self, file_name: str, digest: str, version: str):
+        """记录文档的内容与已登记哈希的其他文档重复，version 是文档在存储中的版本"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO duplicate_contents (file_name, hash, version) VALUES (?, ?, ?)",
+                (file_name, digest, version)
+            )
+
+    def forget_duplicate(self, file_name: str):
+        """文档已经登记了自己的内容哈希，删除重复记录"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM duplicate_contents WHERE file_name = ?", (file_name,))
+
+    def sync_sources(self, prefix: str = "") -> Dict[str, Tuple[str, str]]:
+        """返回已同步的来源：来源标识 -> (来源版本, 对应的文档名)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source, version, file_name FROM sync_sources WHERE source >= ? AND source < ?",
+                (prefix, prefix + "\uffff")
+            ).fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def record_sync_source(self, source: str, version: str, file_name: str):
+        """记录来源文件已同步到 file_name"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_sources (source, version, file_name) VALUES (?, ?, ?)",
+                (source, version, file_name)
+            )
+
+    def remove_sync_sources(self, sources: List[str]):
+        """删除已不存在的来源记录"""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM sync_sources WHERE source = ?", [(source,) for source in sources])
+
+    def count(self, subject: Optional[str] = None) -> int:
+        """文档总数，可按学科筛选"""
+        with self._lock:
+            if subject:
+                row = self._conn.execute("SELECT COUNT(*) FROM documents WHERE subject = ?", (subject,)).fetchone()
+            else:
+                row = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()
+        return row[0]
+
+    def list_documents(self, limit: int, cursor: Optional[str] = None,
+                       subject: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按创建时间倒序分页列出文档
+        返回 (文档列表, 下一页游标)，没有更多数据时游标为None
+        """
+        conditions = []
+        params: List[Any] = []
+        if subject:
+            conditions.append("subject = ?")
+            params.append(subject)
+        if cursor:
+            created, file_name = decode_cursor(cursor)
+            conditions.append("(created < ? OR (created = ? AND file_name < ?))")
+            params.extend([created, created, file_name])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = (
+            f"SELECT file_name, doc_id, subject, size, created, preview FROM documents {where} "
+            f"ORDER BY created DESC, file_name DESC LIMIT ?"
+        )
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = [dict(row) for row in self._conn.execute(sql, params)]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created"], rows[-1]["file_name"])
+        return rows, next_cursor
+
+    def sync_store(self, store) -> int:
+        """
+        让目录与文档存储保持一致：补录目录中缺少的文档和内容哈希，删除已不存在的文档
+        只解析新增、还没有内容哈希，或记录为重复但版本已变化的文档，返回补录的文档数量
+        """
+        stored = set(store.names())
+        with self._lock:
+            recorded = {row[0] for row in self._conn.execute(
+                "SELECT file_name FROM documents UNION SELECT file_name FROM content_hashes "
+                "UNION SELECT file_name FROM duplicate_contents"
+            )}
+        removed = recorded - stored
+        for file_name in removed:
+            self.remove(file_name)
+
+        # 删除文档时与它重复的文档记录也会被删除，删除之后再读取
+        with self._lock:
+            known = {row[0] for row in self._conn.execute("SELECT file_name FROM documents")}
+            hashed = {row[0] for row in self._conn.execute("SELECT file_name FROM content_hashes")}
+            duplicates = dict(self._conn.execute("SELECT file_name, version FROM duplicate_contents").fetchall())
+
+        added = 0
+        for file_name in sorted(stored - (known & hashed)):
+            try:
+                version = json.dumps(store.version(file_name))
+                if file_name in known and duplicates.get(file_name) == version:
+                    # 已知的重复内容，文档没有变化
+                    continue
+                json_data = store.get(file_name)
+                if file_name not in known:
+                    size, created = store.stat(file_name)
+                    self.upsert(
+                        file_name,
+                        subject_from_filename(file_name),
+                        size,
+                        created,
+                        build_preview(json_data)
+                    )
+                    added += 1
+                if file_name not in hashed:
+                    # 已有语料中的重复内容保留第一个文档，其余文档记录为重复
+                    digest = content_hash(json_data)
+                    if self.claim_hash(digest, file_name) != file_name:
+                        self.record_duplicate(file_name, digest, version)
+                    elif file_name in duplicates:
+                        self.forget_duplicate(file_name)
+            except Exception as e:
+                logger.error(f"补录文档目录时处理文档 {file_name} 出错: {str(e)}")
+
+        logger.info(f"文档目录同步完成，补录 {added} 个文档，删除 {len(removed)} 条失效记录")
+        return added
@@ -9,5 +9,90 @@ MILVUS_PORT = "19530"
 # Collection settings
 COLLECTION_NAME = "wrong_doc"
 
+# Vector store settings
+VECTOR_STORE_BACKEND = "milvus"  # "milvus" 使用Milvus服务器，"numpy" 使用进程内NumPy向量存储
+NUMPY_STORE_PATH = "vector_store/wrong_doc"  # NumPy向量存储的文件前缀（生成 .npy/.json 快照和追加写入的 .log.bin/.log.jsonl 日志）
+NUMPY_INDEX_TYPE = "IVF_FLAT"  # "IVF_FLAT" 或 "FLAT"（暴力搜索）
+NUMPY_IVF_MIN_POINTS_PER_LIST = 39  # 平均每个簇至少有这么多向量时才训练IVF质心
+IVF_NLIST = 128  # IVF索引的簇数量
+IVF_NPROBE = 16  # 搜索时扫描的簇数量
+
+# Subject settings
+# 学科列表及其关键词（main.py 按关键词判断文档的学科）
+SUBJECTS = {
+    "math": ["数学", "math", "mathematics", "计算", "公式", "方程", "函数", "几何", "代数", "微积分", "三角", "概率", "统计"],
+    "english": ["英语", "english", "单词", "词汇", "语法", "阅读理解", "听力", "写作", "口语", "翻译", "外语"],
+    "chinese": ["语文", "chinese", "文言文", "古诗", "阅读", "写作", "作文", "诗词", "散文", "小说", "文学", "汉语"],
+    "physics": ["物理", "physics", "力学", "电学", "热学", "光学", "声学", "磁学", "能量", "功率", "速度", "加速度"],
+    "chemistry": ["化学", "chemistry", "元素", "分子", "原子", "化合物", "反应", "酸碱", "氧化", "还原"],
+    "biology": ["生物", "biology", "生命", "细胞", "基因", "遗传", "进化", "生态", "微生物", "植物", "动物", "人体"],
+    "history": ["历史", "history", "朝代", "年代", "事件", "人物", "战争", "革命", "文化", "政治史", "经济史"],
+    "geography": ["地理", "geography", "地形", "气候", "资源", "人口", "经济", "文化", "环境", "地图", "地球"],
+    "politics": ["政治", "politics", "思想", "制度", "法律", "道德", "社会", "民主", "权利", "义务", "公民"]
+}
+
 # Storage settings
-JSON_STORAGE_PATH = "wrong_docs"  # Directory to store JSON documents 
\ No newline at end of file
+JSON_STORAGE_PATH = "wrong_docs"  # Directory to store JSON documents 
+STUDENT_STORAGE_PATH = "students"  # 按学生划分的存储目录，每个学生一个子目录（文档和catalog.db）
+# Embedding settings
+EMBEDDING_BACKEND = "hashing"  # 本地哈希字符n-gram TF-IDF向量
+EMBEDDING_DIM = 128  # 必须与Milvus集合中embedding字段的维度一致
+EMBEDDING_NGRAM_RANGE = (1, 3)  # 字符n-gram范围
+EMBEDDING_IDF_PATH = "embedding_idf.npy"  # 可选的IDF权重文件，由 python embedding.py 生成
+
+# Milvus insert settings
+MILVUS_INSERT_BATCH_SIZE = 128  # 批量上传时每次插入Milvus的行数
+MILVUS_NUM_PARTITIONS = 64  # 以student_id为分区键时集合的分区数量（只在创建集合时生效）
+
+# Document catalog settings
+CATALOG_DB_PATH = "catalog.db"  # 文档元数据目录（SQLite）
+DOCUMENTS_PAGE_SIZE = 100  # /documents/ 每页默认返回的文档数量
+
+# Document ID allocation
+SEQUENCE_DB_PATH = "sequences.db"  # 按学科分配文档编号的持久化序列（main.py 和 exercise.py 共用）
+
+# File I/O settings
+FILE_IO_WORKERS = 8  # 接口中文件读写、SQLite和向量存储调用使用的线程池大小
+
+# Upload settings
+UPLOAD_CONCURRENCY = 2  # /upload-directory/ 同时处理的文件数量；应明显小于 FILE_IO_WORKERS，给搜索等请求留出线程和GIL
+
+# Search cache settings
+SEARCH_CACHE_SIZE = 1024  # 缓存的搜索结果数量，0表示不缓存
+SEARCH_CACHE_TTL = 300  # 搜索结果缓存的过期时间（秒）
+DOCUMENT_CACHE_BYTES = 64 * 1024 * 1024  # 搜索结果读取文档时使用的解析缓存大小（按JSON文本字节数）
+HYDRATE_CONCURRENCY = 8  # 读取搜索命中文档时的最大并发数
+
+# 混合搜索配置
+HYBRID_CANDIDATES = 100  # BM25和向量搜索各自取的候选题目数量
+BM25_MAX_CANDIDATES = 1000  # BM25打分的最大候选题目数量，限制高频词的打分开销
+RRF_K = 60  # 倒数排名融合的平滑常数
+
+# Document storage settings
+DOCUMENT_STORE_BACKEND = "segments"  # segments: 按学科追加写入的段文件; files: 每个文档一个JSON文件
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024  # 单个段文件写满后切换到新的段文件
+SEGMENT_COMPACT_INTERVAL = 600  # 后台压缩线程的检查间隔（秒）
+SEGMENT_COMPACT_MIN_GARBAGE = 0.5  # 段文件中被替换/删除的数据超过该比例时压缩
+ERROR_QUESTION_PATH = "/root/error_question"  # 做题时保存的错题目录（main.py 和 exercise.py 共用）
+
+# Exam session settings
+EXAM_SESSION_TTL = 4 * 3600  # /exam 返回的exam_id的有效时间（秒），过期后需要重新获取试卷
+EXAM_SESSION_MAX = 1000  # 内存中保留的已发出试卷（按内容区分）数量上限，超过时淘汰最久没有发出的试卷
+
+# Batch grading settings
+SUBMIT_BATCH_MAX = 2000  # /submit/batch 一次最多提交的学生答卷数量
+
+# Wrong question write queue settings
+WRONG_QUEUE_MAX_ITEMS = 10000  # 错题后台写入队列最多缓存的提交数（一次 /submit 或 /submit/batch 为一项），队列满时提交请求等待或直接写入
+WRONG_QUEUE_MAX_BATCH = 1000  # 后台线程一次最多合并写入的提交数
+WRONG_QUEUE_MAX_DELAY = 0.02  # 后台线程收到第一份错题后最多等待多久凑成一批（秒）
+WRONG_QUEUE_PUT_TIMEOUT = 1.0  # 队列满时提交最多等待的秒数，超时后在请求线程中直接写入
+WRONG_QUEUE_SPILL_PATH = "wrong_question_pending.jsonl"  # 错题重试后仍然写入失败时暂存的文件，后台线程启动和空闲时重新写入
+WRONG_QUEUE_RETRY_INTERVAL = 60.0  # 写入队列空闲多久后重试暂存的错题（秒）
+
+# Directory watcher settings
+WATCH_ENABLED = True  # 监视错题文档目录和错题目录，新写入的文件自动加入索引和向量存储
+WATCH_BACKEND = "auto"  # auto: 优先使用inotify，不可用时轮询; inotify; polling
+WATCH_DEBOUNCE = 1.0  # 最后一个事件之后等待的秒数，连续写入合并为一次同步
+WATCH_MAX_DELAY = 10.0  # 持续有写入时，从第一个事件到开始同步的最长等待秒数
+WATCH_POLL_INTERVAL = 2.0  # 轮询方式扫描目录、读取段文件存储变更记录的间隔（秒）
@@ -0,0 +1,729 @@
+"""
+错题文档存储引擎。
+
+FileDocumentStore: 原来的存储方式，每个文档一个格式化的JSON文件。
+SegmentDocumentStore: 按学科追加写入的段文件（JSONL），每行一个紧凑格式的文档，
+    SQLite偏移量索引记录每个文档所在的段文件、偏移量和长度，读取时直接定位，
+    不需要列目录或打开成千上万个小文件。替换和删除只追加新记录，
+    后台压缩线程定期把垃圾比例高的段文件中仍然有效的记录搬到新的段文件中。
+
+两种存储都以文档名（如 math_1.json）作为标识，对外提供相同的接口。
+段文件存储的迁移工具：python document_store.py migrate <目录> [--per-subject-dirs] [--remove]
+"""
+import os
+import json
+import time
+import fcntl
+import shutil
+import logging
+import sqlite3
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import config
+from search_index import subject_from_filename
+
+logger = logging.getLogger(__name__)
+
+# 段文件存储的目录名，以点开头，不会被当作学科目录列出
+SEGMENT_DIR_NAME = ".segments"
+
+
+class DocumentStore(ABC):
+    """文档存储接口，文档不存在时 get/get_text/stat 抛出KeyError"""
+
+    root: str
+
+    def path_for(self, name: str) -> str:
+        """文档的逻辑路径（向量存储的file_path字段和接口返回值使用）"""
+        return os.path.join(self.root, name)
+
+    @abstractmethod
+    def put(self, name: str, subject: str, data: Any, overwrite: bool = True,
+            created: Optional[float] = None) -> str:
+        """
+        保存文档，返回文档的JSON文本
+        overwrite=False 时同名文档已存在会抛出FileExistsError
+        """
+
+    def put_many(self, items: List[Tuple[str, str, Any]], overwrite: bool = True,
+                 created: Optional[float] = None) -> List[str]:
+        """
+        批量保存 (文档名, 学科, 数据)，返回因同名文档已存在而没有写入的文档名（overwrite=False 时）
+        """
+        conflicts = []
+        for name, subject, data in items:
+            try:
+                self.put(name, subject, data, overwrite=overwrite, created=created)
+            except FileExistsError:
+                conflicts.append(name)
+        return conflicts
+
+    @abstractmethod
+    def get_text(self, name: str) -> str:
+        """读取文档的JSON文本"""
+
+    def get(self, name: str) -> Any:
+        """读取并解析文档"""
+        return json.loads(self.get_text(name))
+
+    @abstractmethod
+    def exists(self, name: str) -> bool:
+        """文档是否存在"""
+
+    @abstractmethod
+    def stat(self, name: str) -> Tuple[int, float]:
+        """返回 (文档大小, 创建时间)"""
+
+    def stat_all(self) -> Dict[str, Tuple[int, float]]:
+        """所有文档的 (文档大小, 创建时间)，文档被替换后会改变（段文件压缩不会改变）"""
+        stats = {}
+        for name in self.names():
+            try:
+                stats[name] = self.stat(name)
+            except KeyError:
+                continue
+        return stats
+
+    @abstractmethod
+    def version(self, name: str) -> Hashable:
+        """文档内容的版本标识，文档被替换后会改变，用于校验缓存"""
+
+    @abstractmethod
+    def names(self, subject: Optional[str] = None) -> List[str]:
+        """列出文档名，可按学科筛选"""
+
+    @abstractmethod
+    def subjects(self) -> List[str]:
+        """列出存储中的学科"""
+
+    @abstractmethod
+    def delete(self, name: str):
+        """删除文档，文档不存在时抛出KeyError"""
+
+    @abstractmethod
+    def clear(self):
+        """删除所有文档"""
+
+    def change_cursor(self) -> int:
+        """变更记录的当前位置，与 changes_since 配合使用"""
+        return 0
+
+    def changes_since(self, cursor: int) -> Tuple[List[str], int]:
+        """
+        返回 cursor 之后其他进程写入或删除的文档名和新的位置
+        文件存储的变化由目录监视发现，没有变更记录
+        """
+        return [], cursor
+
+    def close(self):
+        pass
+
+
+class FileDocumentStore(DocumentStore):
+    """
+    每个文档一个格式化的JSON文件
+    per_subject_dirs=True 时文件保存在 root/<学科>/ 下（error_question的目录结构）
+    """
+
+    def __init__(self, root: str, per_subject_dirs: bool = False):
+        self.root = root
+        self.per_subject_dirs = per_subject_dirs
+        os.makedirs(root, exist_ok=True)
+
+    def _dir_for(self, subject: str) -> str:
+        return os.path.join(self.root, subject) if self.per_subject_dirs else self.root
+
+    def _file_for(self, name: str) -> str:
+        return os.path.join(self._dir_for(subject_from_filename(name)), name)
+
+    def path_for(self, name: str) -> str:
+        return self._file_for(name)
+
+    def put(self, name: str, subject: str, data: Any, overwrite: bool = True,
+            created: Optional[float] = None) -> str:
+        directory = self._dir_for(subject)
+        os.makedirs(directory, exist_ok=True)
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        # 以独占模式创建文件，不会覆盖已有的同名文件
+        with open(os.path.join(directory, name), "w" if overwrite else "x", encoding="utf-8") as f:
+            f.write(text)
+        return text
+
+    def get_text(self, name: str) -> str:
+        try:
+            with open(self._file_for(name), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.isfile(self._file_for(name))
+
+    def stat(self, name: str) -> Tuple[int, float]:
+        try:
+            file_stat = os.stat(self._file_for(name))
+        except FileNotFoundError:
+            raise KeyError(name)
+        return file_stat.st_size, file_stat.st_ctime
+
+    def version(self, name: str) -> Hashable:
+        try:
+            file_stat = os.stat(self._file_for(name))
+        except FileNotFoundError:
+            raise KeyError(name)
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+    def names(self, subject: Optional[str] = None) -> List[str]:
+        if self.per_subject_dirs:
+            subjects = [subject] if subject else self.subjects()
+            names = []
+            for subj in subjects:
+                directory = self._dir_for(subj)
+                if os.path.isdir(directory):
+                    names.extend(f for f in os.listdir(directory) if f.endswith('.json'))
+            return names
+        return [f for f in os.listdir(self.root)
+                if f.endswith('.json') and (not subject or subject_from_filename(f) == subject)]
+
+    def subjects(self) -> List[str]:
+        if self.per_subject_dirs:
+            return [d for d in os.listdir(self.root)
+                    if os.path.isdir(os.path.join(self.root, d)) and not d.startswith('.')]
+        return sorted({subject_from_filename(name) for name in self.names()})
+
+    def delete(self, name: str):
+        try:
+            os.remove(self._file_for(name))
+        except FileNotFoundError:
+            raise KeyError(name)
+
+    def clear(self):
+        for name in self.names():
+            os.remove(self._file_for(name))
+
+
+class SegmentDocumentStore(DocumentStore):
+    """
+    按学科追加写入的段文件存储
+    每行格式为 {"name": ..., "subject": ..., "created": ..., "doc": <文档>}，
+    删除时追加 {"name": ..., "deleted": true}。索引丢失时可以按顺序扫描段文件重建
+    索引中的变更记录保存每个文档最后一次写入或删除的序号和进程，
+    其他进程（做题服务、多个worker）的写入通过它发现，不需要监视段文件目录
+    """
+
+    def __init__(self, root: str, max_segment_bytes: Optional[int] = None):
+        self.root = root
+        self.max_segment_bytes = max_segment_bytes or config.SEGMENT_MAX_BYTES
+        self.segment_dir = os.path.join(root, SEGMENT_DIR_NAME)
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._lock_file = open(os.path.join(self.segment_dir, ".lock"), "a")
+        self._compactor: Optional[threading.Thread] = None
+        self._stop_compactor = threading.Event()
+
+        index_path = os.path.join(self.segment_dir, "index.db")
+        rebuild = not os.path.exists(index_path)
+        self._conn = sqlite3.connect(index_path, timeout=30.0, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS records (
+                    name TEXT PRIMARY KEY,
+                    subject TEXT NOT NULL,
+                    segment TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    record_length INTEGER NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_subject ON records (subject)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS segments (
+                    segment TEXT PRIMARY KEY,
+                    subject TEXT NOT NULL,
+                    total_bytes INTEGER NOT NULL,
+                    live_bytes INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS changes (
+                    name TEXT PRIMARY KEY,
+                    seq INTEGER NOT NULL,
+                    writer INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_changes_seq ON changes (seq)")
+        if rebuild:
+            self.rebuild_index()
+
+    @contextmanager
+    def _write_lock(self):
+        """线程锁加文件锁，多个worker进程写同一个存储时互斥"""
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _segment_path(self, segment: str) -> str:
+        return os.path.join(self.segment_dir, segment)
+
+    def _active_segment(self, subject: str, exclude: Optional[str] = None) -> str:
+        """返回学科当前写入的段文件，写满后创建下一个"""
+        row = self._conn.execute(
+            "SELECT segment, total_bytes FROM segments WHERE subject = ? ORDER BY segment DESC LIMIT 1",
+            (subject,)
+        ).fetchone()
+        if row is not None and row[1] < self.max_segment_bytes and row[0] != exclude:
+            return row[0]
+        sequence = int(os.path.splitext(os.path.basename(row[0]))[0]) + 1 if row else 1
+        segment = f"{subject or '_'}/{sequence:06d}.jsonl"
+        os.makedirs(os.path.dirname(self._segment_path(segment)), exist_ok=True)
+        self._conn.execute(
+            "INSERT INTO segments (segment, subject, total_bytes, live_bytes) VALUES (?, ?, 0, 0)",
+            (segment, subject)
+        )
+        return segment
+
+    def _append(self, segment: str, line: bytes) -> int:
+        """把一行追加到段文件，返回这一行的起始偏移量"""
+        committed = self._conn.execute(
+            "SELECT total_bytes FROM segments WHERE segment = ?", (segment,)
+        ).fetchone()[0]
+        with open(self._segment_path(segment), "ab") as f:
+            offset = f.tell()
+            if offset > committed:
+                # 上一次写入在提交索引之前中断，截掉不完整的记录，新记录从新的一行开始
+                logger.warning(f"段文件 {segment} 末尾有 {offset - committed} 字节未提交的数据，已截断")
+                f.truncate(committed)
+                offset = committed
+            f.write(line)
+        self._conn.execute(
+            "UPDATE segments SET total_bytes = total_bytes + ? WHERE segment = ?", (len(line), segment)
+        )
+        return offset
+
+    def _release(self, name: str):
+        """把文档原来的记录计为垃圾"""
+        row = self._conn.execute(
+            "SELECT segment, record_length FROM records WHERE name = ?", (name,)
+        ).fetchone()
+        if row is not None:
+            self._conn.execute(
+                "UPDATE segments SET live_bytes = live_bytes - ? WHERE segment = ?", (row[1], row[0])
+            )
+
+    def _write_record(self, name: str, subject: str, text: str, created: float,
+                      exclude_segment: Optional[str] = None):
+        header = json.dumps({"name": name, "subject": subject, "created": created}, ensure_ascii=False)
+        prefix = (header[:-1] + ', "doc": ').encode('utf-8')
+        body = text.encode('utf-8')
+        line = prefix + body + b"}\n"
+
+        segment = self._active_segment(subject, exclude=exclude_segment)
+        offset = self._append(segment, line)
+        self._release(name)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO records (name, subject, segment, offset, length, record_length, created) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (name, subject, segment, offset + len(prefix), len(body), len(line), created)
+        )
+        self._conn.execute(
+            "UPDATE segments SET live_bytes = live_bytes + ? WHERE segment = ?", (len(line), segment)
+        )
+
+    def _record_changes(self, names: List[str]):
+        """记录文档被写入或删除，同一个事务中的变更使用同一个序号（压缩搬移记录不算变更）"""
+        if not names:
+            return
+        seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM changes").fetchone()[0]
+        writer = os.getpid()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO changes (name, seq, writer) VALUES (?, ?, ?)",
+            [(name, seq, writer) for name in names]
+        )
+
+    def put(self, name: str, subject: str, data: Any, overwrite: bool = True,
+            created: Optional[float] = None) -> str:
+        text = json.dumps(data, ensure_ascii=False)
+        with self._write_lock(), self._conn:
+            if not overwrite and self._locate(name) is not None:
+                raise FileExistsError(name)
+            self._write_record(name, subject, text, created if created is not None else time.time())
+            self._record_changes([name])
+        return text
+
+    def put_many(self, items: List[Tuple[str, str, Any]], overwrite: bool = True,
+                 created: Optional[float] = None) -> List[str]:
+        # 整批只获取一次写锁，在一个事务中提交索引
+        created = created if created is not None else time.time()
+        texts = [(name, subject, json.dumps(data, ensure_ascii=False)) for name, subject, data in items]
+        conflicts = []
+        with self._write_lock(), self._conn:
+            written = []
+            for name, subject, text in texts:
+                if not overwrite and self._locate(name) is not None:
+                    conflicts.append(name)
+                    continue
+                self._write_record(name, subject, text, created)
+                written.append(name)
+            self._record_changes(written)
+        return conflicts
+
+    def _locate(self, name: str) -> Optional[Tuple[str, int, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT segment, offset, length FROM records WHERE name = ?", (name,)
+            ).fetchone()
+
+    def get_text(self, name: str) -> str:
+        # 压缩线程可能刚刚删除了索引指向的段文件，重新查一次索引即可
+        for _ in range(2):
+            location = self._locate(name)
+            if location is None:
+                raise KeyError(name)
+            segment, offset, length = location
+            try:
+                with open(self._segment_path(segment), "rb") as f:
+                    f.seek(offset)
+                    return f.read(length).decode('utf-8')
+            except FileNotFoundError:
+                continue
+        raise KeyError(name)
+
+    def exists(self, name: str) -> bool:
+        return self._locate(name) is not None
+
+    def version(self, name: str) -> Hashable:
+        # 替换和压缩都会把记录写到新的位置，段文件名和偏移量就是版本
+        location = self._locate(name)
+        if location is None:
+            raise KeyError(name)
+        return location[0], location[1]
+
+    def stat(self, name: str) -> Tuple[int, float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT length, created FROM records WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0], row[1]
+
+    def stat_all(self) -> Dict[str, Tuple[int, float]]:
+        with self._lock:
+            return {row[0]: (row[1], row[2])
+                    for row in self._conn.execute("SELECT name, length, created FROM records")}
+
+    def names(self, subject: Optional[str] = None) -> List[str]:
+        with self._lock:
+            if subject:
+                rows = self._conn.execute("SELECT name FROM records WHERE subject = ?", (subject,))
+            else:
+                rows = self._conn.execute("SELECT name FROM records")
+            return [row[0] for row in rows]
+
+    def subjects(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT subject FROM records ORDER BY subject")]
+
+    def delete(self, name: str):
+        with self._write_lock(), self._conn:
+            row = self._conn.execute("SELECT subject FROM records WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                raise KeyError(name)
+            # 追加删除标记，重建索引时这个文档不会再出现
+            line = (json.dumps({"name": name, "deleted": True}, ensure_ascii=False) + "\n").encode('utf-8')
+            self._append(self._active_segment(row[0]), line)
+            self._release(name)
+            self._conn.execute("DELETE FROM records WHERE name = ?", (name,))
+            self._record_changes([name])
+
+    def clear(self):
+        with self._write_lock(), self._conn:
+            self._record_changes(self.names())
+            self._conn.execute("DELETE FROM records")
+            self._conn.execute("DELETE FROM segments")
+            for entry in os.listdir(self.segment_dir):
+                path = os.path.join(self.segment_dir, entry)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+
+    def rebuild_index(self) -> int:
+        """按顺序扫描所有段文件重建偏移量索引，返回有效文档数量"""
+        with self._write_lock(), self._conn:
+            self._conn.execute("DELETE FROM records")
+            self._conn.execute("DELETE FROM segments")
+            segments = sorted(
+                os.path.relpath(os.path.join(directory, file_name), self.segment_dir)
+                for directory, _, files in os.walk(self.segment_dir)
+                for file_name in files if file_name.endswith('.jsonl')
+            )
+            for segment in segments:
+                subject = os.path.dirname(segment)
+                subject = "" if subject == "_" else subject
+                self._conn.execute(
+                    "INSERT INTO segments (segment, subject, total_bytes, live_bytes) VALUES (?, ?, ?, 0)",
+                    (segment, subject, os.path.getsize(self._segment_path(segment)))
+                )
+                offset = 0
+                torn_at = None
+                with open(self._segment_path(segment), "rb") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            # 写入中断留下的不完整行；在文件末尾时截掉，之后追加的记录从新的一行开始
+                            logger.warning(f"段文件 {segment} 偏移量 {offset} 处的记录不完整，已跳过")
+                            if not line.endswith(b"\n"):
+                                torn_at = offset
+                            offset += len(line)
+                            continue
+                        self._release(record["name"])
+                        if record.get("deleted"):
+                            self._conn.execute("DELETE FROM records WHERE name = ?", (record["name"],))
+                        else:
+                            doc_offset = line.index(b', "doc": ') + len(b', "doc": ')
+                            self._conn.execute(
+                                "INSERT OR REPLACE INTO records "
+                                "(name, subject, segment, offset, length, record_length, created) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (record["name"], record["subject"], segment, offset + doc_offset,
+                                 len(line) - doc_offset - 2, len(line), record["created"])
+                            )
+                            self._conn.execute(
+                                "UPDATE segments SET live_bytes = live_bytes + ? WHERE segment = ?",
+                                (len(line), segment)
+                            )
+                        offset += len(line)
+                if torn_at is not None:
+                    os.truncate(self._segment_path(segment), torn_at)
+                    self._conn.execute("UPDATE segments SET total_bytes = ? WHERE segment = ?", (torn_at, segment))
+            count = self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+            # 重建前后的内容无法对比，所有文档都按变化处理
+            self._record_changes(self.names())
+        logger.info(f"段文件索引重建完成: {self.segment_dir}，共 {count} 个文档")
+        return count
+
+    def change_cursor(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def changes_since(self, cursor: int) -> Tuple[List[str], int]:
+        # 一次查询读取，不会漏掉两次查询之间提交的变更；本进程的写入已经由写入方处理
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, seq, writer FROM changes WHERE seq > ? ORDER BY seq", (cursor,)
+            ).fetchall()
+        pid = os.getpid()
+        names = [name for name, _, writer in rows if writer != pid]
+        return names, max([cursor] + [seq for _, seq, _ in rows])
+
+    def compact(self, min_garbage_ratio: Optional[float] = None) -> int:
+        """
+        压缩垃圾比例不低于 min_garbage_ratio 的已写满的段文件：
+        把其中仍然有效的记录追加到学科当前的段文件，然后删除旧段文件。返回压缩的段文件数量
+        """
+        if min_garbage_ratio is None:
+            min_garbage_ratio = config.SEGMENT_COMPACT_MIN_GARBAGE
+        compacted = 0
+        with self._lock:
+            # 学科当前正在写入的段文件不压缩
+            candidates = self._conn.execute(
+                "SELECT segment, subject FROM segments "
+                "WHERE (total_bytes - live_bytes) >= ? * total_bytes AND segment < "
+                "(SELECT MAX(segment) FROM segments AS latest WHERE latest.subject = segments.subject)",
+                (min_garbage_ratio,)
+            ).fetchall()
+        for segment, subject in candidates:
+            with self._write_lock(), self._conn:
+                rows = self._conn.execute(
+                    "SELECT name, offset, length, created FROM records WHERE segment = ?", (segment,)
+                ).fetchall()
+                with open(self._segment_path(segment), "rb") as f:
+                    for name, offset, length, created in rows:
+                        f.seek(offset)
+                        text = f.read(length).decode('utf-8')
+                        self._write_record(name, subject, text, created, exclude_segment=segment)
+                    # 更早的段文件中可能还有被删除文档的旧记录，删除标记需要保留，
+                    # 否则重建索引时这些文档会重新出现；学科最早的段文件不需要保留
+                    older = self._conn.execute(
+                        "SELECT 1 FROM segments WHERE subject = ? AND segment < ? LIMIT 1", (subject, segment)
+                    ).fetchone()
+                    if older is not None:
+                        f.seek(0)
+                        for line in f:
+                            if line.endswith(b'"deleted": true}\n'):
+                                name = json.loads(line)["name"]
+                                if self._locate(name) is None:
+                                    self._append(self._active_segment(subject, exclude=segment), line)
+                self._conn.execute("DELETE FROM segments WHERE segment = ?", (segment,))
+                os.remove(self._segment_path(segment))
+            compacted += 1
+            logger.info(f"段文件压缩完成: {segment}，搬移 {len(rows)} 个文档")
+        return compacted
+
+    def start_compactor(self, interval: Optional[float] = None):
+        """启动后台压缩线程，每隔 interval 秒检查一次"""
+        interval = interval or config.SEGMENT_COMPACT_INTERVAL
+        if self._compactor is not None:
+            return
+
+        def run():
+            while not self._stop_compactor.wait(interval):
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"段文件压缩失败: {str(e)}")
+
+        self._stop_compactor.clear()
+        self._compactor = threading.Thread(target=run, name="segment-compactor", daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        """停止后台压缩线程并关闭索引"""
+        if self._compactor is not None:
+            self._stop_compactor.set()
+            self._compactor.join()
+            self._compactor = None
+        with self._lock:
+            self._conn.close()
+            self._lock_file.close()
+
+
+class DocumentCache:
+    """
+    解析后文档的LRU缓存，按文档的JSON文本大小限制总量
+    每次读取先查询文档版本（文件的mtime，段文件存储的记录位置），版本不变时直接返回缓存，
+    文档被替换后自动重新读取，不需要写入接口通知
+    返回的对象在多个请求之间共享，调用方不能修改
+    """
+
+    def __init__(self, store: DocumentStore, max_bytes: Optional[int] = None):
+        self.store = store
+        self.max_bytes = config.DOCUMENT_CACHE_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        # 文档名 -> (版本, 文本大小, 解析后的文档)
+        self._entries: "OrderedDict[str, Tuple[Hashable, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str) -> Any:
+        """读取并解析文档，文档不存在时抛出KeyError"""
+        # 先取版本再读内容：并发写入时缓存的内容只会比版本新，下次读取会因版本不一致重新读取
+        version = self.store.version(name)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        text = self.store.get_text(name)
+        data = json.loads(text)
+        size = len(text.encode('utf-8'))
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size <= self.max_bytes:
+                self._entries[name] = (version, size, data)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                    self._bytes -= evicted_size
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+def create_document_store(root: str, per_subject_dirs: bool = False,
+                          backend: Optional[str] = None) -> DocumentStore:
+    """根据配置创建文档存储，per_subject_dirs只影响文件存储的目录结构"""
+    backend = backend or config.DOCUMENT_STORE_BACKEND
+    if backend == "files":
+        return FileDocumentStore(root, per_subject_dirs)
+    if backend == "segments":
+        store = SegmentDocumentStore(root)
+        # 第一次使用段文件存储时自动导入目录中原有的JSON文件
+        if not store.names():
+            migrate_files(root, store, per_subject_dirs)
+        return store
+    raise ValueError(f"未知的文档存储类型: {backend}，可选: files, segments")
+
+
+def migrate_files(root: str, store: DocumentStore, per_subject_dirs: bool = False,
+                  remove: bool = False) -> int:
+    """
+    把 root 中原来的JSON文件导入到存储中，已导入的文档会跳过
+    保留文件的创建时间；remove=True 时导入后删除原文件。返回导入的文档数量
+    """
+    source = FileDocumentStore(root, per_subject_dirs)
+    imported = 0
+    for name in sorted(source.names()):
+        if store.exists(name):
+            continue
+        try:
+            data = source.get(name)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            logger.warning(f"跳过无效的JSON文件: {source.path_for(name)}")
+            continue
+        _, created = source.stat(name)
+        subject = os.path.basename(os.path.dirname(source.path_for(name))) if per_subject_dirs \
+            else subject_from_filename(name)
+        store.put(name, subject, data, created=created)
+        imported += 1
+        if remove:
+            source.delete(name)
+    logger.info(f"从 {root} 导入了 {imported} 个文档")
+    return imported
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="错题文档段文件存储工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = commands.add_parser("migrate", help="把目录中的JSON文件导入段文件存储")
+    migrate_parser.add_argument("root", help="存储目录，如 wrong_docs 或 /root/error_question")
+    migrate_parser.add_argument("--per-subject-dirs", action="store_true", help="文件按学科保存在子目录中")
+    migrate_parser.add_argument("--remove", action="store_true", help="导入后删除原文件")
+    compact_parser = commands.add_parser("compact", help="压缩段文件")
+    compact_parser.add_argument("root")
+    compact_parser.add_argument("--min-garbage-ratio", type=float, default=None)
+    rebuild_parser = commands.add_parser("rebuild-index", help="扫描段文件重建偏移量索引")
+    rebuild_parser.add_argument("root")
+    args = parser.parse_args()
+
+    segment_store = SegmentDocumentStore(args.root)
+    if args.command == "migrate":
+        count = migrate_files(args.root, segment_store, args.per_subject_dirs, args.remove)
+        print(f"已导入 {count} 个文档到: {segment_store.segment_dir}")
+    elif args.command == "compact":
+        print(f"已压缩 {segment_store.compact(args.min_garbage_ratio)} 个段文件")
+    else:
+        print(f"索引中共有 {segment_store.rebuild_index()} 个文档")
+    segment_store.close()
@@ -0,0 +1,161 @@
+"""
+本地CPU文本向量化引擎。
+
+不依赖外部模型服务，使用哈希字符n-gram + TF-IDF 生成固定维度的向量，
+适合没有空格分词的中文题干。向量经过L2归一化，Milvus的L2距离等价于余弦相似度。
+"""
+import os
+import re
+import zlib
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+import config
+from document_store import create_document_store
+from questions import expand_questions
+
+logger = logging.getLogger(__name__)
+
+# 连续的文字/数字片段，标点和空白不参与n-gram
+_WORD_RUN = re.compile(r"\w+")
+
+
+class Embedder(ABC):
+    """向量化引擎基类，子类需要实现 embed_batch"""
+
+    dim: int
+
+    @abstractmethod
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """批量生成向量，返回形状为 (len(texts), dim) 的float32矩阵"""
+
+    def embed(self, text: str) -> List[float]:
+        """生成单条文本的向量"""
+        return self.embed_batch([text])[0].tolist()
+
+
+class HashingEmbedder(Embedder):
+    """
+    哈希字符n-gram TF-IDF 向量
+    n-gram通过crc32映射到固定的桶，词频取对数后乘以IDF权重
+    """
+
+    def __init__(self, dim: int = 128, ngram_range: Tuple[int, int] = (1, 3),
+                 idf: Optional[np.ndarray] = None):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        if idf is None:
+            idf = np.ones(dim, dtype=np.float32)
+        if idf.shape != (dim,):
+            raise ValueError(f"IDF向量维度({idf.shape})与向量维度({dim})不一致")
+        self.idf = idf.astype(np.float32)
+
+    def _buckets(self, text: str) -> List[int]:
+        """计算文本中所有n-gram对应的哈希桶"""
+        min_n, max_n = self.ngram_range
+        buckets = []
+        for run in _WORD_RUN.findall(text.lower()):
+            for n in range(min_n, max_n + 1):
+                for i in range(len(run) - n + 1):
+                    buckets.append(zlib.crc32(run[i:i + n].encode('utf-8')) % self.dim)
+        return buckets
+
+    def _term_counts(self, texts: Sequence[str]) -> np.ndarray:
+        """统计每条文本在各个哈希桶上的词频"""
+        rows = []
+        cols = []
+        for row, text in enumerate(texts):
+            buckets = self._buckets(text or "")
+            rows.extend([row] * len(buckets))
+            cols.extend(buckets)
+        counts = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if cols:
+            np.add.at(counts, (np.asarray(rows), np.asarray(cols)), 1.0)
+        return counts
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        counts = self._term_counts(texts)
+        # 次线性词频，避免长文本中的高频字主导向量
+        vectors = np.log1p(counts) * self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def fit_idf(self, texts: Sequence[str]) -> np.ndarray:
+        """根据语料统计每个哈希桶的文档频率，计算平滑IDF"""
+        document_frequency = (self._term_counts(texts) > 0).sum(axis=0)
+        n_docs = len(texts)
+        self.idf = (np.log((1 + n_docs) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self.idf
+
+
+# 可用的向量化引擎
+EMBEDDERS: Dict[str, Type[Embedder]] = {
+    "hashing": HashingEmbedder,
+}
+
+
+def load_idf(path: str, dim: int) -> Optional[np.ndarray]:
+    """读取预先计算的IDF权重，文件不存在或维度不符时返回None"""
+    if not path or not os.path.exists(path):
+        return None
+    idf = np.load(path)
+    if idf.shape != (dim,):
+        logger.warning(f"IDF文件 {path} 的维度{idf.shape}与配置的向量维度{dim}不一致，忽略该文件")
+        return None
+    return idf
+
+
+def create_embedder(backend: Optional[str] = None) -> Embedder:
+    """根据配置创建向量化引擎"""
+    backend = backend or config.EMBEDDING_BACKEND
+    if backend not in EMBEDDERS:
+        raise ValueError(f"未知的向量化引擎: {backend}，可选: {list(EMBEDDERS)}")
+    if backend == "hashing":
+        idf = load_idf(config.EMBEDDING_IDF_PATH, config.EMBEDDING_DIM)
+        return HashingEmbedder(
+            dim=config.EMBEDDING_DIM,
+            ngram_range=config.EMBEDDING_NGRAM_RANGE,
+            idf=idf
+        )
+    return EMBEDDERS[backend]()
+
+
+def corpus_texts(roots: Sequence[str]) -> List[str]:
+    """
+    读取文档存储中的所有文档，返回与入库时相同的逐题向量化文本（expand_questions 拆分的题干和选项）
+    用于计算IDF，无法解析的文档跳过
+    """
+    texts = []
+    for root in roots:
+        store = create_document_store(root)
+        try:
+            for file_name in sorted(store.names()):
+                try:
+                    json_data = store.get(file_name)
+                except (KeyError, json.JSONDecodeError) as e:
+                    logger.warning(f"跳过无法读取的文档 {file_name}: {str(e)}")
+                    continue
+                texts.extend(record["text"] for record in expand_questions(json_data))
+        finally:
+            store.close()
+    return texts
+
+
+if __name__ == "__main__":
+    # 根据现有错题文档计算IDF权重：python embedding.py
+    # 语料包括默认的错题文档存储和所有学生的存储，按题目统计文档频率
+    # 注意：更新IDF后已入库的向量需要重新导入才能保持一致
+    roots = [config.JSON_STORAGE_PATH]
+    if os.path.isdir(config.STUDENT_STORAGE_PATH):
+        roots.extend(os.path.join(config.STUDENT_STORAGE_PATH, name)
+                     for name in sorted(os.listdir(config.STUDENT_STORAGE_PATH))
+                     if os.path.isdir(os.path.join(config.STUDENT_STORAGE_PATH, name)))
+    texts = corpus_texts(roots)
+    embedder = HashingEmbedder(dim=config.EMBEDDING_DIM, ngram_range=config.EMBEDDING_NGRAM_RANGE)
+    np.save(config.EMBEDDING_IDF_PATH, embedder.fit_idf(texts))
+    print(f"已根据 {len(texts)} 道题目计算IDF权重并保存到: {config.EMBEDDING_IDF_PATH}")
@@ -0,0 +1,179 @@
+"""
+试卷文件的解析缓存。
+
+exercise.py 的 /exam 和 /submit 每次都要读取同一份试卷，缓存按文件路径保存解析后的试卷，
+用文件的 (mtime, size, inode) 校验：出题程序重新生成或替换试卷文件后，下一次读取自动重新解析。
+同一文件同时未命中的请求只有一个执行解析，其他请求等待并使用它的结果。
+试卷目录的文件列表同样缓存，按目录的mtime校验（增删文件会改变目录的mtime）。
+
+缓存的是编译后的试卷（CompiledExam）：去掉答案并序列化好的响应内容、gzip版本、ETag，以及判题用的答案表，
+/exam 直接返回字节，不需要每次序列化。
+
+ExamSessions 保存发出的试卷快照：/exam 返回 exam_id，/submit 按 exam_id 判题，
+判题使用的一定是学生拿到的那份试卷，不会重新读取文件或重新随机选择试卷。
+"""
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def file_version(path: str) -> Tuple[int, int, int]:
+    """文件的 (mtime_ns, size, inode)，文件不存在时抛出FileNotFoundError"""
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class ExamCache:
+    """按文件版本校验的解析缓存，线程安全；返回的对象由所有请求共享，调用方不能修改"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 路径 -> (文件版本, 解析结果)
+        self._entries: Dict[str, Tuple[Tuple[int, int, int], Any]] = {}
+        # 每个路径的解析锁，合并同时发生的未命中
+        self._loading: Dict[str, threading.Lock] = {}
+        # 目录 -> (目录mtime, 文件名列表)
+        self._listings: Dict[str, Tuple[int, List[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, path: str, version: Tuple[int, int, int]):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry
+            return None
+
+    def get(self, path: str, loader: Callable[[str], Any]) -> Any:
+        """返回文件的解析结果，缓存缺失或文件已变化时调用 loader(path) 解析"""
+        entry = self._lookup(path, file_version(path))
+        if entry is not None:
+            return entry[1]
+
+        with self._lock:
+            path_lock = self._loading.setdefault(path, threading.Lock())
+        with path_lock:
+            # 等待期间其他请求可能已经解析了同一版本
+            version = file_version(path)
+            entry = self._lookup(path, version)
+            if entry is not None:
+                return entry[1]
+            data = loader(path)
+            with self._lock:
+                self._entries[path] = (version, data)
+                self.misses += 1
+            return data
+
+    def listdir(self, directory: str) -> List[str]:
+        """目录中的文件名，目录的mtime不变时使用缓存的列表"""
+        mtime = os.stat(directory).st_mtime_ns
+        with self._lock:
+            listing = self._listings.get(directory)
+            if listing is not None and listing[0] == mtime:
+                return listing[1]
+        names = sorted(os.listdir(directory))
+        with self._lock:
+            self._listings[directory] = (mtime, names)
+        return names
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._listings.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# 发给学生的试卷中去掉的字段
+ANSWER_FIELDS = ("correct_answer",)
+
+
+class CompiledExam:
+    """
+    一份试卷编译后的结果，随试卷文件的版本缓存，创建后不再修改
+    payload 是去掉答案后序列化好的JSON（gzip_payload 为压缩后的版本）；exam_id 是包括答案在内的完整试卷的哈希，
+    只改了答案的试卷也会得到新的 exam_id。同一份试卷发给所有学生的 exam_id、响应内容和ETag都相同；
+    answers 是判题使用的紧凑答案表（去掉首尾空白的字符串），answer_key 是同样内容的NumPy字符串数组，
+    批量判题时与学生×题目的答案矩阵逐列比较；questions 是生成判题结果用的原始题目
+    """
+
+    __slots__ = ("exam_id", "subject", "questions", "answers", "answer_key", "question_ids",
+                 "payload", "gzip_payload", "etag")
+
+    def __init__(self, exam: Dict[str, Any], subject: str):
+        self.subject = subject
+        self.questions = tuple(exam.get("questions", []))
+        self.answers = tuple(str(q.get("correct_answer", "")).strip() for q in self.questions)
+        self.answer_key = np.array(self.answers, dtype=np.str_)
+        self.answer_key.setflags(write=False)
+        self.question_ids = tuple(q.get("id") for q in self.questions)
+
+        full = json.dumps(exam, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.exam_id = hashlib.sha256(full).hexdigest()[:32]
+        client_exam = {**exam, "exam_id": self.exam_id, "questions": [
+            {key: value for key, value in q.items() if key not in ANSWER_FIELDS} for q in self.questions
+        ]}
+        self.payload = json.dumps(client_exam, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.gzip_payload = gzip.compress(self.payload, compresslevel=6, mtime=0)
+        # 两种编码的内容相同，使用弱ETag
+        self.etag = f'W/"{self.exam_id}"'
+
+    def etag_matches(self, if_none_match: Optional[str]) -> bool:
+        """If-None-Match 请求头中是否包含这份试卷的ETag（弱比较）"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.replace("W/", "", 1) == self.etag[2:] for tag in tags)
+
+
+class ExamSessions:
+    """
+    exam_id -> 发出的试卷快照，最后一次发出后超过TTL失效，线程安全
+    试卷文件重新生成后缓存中换成新的编译结果，已经发出的旧试卷仍可在TTL内按 exam_id 判题；
+    快照数量超过上限时淘汰最久没有发出的试卷
+    """
+
+    def __init__(self, ttl: float, max_sessions: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        # exam_id -> (过期时间, 试卷)，按最后发出的时间排序，过期和淘汰都从最早的开始
+        self._sessions: "OrderedDict[str, Tuple[float, CompiledExam]]" = OrderedDict()
+
+    def _expire_locked(self, now: float):
+        while self._sessions:
+            expires_at, _ = next(iter(self._sessions.values()))
+            if expires_at > now and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+
+    def issue(self, exam: CompiledExam):
+        """记录发出了一份试卷，延长其有效时间"""
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[exam.exam_id] = (now + self.ttl, exam)
+            self._sessions.move_to_end(exam.exam_id)
+            self._expire_locked(now)
+
+    def get(self, exam_id: str) -> Optional[CompiledExam]:
+        """返回未过期的试卷，不存在或已过期时返回None"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire_locked(now)
+            entry = self._sessions.get(exam_id)
+            if entry is None or entry[0] <= now:
+                return None
+            return entry[1]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
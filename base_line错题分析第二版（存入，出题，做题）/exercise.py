@@ -1,21 +1,33 @@
 import os
 import webbrowser
 import random
-import datetime
 from fastapi import FastAPI, Body, Request, Query, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Dict, Any, Optional
 import json
+import logging
 import threading
 import time
+import numpy as np
 import uvicorn
+from pydantic import BaseModel
 import config
+from sequence import next_file_ids
+from document_store import create_document_store
+from exam_cache import CompiledExam, ExamCache, ExamSessions
+from students import STUDENT_ID_PATTERN
+from write_behind import WriteBehindQueue
+
+# 配置日志
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
 # 文件夹路径设置
 TEST_FILES_DIR = "/root/create_new_test"  # 出题文件夹
-ERROR_BASE_DIR = "/root/error_question"  # 错题基础目录
+ERROR_BASE_DIR = config.ERROR_QUESTION_PATH  # 错题基础目录
 STATIC_DIR = "static"
 PORT = 5004
 
@@ -52,8 +64,22 @@ os.makedirs(ERROR_BASE_DIR, exist_ok=True)
 for subject in SUBJECT_NAMES.keys():
     os.makedirs(os.path.join(ERROR_BASE_DIR, subject), exist_ok=True)
 
+# 错题存储（按科目追加写入段文件，或每次一个JSON文件）
+error_documents = create_document_store(ERROR_BASE_DIR, per_subject_dirs=True)
+
+# 编译后的试卷缓存，按文件的mtime/size校验，重新出题后自动失效
+exam_cache = ExamCache()
+
+# 发出的试卷快照，/submit 按 exam_id 判题
+exam_sessions = ExamSessions(config.EXAM_SESSION_TTL, config.EXAM_SESSION_MAX)
+
 app = FastAPI()
 
+# 批量提交中一个学生的答卷
+class StudentAnswers(BaseModel):
+    student_id: str
+    answers: List[str]
+
 # 正确做法：静态文件挂载到 /static
 app.mount("/static", StaticFiles(directory=STATIC_DIR, html=True), name="static")
 
@@ -77,7 +103,7 @@ def main():
 def get_subjects():
     """获取所有可用的科目"""
     try:
-        json_files = [f for f in os.listdir(TEST_FILES_DIR) if f.endswith('.json')]
+        json_files = [f for f in exam_cache.listdir(TEST_FILES_DIR) if f.endswith('.json')]
         print(f"找到JSON文件: {json_files}")
         subjects = []
         
@@ -94,7 +120,7 @@ def get_subjects():
 
 def get_test_file_by_subject(subject: Optional[str] = None) -> str:
     """根据科目获取试题文件"""
-    json_files = [f for f in os.listdir(TEST_FILES_DIR) if f.endswith('.json')]
+    json_files = [f for f in exam_cache.listdir(TEST_FILES_DIR) if f.endswith('.json')]
     
     if not json_files:
         raise Exception(f"在 {TEST_FILES_DIR} 中没有找到JSON文件")
@@ -110,34 +136,47 @@ def get_test_file_by_subject(subject: Optional[str] = None) -> str:
         # 如果未指定科目，随机选择一个
         return os.path.join(TEST_FILES_DIR, random.choice(json_files))
 
-def read_exam(subject: Optional[str] = None) -> Dict[str, Any]:
-    """读取试卷数据"""
+def load_exam_file(test_file: str) -> Dict[str, Any]:
+    """解析试卷文件，生成带标题的试卷数据"""
+    print(f"解析试卷文件: {test_file}")
+    
+    # 从文件名获取科目
+    file_basename = os.path.basename(test_file)
+    file_subject = FILE_TO_SUBJECT.get(file_basename)
+    subject_display = SUBJECT_NAMES.get(file_subject, file_subject) if file_subject else "随机科目"
+    
+    with open(test_file, "r", encoding="utf-8") as f:
+        file_content = json.load(f)
+        
+        # 处理不同的文件格式
+        if isinstance(file_content, list):
+            # 如果是数组格式，转换为对象格式
+            data = {
+                "title": f"2025年全国卷{subject_display}模拟试卷",
+                "questions": file_content
+            }
+        else:
+            # 如果已经是对象格式
+            data = file_content
+            # 更新试卷标题
+            data["title"] = f"2025年全国卷{subject_display}模拟试卷"
+            
+        return data
+
+def compile_exam_file(test_file: str) -> CompiledExam:
+    """解析并编译试卷文件，科目由文件名确定"""
+    subject = FILE_TO_SUBJECT.get(os.path.basename(test_file), "other")
+    return CompiledExam(load_exam_file(test_file), subject)
+
+def open_exam(subject: Optional[str] = None) -> CompiledExam:
+    """
+    读取编译后的试卷；未指定科目时随机选择一份试卷
+    同一份试卷只解析和编译一次，试卷文件变化后重新编译
+    """
     try:
         test_file = get_test_file_by_subject(subject)
         print(f"正在使用试卷文件: {test_file}")
-        
-        # 从文件名获取科目
-        file_basename = os.path.basename(test_file)
-        file_subject = FILE_TO_SUBJECT.get(file_basename, subject)
-        subject_display = SUBJECT_NAMES.get(file_subject, file_subject) if file_subject else "随机科目"
-        
-        with open(test_file, "r", encoding="utf-8") as f:
-            file_content = json.load(f)
-            
-            # 处理不同的文件格式
-            if isinstance(file_content, list):
-                # 如果是数组格式，转换为对象格式
-                data = {
-                    "title": f"2025年全国卷{subject_display}模拟试卷",
-                    "questions": file_content
-                }
-            else:
-                # 如果已经是对象格式
-                data = file_content
-                # 更新试卷标题
-                data["title"] = f"2025年全国卷{subject_display}模拟试卷"
-                
-            return data
+        return exam_cache.get(test_file, compile_exam_file)
     except FileNotFoundError:
         raise Exception(f"试卷文件未找到")
     except json.JSONDecodeError:
@@ -145,105 +184,165 @@ def read_exam(subject: Optional[str] = None) -> Dict[str, Any]:
     except Exception as e:
         raise Exception(f"读取试卷失败: {e}")
 
+# 客户端是否接受gzip编码
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.partition(";")
+        if coding.strip().lower() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
 def save_wrong_questions(wrong_list: List[Dict[str, Any]], subject: Optional[str] = None):
     """
-    保存错题列表到文件，按科目分类存储，每次创建新文件
+    把错题列表放入后台写入队列，按科目分类存储，每次创建新文件
+    写入失败的错题由写入队列暂存到文件并稍后重试，不会只打印一条日志就丢失
     """
-    try:
-        if not wrong_list:
-            return
+    if not wrong_list:
+        return
+    
+    # 确定科目
+    if subject:
+        subject_name = subject
+    else:
+        # 如果没有指定科目，尝试从第一道错题中获取科目信息
+        first_question = wrong_list[0]
+        # 遍历FILE_TO_SUBJECT的反向映射，查找科目
+        found_subject = None
+        for file_name, subj in FILE_TO_SUBJECT.items():
+            if subj in first_question.get("content", "").lower():
+                found_subject = subj
+                break
         
-        # 确定科目
-        if subject:
-            subject_dir = os.path.join(ERROR_BASE_DIR, subject)
-        else:
-            # 如果没有指定科目，尝试从第一道错题中获取科目信息
-            first_question = wrong_list[0]
-            # 遍历FILE_TO_SUBJECT的反向映射，查找科目
-            found_subject = None
-            for file_name, subj in FILE_TO_SUBJECT.items():
-                if subj in first_question.get("content", "").lower():
-                    found_subject = subj
-                    break
-            
-            # 如果找不到科目，使用默认目录
-            if found_subject:
-                subject_dir = os.path.join(ERROR_BASE_DIR, found_subject)
+        # 如果找不到科目，使用默认科目
+        subject_name = found_subject or "other"
+    
+    wrong_question_writer.submit((subject_name, [wrong_list]))
+
+# 后台写入线程调用：同一科目的多次提交（每次提交一份或多份错题）一次写入
+def write_wrong_question_group(subject_name: str, batches: List[List[List[Dict[str, Any]]]]):
+    groups = [group for batch in batches for group in batch]
+    wrong_files = save_wrong_question_groups(groups, subject_name)
+    logger.info(f"错题已保存 {len(wrong_files)} 份，科目: {subject_name}，最后一份: "
+                f"{error_documents.path_for(wrong_files[-1])}")
+
+# 错题的后台写入队列，/submit 只判题，不等待错题写入存储
+wrong_question_writer = WriteBehindQueue(
+    write_wrong_question_group,
+    max_items=config.WRONG_QUEUE_MAX_ITEMS,
+    max_batch=config.WRONG_QUEUE_MAX_BATCH,
+    max_delay=config.WRONG_QUEUE_MAX_DELAY,
+    put_timeout=config.WRONG_QUEUE_PUT_TIMEOUT,
+    spill_path=config.WRONG_QUEUE_SPILL_PATH,
+    retry_interval=config.WRONG_QUEUE_RETRY_INTERVAL,
+    name="wrong-question-writer"
+)
+
+def save_wrong_question_groups(groups: List[List[Dict[str, Any]]], subject_name: str) -> List[str]:
+    """
+    把多份错题列表保存为同一科目下的多个错题文件，返回文件名（与 groups 顺序一致）
+    整批一次分配连续的文件编号、一次写入存储
+    """
+    names: List[Optional[str]] = [None] * len(groups)
+    pending = list(range(len(groups)))
+    # 由持久化序列分配文件编号，并发提交时不会重复；
+    # 不覆盖已有的同名错题，存储中有序列之外写入的同名错题时为冲突的部分重新分配编号
+    while pending:
+        file_ids = next_file_ids(f"error_question:{subject_name}", subject_name,
+                                 lambda: error_documents.names(subject_name), len(pending))
+        items = [(f"{subject_name}_{file_id}.json", subject_name, groups[index])
+                 for file_id, index in zip(file_ids, pending)]
+        conflicts = set(error_documents.put_many(items, overwrite=False))
+        retry = []
+        for (wrong_file, _, _), index in zip(items, pending):
+            if wrong_file in conflicts:
+                retry.append(index)
             else:
-                subject_dir = os.path.join(ERROR_BASE_DIR, "other")
-                os.makedirs(subject_dir, exist_ok=True)
-        
-        # 生成时间戳作为文件名的一部分
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # 查找当前科目目录下的文件数量，用于命名
-        existing_files = [f for f in os.listdir(subject_dir) if f.endswith('.json')]
-        file_count = len(existing_files) + 1
-        
-        # 创建新的错题文件
-        wrong_file = os.path.join(subject_dir, f"{subject}_{file_count}.json")
-        
-        with open(wrong_file, "w", encoding="utf-8") as f:
-            json.dump(wrong_list, f, ensure_ascii=False, indent=2)
-            
-        print(f"错题已保存到: {wrong_file}")
+                names[index] = wrong_file
+        pending = retry
+    return names
+
+# 一道题的判题结果
+def result_item(q: Dict[str, Any], user_answer: str, is_correct: bool) -> Dict[str, Any]:
+    return {
+        "id": q["id"],
+        "type": q["type"],
+        "score": q["score"],
+        "content": q["content"],
+        "options": q.get("options", []),
+        "knowledge_points": q["knowledge_points"],
+        "user_answer": user_answer,
+        "correct_answer": q["correct_answer"],
+        "is_correct": is_correct
+    }
 
+def find_exam(exam_id: Optional[str], subject: Optional[str]):
+    """
+    按 exam_id 取发出的试卷快照，未指定时按科目读取当前的试卷；失败时返回错误响应
+    两者都没有指定时返回400，判题不会随机选择试卷（答案会对应到另一份试卷）
+    """
+    if exam_id:
+        exam = exam_sessions.get(exam_id)
+        if exam is None:
+            return JSONResponse(status_code=404, content={"error": "试卷已过期或不存在，请重新获取试卷"})
+        return exam
+    if not subject:
+        return JSONResponse(status_code=400, content={"error": "请指定 exam_id 或 subject"})
+    try:
+        return open_exam(subject)
     except Exception as e:
-        print(f"保存错题失败: {e}")  # 打印错误信息，但不中断程序
+        return JSONResponse(status_code=500, content={"error": f"试卷读取失败: {e}"})
 
 @app.get("/exam")
-def get_exam(subject: Optional[str] = Query(None, description="科目名称，如 math, history 等")):
-    """获取试卷数据"""
+def get_exam(request: Request, subject: Optional[str] = Query(None, description="科目名称，如 math, history 等")):
+    """
+    获取试卷数据（不含答案），exam_id 指向这份试卷的快照，提交时传回用于判题
+    返回预先序列化的JSON，客户端已有同一份试卷（If-None-Match 匹配ETag）时返回304
+    """
     try:
         print(f"收到请求获取科目: {subject}")
-        data = read_exam(subject)
-        print(f"成功读取试卷数据，标题: {data.get('title', '未知')}")
-        return data
+        exam = open_exam(subject)
+        exam_sessions.issue(exam)
+        print(f"成功读取试卷数据，exam_id: {exam.exam_id}")
     except Exception as e:
         print(f"获取试卷数据失败: {str(e)}")
         return JSONResponse(status_code=500, content={"error": str(e)})
+    
+    # 每次都向服务器确认试卷是否变化
+    headers = {"ETag": exam.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if exam.etag_matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if accepts_gzip(request.headers.get("accept-encoding")):
+        return Response(exam.gzip_payload, media_type="application/json",
+                        headers={**headers, "Content-Encoding": "gzip"})
+    return Response(exam.payload, media_type="application/json", headers=headers)
 
 @app.post("/submit")
-def submit_exam(user_answers: List[str] = Body(...), subject: Optional[str] = Query(None)):
-    """提交试卷，返回判题结果"""
-    try:
-        exam_data = read_exam(subject)
-        questions = exam_data.get("questions", [])
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"试卷读取失败: {e}"})
+def submit_exam(user_answers: List[str] = Body(...), subject: Optional[str] = Query(None),
+                exam_id: Optional[str] = Query(None, description="/exam 返回的试卷ID")):
+    """
+    提交试卷，返回判题结果
+    指定 exam_id 时按发出的试卷快照判题；未指定时按科目读取当前的试卷（兼容旧的调用方式），两者都没有时返回400
+    """
+    exam = find_exam(exam_id, subject)
+    if isinstance(exam, JSONResponse):
+        return exam
+    questions = exam.questions
 
     if len(user_answers) != len(questions):
         return JSONResponse(status_code=400, content={"error": "用户答案数量与题目数量不一致"})
 
     results = []
     wrong_list = []
-    for q, ua in zip(questions, user_answers):
-        is_correct = str(ua).strip() == str(q['correct_answer']).strip()
-        result_item = {
-            "id": q["id"],
-            "type": q["type"],
-            "score": q["score"],
-            "content": q["content"],
-            "options": q.get("options", []),
-            "knowledge_points": q["knowledge_points"],
-            "user_answer": ua,
-            "correct_answer": q["correct_answer"],
-            "is_correct": is_correct
-        }
-        results.append(result_item)
+    for q, correct_answer, ua in zip(questions, exam.answers, user_answers):
+        is_correct = str(ua).strip() == correct_answer
+        item = result_item(q, ua, is_correct)
+        results.append(item)
         if not is_correct:
-            wrong_list.append(result_item)
+            wrong_list.append(item)
 
     if wrong_list:
-        # 获取当前正在做的科目
-        current_subject = subject
-        if not current_subject:
-            # 如果没有指定科目，尝试从文件名判断
-            test_file = get_test_file_by_subject(None)
-            file_basename = os.path.basename(test_file)
-            current_subject = FILE_TO_SUBJECT.get(file_basename, "other")
-            
-        save_wrong_questions(wrong_list, current_subject)
+        # 错题保存到判题所用试卷的科目
+        save_wrong_questions(wrong_list, exam.subject)
 
     return {
         "results": results,
@@ -252,6 +351,82 @@ def submit_exam(user_answers: List[str] = Body(...), subject: Optional[str] = Qu
         "total": len(questions)
     }
 
+@app.post("/submit/batch")
+def submit_batch(submissions: List[StudentAnswers] = Body(...), subject: Optional[str] = Query(None),
+                 exam_id: Optional[str] = Query(None, description="/exam 返回的试卷ID")):
+    """
+    批量提交同一份试卷的多个学生答卷（如整个班级），返回每个学生的成绩和每道题的全班错误率
+    所有有效答卷组成 学生×题目 的答案矩阵，与编译好的答案表一次比较完成判题；
+    每个学生的错题保存为一个错题文件（错题中带有 student_id），整批作为一项放入后台写入队列，一次写入存储
+    """
+    if not submissions:
+        return JSONResponse(status_code=400, content={"error": "没有提交任何答卷"})
+    if len(submissions) > config.SUBMIT_BATCH_MAX:
+        return JSONResponse(status_code=400,
+                            content={"error": f"一次最多提交 {config.SUBMIT_BATCH_MAX} 份答卷"})
+
+    exam = find_exam(exam_id, subject)
+    if isinstance(exam, JSONResponse):
+        return exam
+    questions = exam.questions
+    total = len(questions)
+
+    # 格式不正确的答卷单独返回错误，不参与判题和统计
+    students = []
+    results: List[Dict[str, Any]] = [None] * len(submissions)
+    for index, submission in enumerate(submissions):
+        if not STUDENT_ID_PATTERN.match(submission.student_id):
+            results[index] = {"student_id": submission.student_id, "error": "无效的student_id"}
+        elif len(submission.answers) != total:
+            results[index] = {"student_id": submission.student_id, "error": "用户答案数量与题目数量不一致"}
+        else:
+            students.append(index)
+
+    # 学生×题目的答案矩阵，每一列与答案表比较
+    answers = np.array([answer.strip() for index in students for answer in submissions[index].answers],
+                       dtype=np.str_).reshape(len(students), total)
+    correct = answers == exam.answer_key
+    right_counts = correct.sum(axis=1)
+
+    groups = []
+    for row, index in enumerate(students):
+        submission = submissions[index]
+        wrong_columns = np.flatnonzero(~correct[row])
+        if len(wrong_columns):
+            groups.append([{**result_item(questions[column], submission.answers[column], False),
+                            "student_id": submission.student_id} for column in wrong_columns])
+        results[index] = {
+            "student_id": submission.student_id,
+            "right_count": int(right_counts[row]),
+            "wrong_count": total - int(right_counts[row]),
+            "total": total,
+            "wrong_question_ids": [exam.question_ids[column] for column in wrong_columns],
+            "is_correct": correct[row].tolist()
+        }
+
+    if groups:
+        wrong_question_writer.submit((exam.subject, groups))
+
+    # 全班每道题的答错人数和错误率
+    graded = len(students)
+    wrong_counts = graded - correct.sum(axis=0)
+    error_rates = wrong_counts / graded if graded else np.zeros(total)
+    return {
+        "exam_id": exam.exam_id,
+        "results": results,
+        "graded": graded,
+        "average_right": float(right_counts.mean()) if graded else 0.0,
+        "questions": [
+            {"id": question_id, "wrong_count": int(wrong), "error_rate": round(float(rate), 4)}
+            for question_id, wrong, rate in zip(exam.question_ids, wrong_counts, error_rates)
+        ]
+    }
+
+# 服务关闭前写完队列中的错题
+@app.on_event("shutdown")
+def flush_wrong_questions():
+    wrong_question_writer.close()
+
 if __name__ == '__main__':
     def open_browser():
         time.sleep(1.2)
@@ -0,0 +1,69 @@
+"""
+文件读写使用的有界线程池。
+
+接口中的同步操作（open/json.load/json.dump/os.listdir、SQLite和向量存储调用）
+都通过 run_io 放到这个线程池中执行，事件循环只等待结果，
+一次大批量上传不会阻塞同一个worker上的其他请求。
+"""
+import json
+import asyncio
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """进程内共享的文件读写线程池，线程数由 config.FILE_IO_WORKERS 限制"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=config.FILE_IO_WORKERS,
+                thread_name_prefix="file-io"
+            )
+            logger.info(f"文件读写线程池已创建，线程数: {config.FILE_IO_WORKERS}")
+        return _executor
+
+
+async def run_io(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """在线程池中执行同步函数并等待结果"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _read_text(path: str) -> str:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _read_json(path: str) -> Any:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+async def read_text(path: str) -> str:
+    """读取文本文件"""
+    return await run_io(_read_text, path)
+
+
+async def read_json(path: str) -> Any:
+    """读取并解析JSON文件，格式错误时抛出json.JSONDecodeError"""
+    return await run_io(_read_json, path)
+
+
+def shutdown(wait: bool = True):
+    """关闭线程池，等待已提交的任务完成"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
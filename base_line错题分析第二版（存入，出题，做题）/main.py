@@ -1,24 +1,34 @@
 import os
 import json
 import uuid
-import hashlib
 import logging
 import re
-from typing import Dict, List, Any, Optional, Union, Tuple
+from typing import Dict, List, Any, Optional, Set, Union, Tuple
 from fastapi import FastAPI, HTTPException, Request, File, UploadFile, Form, Query
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
-import aiofiles
 import asyncio
-from pymilvus import Collection, connections, utility, FieldSchema, CollectionSchema, DataType
-import numpy as np
+import bisect
 import config
+from search_index import document_fields, question_fields, query_terms, subject_from_filename, reciprocal_rank_fusion
+from questions import numbered_questions, expand_questions, extract_question_text, find_question
+from embedding import create_embedder
+from vector_store import create_vector_store
+from catalog import build_preview, content_hash, doc_id_from_filename, encode_token, decode_token
+from search_cache import SearchCache
+from subject_classifier import SubjectClassifier
+from sequence import get_allocator, next_file_id
+import io_pool
+from io_pool import run_io
+from document_store import FileDocumentStore, create_document_store
+from watcher import watch_directories, watch_change_logs
+from students import StudentSpace, StudentSpaces, DEFAULT_STUDENT, normalize_student_id
 from fastapi.middleware.cors import CORSMiddleware
 import shutil
-import glob
 import uvicorn
+import time
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, 
@@ -44,175 +54,232 @@ app.add_middleware(
 # Ensure storage directory exists
 os.makedirs(config.JSON_STORAGE_PATH, exist_ok=True)
 
-# 定义学科列表及其关键词
-SUBJECTS = {
-    "math": ["数学", "math", "mathematics", "计算", "公式", "方程", "函数", "几何", "代数", "微积分", "三角", "概率", "统计"],
-    "english": ["英语", "english", "单词", "词汇", "语法", "阅读理解", "听力", "写作", "口语", "翻译", "外语"],
-    "chinese": ["语文", "chinese", "文言文", "古诗", "阅读", "写作", "作文", "诗词", "散文", "小说", "文学", "汉语"],
-    "physics": ["物理", "physics", "力学", "电学", "热学", "光学", "声学", "磁学", "能量", "功率", "速度", "加速度"],
-    "chemistry": ["化学", "chemistry", "元素", "分子", "原子", "化合物", "反应", "酸碱", "氧化", "还原"],
-    "biology": ["生物", "biology", "生命", "细胞", "基因", "遗传", "进化", "生态", "微生物", "植物", "动物", "人体"],
-    "history": ["历史", "history", "朝代", "年代", "事件", "人物", "战争", "革命", "文化", "政治史", "经济史"],
-    "geography": ["地理", "geography", "地形", "气候", "资源", "人口", "经济", "文化", "环境", "地图", "地球"],
-    "politics": ["政治", "politics", "思想", "制度", "法律", "道德", "社会", "民主", "权利", "义务", "公民"]
-}
-
 # Document model
 class Document(BaseModel):
     content: Union[Dict[str, Any], List[Any]]  # 允许字典或列表
     keywords: Optional[List[str]] = None  # 保持变量名不变，但实际表示备注
     subject: Optional[str] = None  # 新增学科字段
+    student_id: Optional[str] = None  # 所属学生，未指定时存入默认空间
 
 class SearchQuery(BaseModel):
     keyword: str
     subject: Optional[str] = None  # 新增按学科搜索
     limit: int = 10
+    fields: Optional[List[str]] = None  # 只返回指定的字段，未指定时返回完整结果
+    cursor: Optional[str] = None  # 上一页返回的next_cursor
+    student_id: Optional[str] = None  # 只搜索该学生的错题，未指定时搜索默认空间
+
+# 本地向量化引擎
+embedder = create_embedder()
 
-# 简化的向量生成函数，实际应用中应使用更复杂的模型
 def generate_embedding(text: str) -> List[float]:
-    """生成文本的向量嵌入（简化版本）"""
-    # 使用简单的哈希函数生成伪向量
-    hash_obj = hashlib.md5(text.encode())
-    hash_bytes = hash_obj.digest()
-    # 将哈希值转换为浮点数向量
-    vector = [float(byte / 255.0) for byte in hash_bytes]
-    # 确保向量维度为128
-    while len(vector) < 128:
-        vector.extend(vector[:128 - len(vector)])
-    return vector[:128]
+    """生成文本的向量嵌入"""
+    return embedder.embed(text)
+
+def generate_embeddings(texts: List[str]) -> List[List[float]]:
+    """批量生成文本的向量嵌入，一次向量化计算处理所有文本"""
+    return embedder.embed_batch(texts).tolist()
+
+# 由学科关键词编译的多模式匹配自动机，对文本只扫描一遍
+subject_classifier = SubjectClassifier(config.SUBJECTS, default="other")
 
 # 根据文本内容判断学科类别
 def detect_subject(text: str) -> str:
     """
     根据文本内容判断学科类别
-    返回学科的英文名称（如math, english等）
+    返回学科的英文名称（如math, english等），没有匹配到任何学科关键词时返回"other"
     """
-    # 将文本转为小写以便匹配
-    text_lower = text.lower()
-    
-    # 计算每个学科的匹配分数
-    subject_scores = {}
-    for subject, keywords in SUBJECTS.items():
-        score = 0
-        for keyword in keywords:
-            # 计算关键词在文本中出现的次数
-            count = text_lower.count(keyword.lower())
-            score += count
-        subject_scores[subject] = score
-    
-    # 找出得分最高的学科
-    if max(subject_scores.values()) > 0:
-        return max(subject_scores.items(), key=lambda x: x[1])[0]
-    else:
-        # 如果没有匹配到任何学科关键词，返回"other"
-        return "other"
+    return subject_classifier.classify(text)
+
+# 批量判断多个文本的学科类别
+def detect_subjects(texts: List[str]) -> List[str]:
+    """批量判断学科类别，复用同一个自动机"""
+    return subject_classifier.classify_batch(texts)
 
 # 获取下一个学科特定的文档ID
-async def get_next_subject_doc_id(subject: str) -> int:
+async def get_next_subject_doc_id(space: StudentSpace, subject: str) -> int:
     """
     获取指定学科的下一个文档ID
     例如：如果已有math_1.json, math_2.json，则返回3
+    编号由持久化的序列分配，并发上传时不会重复，也不需要扫描存储目录；每个学生的编号单独分配
+    """
+    return await run_io(next_file_id, space.sequence_namespace(subject), subject, space.documents.names)
+
+# 分析JSON内容，判断学科类别
+async def analyze_json_content(content: Union[Dict, List]) -> str:
+    """
+    分析JSON内容，判断学科类别
+    """
+    # 将JSON内容转换为字符串并判断学科类别，大文档的序列化不在事件循环上执行
+    return await run_io(lambda: detect_subject(json.dumps(content, ensure_ascii=False)))
+
+# 批量插入向量存储
+class VectorBatchInserter:
+    """
+    缓冲待插入向量存储的数据，按批次执行插入
+    插入使用向量存储缓存的集合结构（字段、截断长度），向量在每批插入前统一生成
+    向量化和插入在文件读写线程池中执行，不阻塞事件循环
+    每批只执行插入，向量存储在调用 flush() 时统一持久化一次
+    插入的每一行都带有所属学生的 student_id
     """
-    files = os.listdir(config.JSON_STORAGE_PATH)
-    # 筛选出特定学科的文件
-    subject_files = [f for f in files if f.startswith(f"{subject}_") and f.endswith('.json')]
     
-    if not subject_files:
-        return 1
+    def __init__(self, collection, student_id: str = DEFAULT_STUDENT, batch_size: Optional[int] = None):
+        self.collection = collection
+        self.student_id = student_id
+        self.batch_size = batch_size or config.MILVUS_INSERT_BATCH_SIZE
+        self._rows: List[Dict[str, Any]] = []
+        self._pending_flush = False
     
-    # 提取ID部分并找出最大值
-    ids = []
-    for file_name in subject_files:
-        # 使用正则表达式提取数字部分
-        match = re.search(r'_(\d+)\.json$', file_name)
-        if match:
-            ids.append(int(match.group(1)))
+    async def add(self, file_path: str, text_content: str, subject: str, question_id: str = "",
+                  knowledge_points: str = "", question_type: str = ""):
+        """缓冲一行数据，缓冲区满时自动插入"""
+        self._rows.append({
+            "file_path": file_path,
+            "text_content": text_content,
+            "subject": subject,
+            "question_id": question_id,
+            "knowledge_points": knowledge_points,
+            "question_type": question_type,
+            "student_id": self.student_id
+        })
+        if len(self._rows) >= self.batch_size:
+            await self._insert_buffered()
     
-    return max(ids) + 1 if ids else 1
-
-# Connect to Milvus and initialize collection
-async def init_milvus():
-    try:
-        # Connect to Milvus server
-        connections.connect(
-            alias="default", 
-            host=config.MILVUS_HOST, 
-            port=config.MILVUS_PORT
-        )
-        logger.info(f"成功连接到Milvus服务器: {config.MILVUS_HOST}:{config.MILVUS_PORT}")
+    async def add_document(self, file_path: str, json_data: Union[Dict, List], subject: str, remark: str = ""):
+        """把文档拆分为逐题记录后缓冲，remark（备注）会附加到每道题的文本中"""
+        for record in expand_questions(json_data):
+            text_content = record["text"]
+            if remark:
+                text_content = f"{remark} {text_content}"
+            await self.add(file_path, text_content, subject, record["question_id"],
+                           record["knowledge_points"], record["question_type"])
+    
+    async def _insert_buffered(self, raise_errors: bool = False):
+        """插入缓冲区中的所有数据"""
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
         
-        # Check if collection exists, if not create it
-        if not utility.has_collection(config.COLLECTION_NAME):
-            logger.info(f"创建新的Milvus集合: {config.COLLECTION_NAME}")
-            # Define fields for the collection
-            fields = [
-                FieldSchema(name="id", dtype=DataType.VARCHAR, is_primary=True, max_length=100),
-                FieldSchema(name="file_path", dtype=DataType.VARCHAR, max_length=500),
-                FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=128),  # 使用128维向量
-                FieldSchema(name="keywords", dtype=DataType.VARCHAR, max_length=4000),  # 进一步增加最大长度以支持更长的文本
-                FieldSchema(name="subject", dtype=DataType.VARCHAR, max_length=50),  # 确保添加学科字段
-            ]
-            
-            # Create collection schema
-            schema = CollectionSchema(fields=fields, description="Wrong documents collection")
-            
-            # Create collection
-            collection = Collection(name=config.COLLECTION_NAME, schema=schema)
-            
-            # 创建索引
-            index_params = {
-                "metric_type": "L2",
-                "index_type": "IVF_FLAT",
-                "params": {"nlist": 128}
-            }
-            collection.create_index(field_name="embedding", index_params=index_params)
-            logger.info(f"创建索引成功")
-        else:
-            # Get existing collection
-            logger.info(f"使用现有的Milvus集合: {config.COLLECTION_NAME}")
-            collection = Collection(name=config.COLLECTION_NAME)
-            
-            # 检查现有集合的字段结构
-            schema = collection.schema
-            field_names = [field.name for field in schema.fields]
-            logger.info(f"现有集合字段: {field_names}")
-            
-            # 如果keywords字段长度不足，提示用户
-            if "keywords" in field_names:
-                keywords_field = next((f for f in schema.fields if f.name == "keywords"), None)
-                if keywords_field and hasattr(keywords_field, 'max_length'):
-                    logger.warning(f"警告: 'keywords'字段最大长度为{keywords_field.max_length}，可能导致长文本被截断")
-            
-            # 如果缺少subject字段，记录警告
-            if "subject" not in field_names:
-                logger.warning(f"警告: 现有集合缺少'subject'字段，某些功能可能无法正常工作")
+        try:
+            await run_io(self._insert_rows, rows)
+            self._pending_flush = True
+            # 新的向量已可被搜索到，缓存的搜索结果失效
+            app.state.search_cache.bump_generation()
+        except Exception as e:
+            logger.error(f"添加到向量数据库时出错(文件仍然已保存): {str(e)}")
+            if raise_errors:
+                raise
+    
+    async def flush(self, raise_errors: bool = False):
+        """插入缓冲区中的剩余数据，并持久化本次插入的所有数据"""
+        await self._insert_buffered(raise_errors)
+        if not self._pending_flush:
+            return
+        self._pending_flush = False
+        try:
+            await run_io(self.collection.flush)
+        except Exception as e:
+            logger.error(f"持久化向量数据库时出错(文件仍然已保存): {str(e)}")
+            if raise_errors:
+                raise
+    
+    def _insert_rows(self, rows: List[Dict[str, Any]]):
+        """生成向量并插入一批数据（在线程池中执行）"""
+        # 批量生成向量嵌入，知识点一起参与向量化
+        embeddings = generate_embeddings([
+            f"{row['text_content']} {row['knowledge_points']}" for row in rows
+        ])
         
-        # Load collection
-        collection.load()
-        logger.info(f"Milvus集合加载成功")
-        return collection
-    except Exception as e:
-        logger.error(f"初始化Milvus时出错: {str(e)}")
-        raise
+        # 基本字段
+        data_dict = {
+            "id": [str(uuid.uuid4()) for _ in rows],
+            "file_path": [row["file_path"] for row in rows],
+            "embedding": embeddings
+        }
+        
+        # 按集合结构的插入模板添加其他字段，截断过长的文本，避免超出Milvus字段长度限制
+        # 旧集合没有逐题字段时按整篇文档处理
+        for field, row_key, limit in self.collection.metadata.insert_template:
+            values = [row[row_key] for row in rows]
+            if limit is not None:
+                if field == "keywords" and any(len(value) > limit for value in values):
+                    logger.warning(f"文本长度超过安全长度({limit})，进行截断")
+                values = [value[:limit] for value in values]
+            data_dict[field] = values
+        
+        # 执行插入
+        self.collection.insert(data_dict)
+        logger.info(f"批量添加到向量数据库: {len(rows)} 道题目")
 
-# 分析JSON内容，判断学科类别
-async def analyze_json_content(content: Union[Dict, List]) -> str:
+# 登记新保存的文档
+def register_document(space: StudentSpace, file_name: str, file_text: str, json_data: Union[Dict, List], subject: str):
+    """文档写入学生的存储目录后，更新该学生的关键词倒排索引和文档元数据目录，并使搜索缓存失效"""
+    space.search_index.add_document(file_name, document_fields(json_data), subject)
+    space.bm25_index.add_document(file_name, bm25_questions(json_data), subject)
+    app.state.search_cache.bump_generation()
+    space.catalog.upsert(
+        file_name,
+        subject,
+        len(file_text.encode('utf-8')),
+        time.time(),
+        build_preview(json_data)
+    )
+
+# 保存文档到文档存储
+def save_document(space: StudentSpace, file_name: str, json_data: Union[Dict, List], subject: str) -> str:
     """
-    分析JSON内容，判断学科类别
+    写入文档存储，然后登记到索引和元数据目录，返回文档的逻辑路径
+    包含文件写入和SQLite操作，需要通过 run_io 在线程池中调用
     """
-    # 将JSON内容转换为字符串
-    content_str = json.dumps(content, ensure_ascii=False)
-    # 判断学科类别
-    return detect_subject(content_str)
+    file_text = space.documents.put(file_name, subject, json_data)
+    space.mark_indexed(file_name)
+    register_document(space, file_name, file_text, json_data, subject)
+    return space.documents.path_for(file_name)
+
+# 查找内容相同的已有文档
+def find_duplicate_document(space: StudentSpace, digest: str) -> Optional[str]:
+    """返回学生空间中内容哈希对应的已有文档名，登记的文档已被删除时清除登记并返回None（需要通过 run_io 调用）"""
+    file_name = space.catalog.find_by_hash(digest)
+    if file_name is None:
+        return None
+    if file_name not in space.search_index and not space.documents.exists(file_name):
+        space.catalog.release_hash(digest, file_name)
+        return None
+    return file_name
+
+# 保存新上传的文档，内容相同的文档只保存一次
+async def store_new_document(space: StudentSpace, json_data: Union[Dict, List], subject: str) -> Tuple[str, str, bool]:
+    """
+    在学生空间中按内容哈希查找已有的相同文档，存在时直接返回该文档；否则分配编号并保存
+    返回 (文件名, 逻辑路径, 是否新保存)，只有新保存的文档需要插入向量存储
+    """
+    digest = await run_io(content_hash, json_data)
+    existing = await run_io(find_duplicate_document, space, digest)
+    if existing is None:
+        # 获取下一个学科特定的文档ID
+        doc_id = await get_next_subject_doc_id(space, subject)
+        file_name = f"{subject}_{doc_id}.json"
+        # 并发上传相同内容时只有先登记的请求保存文档
+        existing = await run_io(space.catalog.claim_hash, digest, file_name)
+        if existing == file_name:
+            logger.info(f"保存文件到: {space.documents.path_for(file_name)}")
+            try:
+                file_path = await run_io(save_document, space, file_name, json_data, subject)
+            except Exception:
+                await run_io(space.catalog.release_hash, digest, file_name)
+                raise
+            return file_name, file_path, True
+    
+    logger.info(f"内容与已有文档 {existing} 相同，不重复保存")
+    return existing, space.documents.path_for(existing), False
 
 # 处理单个JSON文件存储
-async def process_json_file(file_path: str, keywords: List[str] = None, subject_override: str = None):
+async def process_json_file(file_path: str, keywords: List[str] = None, subject_override: str = None,
+                            student_id: Optional[str] = None):
     try:
         logger.info(f"处理JSON文件: {file_path}")
         # 读取JSON文件内容
-        async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-            content = await f.read()
-            json_content = json.loads(content)
+        json_content = await io_pool.read_json(file_path)
         
         # 如果没有指定学科，自动判断
         subject = subject_override
@@ -221,7 +288,7 @@ async def process_json_file(file_path: str, keywords: List[str] = None, subject_
             logger.info(f"自动判断学科: {subject}")
         
         # 创建Document对象
-        document = Document(content=json_content, keywords=keywords, subject=subject)
+        document = Document(content=json_content, keywords=keywords, subject=subject, student_id=student_id)
         
         # 存储文档
         return await store_document(document)
@@ -232,12 +299,69 @@ async def process_json_file(file_path: str, keywords: List[str] = None, subject_
 # 使用lifespan代替on_event (将在后续版本更新)
 @app.on_event("startup")
 async def startup_event():
-    app.state.collection = await init_milvus()
+    # 做题时保存的错题存储
+    app.state.error_documents = await run_io(create_document_store, config.ERROR_QUESTION_PATH, True)
+    error_cursor = await run_io(app.state.error_documents.change_cursor)
+    if hasattr(app.state.error_documents, "start_compactor"):
+        app.state.error_documents.start_compactor()
+    
+    app.state.collection = await run_io(create_vector_store)
     
     # 检查并记录集合结构
-    field_names = [field.name for field in app.state.collection.schema.fields]
-    logger.info(f"Milvus集合字段: {field_names}")
-    app.state.milvus_fields = field_names
+    logger.info(f"向量存储字段: {app.state.collection.field_names}")
+    
+    # 按学生划分的错题空间（文档存储、倒排索引、BM25索引、元数据目录、解析缓存）
+    # 默认空间使用原来的错题文档目录，启动时打开；学生空间在第一次访问时打开
+    app.state.spaces = StudentSpaces(bm25_questions)
+    await run_io(app.state.spaces.get, DEFAULT_STUDENT)
+    app.state.spaces.start_compactor()
+    
+    # 搜索结果缓存，写入数据时整体失效
+    app.state.search_cache = SearchCache(config.SEARCH_CACHE_SIZE, config.SEARCH_CACHE_TTL)
+    
+    # 监视错题文档目录和做题时保存的错题目录，新文件自动加入索引和向量存储；
+    # 段文件存储不在目录监视范围内，其他进程写入的文档通过存储的变更记录发现
+    app.state.sync_lock = asyncio.Lock()
+    app.state.watchers = []
+    if config.WATCH_ENABLED:
+        default_space = app.state.spaces.get(DEFAULT_STUDENT)
+        app.state.watchers = [
+            asyncio.ensure_future(
+                watch_directories([config.JSON_STORAGE_PATH, config.ERROR_QUESTION_PATH], on_storage_change)
+            ),
+            asyncio.ensure_future(watch_change_logs(
+                {config.JSON_STORAGE_PATH: default_space.documents,
+                 config.ERROR_QUESTION_PATH: app.state.error_documents},
+                {config.JSON_STORAGE_PATH: default_space.change_cursor,
+                 config.ERROR_QUESTION_PATH: error_cursor},
+                on_storage_change
+            ))
+        ]
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # 停止目录监视
+    for watcher in app.state.watchers:
+        watcher.cancel()
+        try:
+            await watcher
+        except asyncio.CancelledError:
+            pass
+    # 持久化向量存储中尚未保存的数据
+    await run_io(app.state.collection.flush)
+    # 停止段文件压缩线程
+    await run_io(app.state.spaces.close)
+    await run_io(app.state.error_documents.close)
+    io_pool.shutdown()
+
+# 获取请求对应的学生空间
+async def get_space(student_id: Optional[str]) -> StudentSpace:
+    """校验student_id并返回对应的学生空间，未指定时返回默认空间，格式不正确时返回400"""
+    try:
+        student_id = normalize_student_id(student_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await run_io(app.state.spaces.get, student_id)
 
 # 主页路由
 @app.get("/")
@@ -255,9 +379,7 @@ async def favicon():
 async def get_subjects():
     """获取错题目录中的所有科目"""
     try:
-        ERROR_BASE_DIR = "/root/error_question"
-        subjects = [d for d in os.listdir(ERROR_BASE_DIR) 
-                   if os.path.isdir(os.path.join(ERROR_BASE_DIR, d)) and not d.startswith('.')]
+        subjects = await run_io(app.state.error_documents.subjects)
         
         logger.info(f"获取到的科目列表: {subjects}")
         
@@ -291,46 +413,33 @@ async def get_subjects():
 # Store document endpoint
 @app.post("/documents/", status_code=201)
 async def store_document(document: Document):
+    space = await get_space(document.student_id)
     try:
         # 如果没有指定学科，自动判断
         if not document.subject:
             document.subject = await analyze_json_content(document.content)
             logger.info(f"自动判断学科: {document.subject}")
         
-        # 获取下一个学科特定的文档ID
-        doc_id = await get_next_subject_doc_id(document.subject)
-        file_name = f"{document.subject}_{doc_id}.json"
-        file_path = os.path.join(config.JSON_STORAGE_PATH, file_name)
-        
-        # Save document to file
-        async with aiofiles.open(file_path, 'w') as f:
-            await f.write(json.dumps(document.content, ensure_ascii=False, indent=2))
-        
-        # 准备备注文本
-        keywords_text = ""
-        if document.keywords:
-            keywords_text = ",".join(document.keywords)
-        else:
-            # 如果没有提供备注，则提取文档内容作为默认备注
-            content_str = json.dumps(document.content)
-            keywords_text = content_str[:1000]  # 限制长度
-        
-        # 生成向量嵌入
-        embedding = generate_embedding(keywords_text)
-        
-        # Insert data into Milvus
-        collection = app.state.collection
-        doc_unique_id = str(uuid.uuid4())
+        # Save document to file，内容相同时对应已有文档
+        file_name, file_path, created = await store_new_document(space, document.content, document.subject)
+        subject, doc_id = parse_file_name(file_name)
+        if not created:
+            return {
+                "id": doc_id,
+                "subject": subject,
+                "file_name": file_name,
+                "duplicate": True,
+                "message": "Document already exists"
+            }
         
-        logger.info(f"向Milvus插入文档: ID={doc_id}, UUID={doc_unique_id}, 学科={document.subject}, 文件路径={file_path}")
+        # 备注文本附加到每道题的向量化文本中
+        remark = ",".join(document.keywords) if document.keywords else ""
         
-        collection.insert([
-            [doc_unique_id],      # id
-            [file_path],          # file_path
-            [embedding],          # embedding
-            [keywords_text],      # 备注文本
-            [document.subject],   # 学科
-        ])
+        # 按题目拆分后插入向量存储
+        logger.info(f"向向量存储插入文档: ID={doc_id}, 学科={document.subject}, 文件路径={file_path}")
+        inserter = VectorBatchInserter(app.state.collection, space.student_id)
+        await inserter.add_document(file_path, document.content, document.subject, remark)
+        await inserter.flush(raise_errors=True)
         
         logger.info(f"文档存储成功: ID={doc_id}, 学科={document.subject}, 文件名={file_name}")
         return {
@@ -348,9 +457,11 @@ async def store_document(document: Document):
 @app.post("/upload/")
 async def upload_file(
     file: UploadFile = File(...),
-    keywords: str = Form("")
+    keywords: str = Form(""),
+    student_id: Optional[str] = Form(None)
 ):
-    """上传单个JSON文件"""
+    """上传单个JSON文件，指定student_id时存入该学生的空间"""
+    space = await get_space(student_id)
     try:
         logger.info(f"接收到上传文件请求: {file.filename}")
         # 验证文件类型
@@ -367,7 +478,7 @@ async def upload_file(
         
         # 验证JSON格式
         try:
-            json_data = json.loads(file_content)
+            json_data = await run_io(json.loads, file_content)
         except json.JSONDecodeError:
             raise HTTPException(status_code=400, detail="无效的JSON格式")
         
@@ -375,655 +486,924 @@ async def upload_file(
         subject = await analyze_json_content(json_data)
         logger.info(f"自动识别文件 {original_filename} 的学科为: {subject}")
         
-        # 获取下一个学科特定的文档ID
-        doc_id = await get_next_subject_doc_id(subject)
-        filename = f"{subject}_{doc_id}.json"
-        file_path = os.path.join(config.JSON_STORAGE_PATH, filename)
+        # 保存文件，内容相同时对应已有文档
+        filename, file_path, created = await store_new_document(space, json_data, subject)
+        if not created:
+            return {"success": True, "filename": filename, "duplicate": True,
+                    "message": f"文件内容与已有文档 {filename} 相同，未重复上传"}
         
-        logger.info(f"保存文件到: {file_path}")
-        # 保存文件
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(json_data, f, ensure_ascii=False, indent=2)
+        # 提取文本内容用于向量化并添加到向量数据库
+        inserter = VectorBatchInserter(app.state.collection, space.student_id)
+        await inserter.add_document(file_path, json_data, subject)
+        await inserter.flush()
         
-        # 提取文本内容用于向量化 - 使用与upload_directory相同的逻辑
-        text_content = ""
-        if isinstance(json_data, list):
-            # 限制处理的条目数量，避免生成过长的文本
-            items_to_process = json_data[:5] if len(json_data) > 5 else json_data
-            for item in items_to_process:
-                if isinstance(item, dict):
-                    # 只使用最重要的字段
-                    important_fields = ['content', 'question', 'title', 'description']
-                    for field in important_fields:
-                        if field in item and item[field]:
-                            text_content += str(item[field]) + " "
-                            break
-                    # 如果没有找到重要字段，添加前3个值
-                    if not text_content and len(item) > 0:
-                        text_content += " ".join(str(v) for v in list(item.values())[:3] if v)
-        elif isinstance(json_data, dict):
-            # 只使用最重要的字段或前5个值
-            important_fields = ['content', 'question', 'title', 'description']
-            for field in important_fields:
-                if field in json_data and json_data[field]:
-                    text_content += str(json_data[field]) + " "
-                    break
-            # 如果没有找到重要字段，添加前5个值
-            if not text_content:
-                text_content += " ".join(str(v) for v in list(json_data.values())[:5] if v)
+        logger.info(f"文件上传成功: {filename}")
+        return {"success": True, "filename": filename, "message": f"文件已成功上传为 {filename}"}
+    
+    except Exception as e:
+        logger.error(f"上传失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
+
+# 处理上传文件夹中的单个文件
+async def process_directory_file(file: UploadFile, space: StudentSpace, inserter: VectorBatchInserter,
+                                 semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+    """
+    读取、解析、判断学科并保存一个上传的文件，向量数据缓冲到共享的inserter中
+    返回该文件的处理结果，status为 success / duplicate / skipped / error，单个文件失败不影响其他文件
+    """
+    result: Dict[str, Any] = {"file": file.filename, "filename": None, "subject": None}
+    if not file.filename.endswith('.json'):
+        return {**result, "status": "skipped", "message": "不是JSON文件"}
+    
+    async with semaphore:
+        # 获取文件名（去除路径）
+        original_filename = os.path.basename(file.filename)
+        logger.info(f"处理文件: {original_filename}，原始路径: {file.filename}")
         
-        # 生成向量嵌入
-        embedding = generate_embedding(text_content)
+        # 读取文件内容并验证JSON格式
+        try:
+            content = await file.read()
+            json_data = await run_io(json.loads, content.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            logger.warning(f"跳过无效的JSON文件: {original_filename}")
+            return {**result, "status": "skipped", "message": "无效的JSON格式"}
         
-        # 添加到Milvus向量数据库
         try:
-            collection = app.state.collection
-            doc_unique_id = str(uuid.uuid4())
+            # 分析文档内容确定学科
+            subject = await analyze_json_content(json_data)
+            logger.info(f"自动识别文件 {original_filename} 的学科为: {subject}")
             
-            # 截断过长的文本内容，避免超出Milvus字段长度限制
-            keywords_max_length = 1000  # 默认值
+            # 保存文件，内容相同时对应已有文档
+            filename, file_path, created = await store_new_document(space, json_data, subject)
+            if not created:
+                return {**result, "status": "duplicate", "filename": filename,
+                        "subject": parse_file_name(filename)[0], "message": f"内容与已有文档 {filename} 相同"}
             
-            # 尝试获取字段的实际长度限制
-            try:
-                schema = collection.schema
-                keywords_field = next((f for f in schema.fields if f.name == "keywords"), None)
-                if keywords_field and hasattr(keywords_field, 'max_length'):
-                    keywords_max_length = keywords_field.max_length
-            except Exception as e:
-                logger.warning(f"无法获取keywords字段长度限制: {str(e)}")
-            
-            # 计算安全截断长度（预留一些空间）
-            safe_length = keywords_max_length - 100
-            if safe_length < 100:
-                safe_length = 100  # 确保至少有一些内容
-                
-            # 检查文本长度
-            if len(text_content) > safe_length:
-                logger.warning(f"文本长度({len(text_content)})超过安全长度({safe_length})，进行截断")
-                text_content_truncated = text_content[:safe_length]
-            else:
-                text_content_truncated = text_content
-            
-            # 准备要插入的数据
-            insert_data = []
-            
-            # 根据集合结构动态构建插入数据
-            field_names = getattr(app.state, 'milvus_fields', [])
-            
-            # 基本字段
-            data_dict = {
-                "id": [doc_unique_id], 
-                "file_path": [file_path],
-                "embedding": [embedding]
-            }
-            
-            # 添加keywords字段(如果存在)
-            if "keywords" in field_names:
-                data_dict["keywords"] = [text_content_truncated]
-                
-            # 添加subject字段(如果存在)
-            if "subject" in field_names:
-                data_dict["subject"] = [subject]
-            
-            # 构造插入列表
-            for field in field_names:
-                if field in data_dict:
-                    insert_data.append(data_dict[field])
-            
-            # 执行插入
-            if insert_data:
-                collection.insert(insert_data)
-                logger.info(f"文件已添加到Milvus向量数据库: {filename}")
+            # 提取文本内容用于向量化，缓冲后批量添加到向量数据库
+            await inserter.add_document(file_path, json_data, subject)
         except Exception as e:
-            logger.error(f"添加到Milvus时出错(文件仍然已保存): {str(e)}")
-        
-        logger.info(f"文件上传成功: {filename}")
-        return {"success": True, "filename": filename, "message": f"文件已成功上传为 {filename}"}
+            logger.error(f"处理文件 {original_filename} 失败: {str(e)}")
+            return {**result, "status": "error", "message": str(e)}
     
-    except Exception as e:
-        logger.error(f"上传失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
+    return {**result, "status": "success", "filename": filename, "subject": subject,
+            "message": f"已保存为 {filename}"}
+
+# 汇总上传文件夹的处理结果
+def summarize_directory_upload(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """根据逐个文件的处理结果生成接口返回的汇总信息"""
+    uploaded_files = [r["filename"] for r in results if r["status"] == "success"]
+    duplicate_files = [{"file": r["file"], "filename": r["filename"]} for r in results if r["status"] == "duplicate"]
+    failed_files = [{"file": r["file"], "message": r["message"]} for r in results if r["status"] == "error"]
+    if not uploaded_files and not duplicate_files:
+        logger.warning("没有找到有效的JSON文件")
+        return {"success": False, "failed": failed_files, "message": "没有找到有效的JSON文件"}
+    
+    message = f"成功上传了 {len(uploaded_files)} 个JSON文件"
+    if duplicate_files:
+        message += f"，{len(duplicate_files)} 个文件与已有文档相同"
+    if failed_files:
+        message += f"，{len(failed_files)} 个文件处理失败"
+    logger.info(message)
+    return {
+        "success": True, 
+        "files": uploaded_files, 
+        "count": len(uploaded_files),
+        "duplicates": duplicate_files,
+        "failed": failed_files,
+        "message": message
+    }
 
 # 上传文件夹中的JSON文件
 @app.post("/upload-directory/")
 async def upload_directory(
     files: List[UploadFile] = File(...),
-    keywords: str = Form("")
+    keywords: str = Form(""),
+    stream: bool = Form(False),
+    student_id: Optional[str] = Form(None)
 ):
-    """上传文件夹中的多个JSON文件"""
+    """
+    上传文件夹中的多个JSON文件
+    文件按 config.UPLOAD_CONCURRENCY 并发处理；stream=true 时以NDJSON逐行返回每个文件的处理结果，
+    最后一行是 type 为 summary 的汇总结果
+    """
+    space = await get_space(student_id)
     try:
-        logger.info(f"接收到上传文件夹请求，文件数量: {len(files)}")
-        uploaded_files = []
+        logger.info(f"接收到上传文件夹请求，文件数量: {len(files)}，流式返回: {stream}")
+        inserter = VectorBatchInserter(app.state.collection, space.student_id)
+        semaphore = asyncio.Semaphore(config.UPLOAD_CONCURRENCY)
+        tasks = [asyncio.ensure_future(process_directory_file(file, space, inserter, semaphore)) for file in files]
         
-        for file in files:
-            if file.filename.endswith('.json'):
-                # 获取文件名（去除路径）
-                original_filename = os.path.basename(file.filename)
-                logger.info(f"处理文件: {original_filename}，原始路径: {file.filename}")
-                
-                # 读取文件内容
-                content = await file.read()
-                file_content = content.decode('utf-8')
-                
-                # 验证JSON格式
-                try:
-                    json_data = json.loads(file_content)
-                except json.JSONDecodeError:
-                    logger.warning(f"跳过无效的JSON文件: {original_filename}")
-                    continue  # 跳过无效的JSON文件
-                
-                # 分析文档内容确定学科
-                subject = await analyze_json_content(json_data)
-                logger.info(f"自动识别文件 {original_filename} 的学科为: {subject}")
-                
-                # 获取下一个学科特定的文档ID
-                doc_id = await get_next_subject_doc_id(subject)
-                filename = f"{subject}_{doc_id}.json"
-                file_path = os.path.join(config.JSON_STORAGE_PATH, filename)
-                
-                logger.info(f"保存文件到: {file_path}")
-                # 保存文件
-                with open(file_path, "w", encoding="utf-8") as f:
-                    json.dump(json_data, f, ensure_ascii=False, indent=2)
-                
-                # 提取文本内容用于向量化
-                text_content = ""
-                if isinstance(json_data, list):
-                    # 限制处理的条目数量，避免生成过长的文本
-                    items_to_process = json_data[:5] if len(json_data) > 5 else json_data
-                    for item in items_to_process:
-                        if isinstance(item, dict):
-                            # 只使用最重要的字段
-                            important_fields = ['content', 'question', 'title', 'description']
-                            for field in important_fields:
-                                if field in item and item[field]:
-                                    text_content += str(item[field]) + " "
-                                    break
-                            # 如果没有找到重要字段，添加前3个值
-                            if not text_content and len(item) > 0:
-                                text_content += " ".join(str(v) for v in list(item.values())[:3] if v)
-                elif isinstance(json_data, dict):
-                    # 只使用最重要的字段或前5个值
-                    important_fields = ['content', 'question', 'title', 'description']
-                    for field in important_fields:
-                        if field in json_data and json_data[field]:
-                            text_content += str(json_data[field]) + " "
-                            break
-                    # 如果没有找到重要字段，添加前5个值
-                    if not text_content:
-                        text_content += " ".join(str(v) for v in list(json_data.values())[:5] if v)
-                
-                # 生成向量嵌入
-                embedding = generate_embedding(text_content)
-                
-                # 添加到Milvus向量数据库
-                try:
-                    collection = app.state.collection
-                    doc_unique_id = str(uuid.uuid4())
-                    
-                    # 截断过长的文本内容，避免超出Milvus字段长度限制
-                    keywords_max_length = 1000  # 默认值
-                    
-                    # 尝试获取字段的实际长度限制
-                    try:
-                        schema = collection.schema
-                        keywords_field = next((f for f in schema.fields if f.name == "keywords"), None)
-                        if keywords_field and hasattr(keywords_field, 'max_length'):
-                            keywords_max_length = keywords_field.max_length
-                    except Exception as e:
-                        logger.warning(f"无法获取keywords字段长度限制: {str(e)}")
-                    
-                    # 计算安全截断长度（预留一些空间）
-                    safe_length = keywords_max_length - 100
-                    if safe_length < 100:
-                        safe_length = 100  # 确保至少有一些内容
-                        
-                    # 检查文本长度
-                    if len(text_content) > safe_length:
-                        logger.warning(f"文本长度({len(text_content)})超过安全长度({safe_length})，进行截断")
-                        text_content_truncated = text_content[:safe_length]
-                    else:
-                        text_content_truncated = text_content
-                    
-                    # 准备要插入的数据
-                    insert_data = []
-                    
-                    # 根据集合结构动态构建插入数据
-                    field_names = getattr(app.state, 'milvus_fields', [])
-                    
-                    # 基本字段
-                    data_dict = {
-                        "id": [doc_unique_id], 
-                        "file_path": [file_path],
-                        "embedding": [embedding]
-                    }
-                    
-                    # 添加keywords字段(如果存在)
-                    if "keywords" in field_names:
-                        data_dict["keywords"] = [text_content_truncated]
-                        
-                    # 添加subject字段(如果存在)
-                    if "subject" in field_names:
-                        data_dict["subject"] = [subject]
-                    
-                    # 构造插入列表
-                    for field in field_names:
-                        if field in data_dict:
-                            insert_data.append(data_dict[field])
-                    
-                    # 执行插入
-                    if insert_data:
-                        collection.insert(insert_data)
-                        logger.info(f"文件已添加到Milvus向量数据库: {filename}")
-                except Exception as e:
-                    logger.error(f"添加到Milvus时出错(文件仍然已保存): {str(e)}")
-                
-                uploaded_files.append(filename)
+        if not stream:
+            try:
+                results = await asyncio.gather(*tasks)
+            finally:
+                # 插入剩余的缓冲数据
+                await inserter.flush()
+            return summarize_directory_upload(results)
         
-        if not uploaded_files:
-            logger.warning("没有找到有效的JSON文件")
-            return {"success": False, "message": "没有找到有效的JSON文件"}
+        async def stream_results():
+            results = []
+            try:
+                for task in asyncio.as_completed(tasks):
+                    result = await task
+                    results.append(result)
+                    line = {"type": "file", "done": len(results), "total": len(tasks), **result}
+                    yield json.dumps(line, ensure_ascii=False) + "\n"
+                
+                # 插入剩余的缓冲数据
+                await inserter.flush()
+                yield json.dumps({"type": "summary", **summarize_directory_upload(results)}, ensure_ascii=False) + "\n"
+            finally:
+                # 客户端断开连接时取消尚未开始的文件
+                for task in tasks:
+                    task.cancel()
         
-        logger.info(f"成功上传了 {len(uploaded_files)} 个JSON文件")
-        return {
-            "success": True, 
-            "files": uploaded_files, 
-            "count": len(uploaded_files),
-            "message": f"成功上传了 {len(uploaded_files)} 个JSON文件"
-        }
+        return StreamingResponse(stream_results(), media_type="application/x-ndjson")
     
     except Exception as e:
         logger.error(f"上传失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
 
+# 历史错题同步清单中的来源标识前缀
+HISTORY_SOURCE_PREFIX = "error_question:"
+
+# 找出需要同步的历史错题
+def scan_history_sources(space: StudentSpace, subjects: Optional[List[str]],
+                         names: Optional[Set[str]] = None) -> Tuple[List[Tuple[str, str, str]], int, List[str]]:
+    """
+    对比错题存储中每个文件的版本和学生空间的同步清单，只返回新增或变化的文件（需要通过 run_io 调用）
+    names 不为None时只检查这些文件，不列出整个学科；此时 subjects 为None表示不限学科
+    返回 (待同步的 [(学科, 文件名, 版本)], 未变化的文件数, 已不存在的来源)
+    """
+    error_documents = app.state.error_documents
+    synced = space.catalog.sync_sources(HISTORY_SOURCE_PREFIX)
+    if names is None:
+        candidates = [(subj, json_file) for subj in subjects for json_file in error_documents.names(subj)]
+    else:
+        # 错题文件按学科命名并保存在学科目录中
+        candidates = [(subject_from_filename(json_file), json_file) for json_file in sorted(names)
+                      if subjects is None or subject_from_filename(json_file) in subjects]
+    pending = []
+    unchanged = 0
+    seen = set()
+    for subj, json_file in candidates:
+        source = f"{HISTORY_SOURCE_PREFIX}{subj}/{json_file}"
+        try:
+            version = json.dumps(error_documents.version(json_file))
+        except KeyError:
+            continue
+        seen.add(source)
+        record = synced.get(source)
+        # 来源未变化，且同步生成的文档仍然存在
+        if record is not None and record[0] == version and record[1] in space.search_index:
+            unchanged += 1
+            continue
+        pending.append((subj, json_file, version))
+    # 只清理本次检查的学科或文件中已不存在的来源
+    if names is None:
+        scanned = tuple(f"{HISTORY_SOURCE_PREFIX}{subj}/" for subj in subjects)
+        missing = [source for source in synced if source.startswith(scanned) and source not in seen]
+    else:
+        checked = {f"{HISTORY_SOURCE_PREFIX}{subj}/{json_file}" for subj, json_file in candidates}
+        missing = [source for source in synced if source in checked and source not in seen]
+    return pending, unchanged, missing
+
+# 同步历史错题到学生空间
+async def sync_history_sources(space: StudentSpace, subjects: Optional[List[str]],
+                               names: Optional[Set[str]] = None) -> Tuple[List[Dict[str, str]], List[Dict[str, str]], int]:
+    """
+    把错题存储中新增或变化的文件保存到学生空间并插入向量存储，同一时间只执行一次同步
+    names 不为None时只同步这些文件（subjects 为None表示不限学科）
+    返回 (新保存的文件, 与已有文档相同的文件, 未变化的文件数)
+    """
+    error_documents = app.state.error_documents
+    async with app.state.sync_lock:
+        pending, unchanged, missing = await run_io(scan_history_sources, space, subjects, names)
+        if missing:
+            await run_io(space.catalog.remove_sync_sources, missing)
+        logger.info(f"历史错题: {len(pending)} 个文件需要同步，{unchanged} 个文件未变化")
+        
+        uploaded_files = []
+        duplicate_files = []
+        inserter = VectorBatchInserter(app.state.collection, space.student_id)
+        
+        for subj, json_file, version in pending:
+            # 读取JSON内容
+            try:
+                json_data = await run_io(error_documents.get, json_file)
+            except (json.JSONDecodeError, KeyError):
+                logger.warning(f"跳过无效的JSON文件: {error_documents.path_for(json_file)}")
+                continue  # 跳过无效的JSON文件
+            
+            # 保存到错题文档存储，内容相同时对应已有文档
+            new_filename, dest_path, created = await store_new_document(space, json_data, subj)
+            if created:
+                # 提取文本内容用于向量化，缓冲后批量添加到向量数据库
+                await inserter.add_document(dest_path, json_data, subj)  # 直接使用科目文件夹名称
+                uploaded_files.append({
+                    "filename": new_filename,
+                    "original": json_file,
+                    "subject": subj
+                })
+            else:
+                duplicate_files.append({"filename": new_filename, "original": json_file, "subject": subj})
+            await run_io(space.catalog.record_sync_source,
+                         f"{HISTORY_SOURCE_PREFIX}{subj}/{json_file}", version, new_filename)
+        
+        # 插入剩余的缓冲数据
+        await inserter.flush()
+    return uploaded_files, duplicate_files, unchanged
+
 # 上传历史错题文件
 @app.post("/upload-history/")
 async def upload_history_questions(
     subject: Optional[str] = Form(None),
-    keywords: str = Form("")
+    keywords: str = Form(""),
+    student_id: Optional[str] = Form(None)
 ):
-    """上传本地error_question目录中的历史错题"""
+    """
+    上传做题时保存的历史错题（error_question存储）到指定学生的空间
+    同步清单记录每个来源文件的版本，未变化的文件直接跳过；内容与已有文档相同的文件不重复保存
+    """
+    space = await get_space(student_id)
     try:
         logger.info(f"接收到上传历史错题请求，科目: {subject or '全部'}")
-        # 错题基础目录
-        ERROR_BASE_DIR = "/root/error_question"
+        error_documents = app.state.error_documents
         
         # 如果未指定科目，获取所有科目的错题
         if not subject:
-            # 获取所有科目目录
-            subject_dirs = [d for d in os.listdir(ERROR_BASE_DIR) 
-                           if os.path.isdir(os.path.join(ERROR_BASE_DIR, d)) and not d.startswith('.')]
+            # 获取所有科目
+            subject_dirs = await run_io(error_documents.subjects)
             logger.info(f"获取所有科目: {subject_dirs}")
         else:
             # 仅获取指定科目
-            if not os.path.isdir(os.path.join(ERROR_BASE_DIR, subject)):
+            if subject not in await run_io(error_documents.subjects):
                 logger.error(f"未找到科目目录: {subject}")
                 raise HTTPException(status_code=404, detail=f"未找到科目 '{subject}' 的错题目录")
             subject_dirs = [subject]
         
-        uploaded_files = []
+        uploaded_files, duplicate_files, unchanged = await sync_history_sources(space, subject_dirs)
         
-        # 遍历每个科目目录
-        for subj in subject_dirs:
-            subj_dir = os.path.join(ERROR_BASE_DIR, subj)
-            json_files = [f for f in os.listdir(subj_dir) if f.endswith('.json')]
-            logger.info(f"科目 {subj} 中找到 {len(json_files)} 个JSON文件")
-            
-            for json_file in json_files:
-                src_path = os.path.join(subj_dir, json_file)
-                
-                # 读取JSON内容
-                with open(src_path, 'r', encoding='utf-8') as f:
-                    try:
-                        json_data = json.load(f)
-                    except json.JSONDecodeError:
-                        logger.warning(f"跳过无效的JSON文件: {src_path}")
-                        continue  # 跳过无效的JSON文件
-                
-                # 获取下一个学科特定的文档ID
-                doc_id = await get_next_subject_doc_id(subj)
-                new_filename = f"{subj}_{doc_id}.json"
-                dest_path = os.path.join(config.JSON_STORAGE_PATH, new_filename)
-                
-                logger.info(f"保存文件到: {dest_path}")
-                # 保存到错题文档存储目录
-                with open(dest_path, "w", encoding="utf-8") as f:
-                    json.dump(json_data, f, ensure_ascii=False, indent=2)
-                
-                # 提取文本内容用于向量化 - 使用与其他上传函数相同的逻辑
-                text_content = ""
-                if isinstance(json_data, list):
-                    # 限制处理的条目数量，避免生成过长的文本
-                    items_to_process = json_data[:5] if len(json_data) > 5 else json_data
-                    for item in items_to_process:
-                        if isinstance(item, dict):
-                            # 只使用最重要的字段
-                            important_fields = ['content', 'question', 'title', 'description']
-                            for field in important_fields:
-                                if field in item and item[field]:
-                                    text_content += str(item[field]) + " "
-                                    break
-                            # 如果没有找到重要字段，添加前3个值
-                            if not text_content and len(item) > 0:
-                                text_content += " ".join(str(v) for v in list(item.values())[:3] if v)
-                elif isinstance(json_data, dict):
-                    # 只使用最重要的字段或前5个值
-                    important_fields = ['content', 'question', 'title', 'description']
-                    for field in important_fields:
-                        if field in json_data and json_data[field]:
-                            text_content += str(json_data[field]) + " "
-                            break
-                    # 如果没有找到重要字段，添加前5个值
-                    if not text_content:
-                        text_content += " ".join(str(v) for v in list(json_data.values())[:5] if v)
-                
-                # 生成向量嵌入
-                embedding = generate_embedding(text_content)
-                
-                # 添加到Milvus向量数据库
-                try:
-                    collection = app.state.collection
-                    doc_unique_id = str(uuid.uuid4())
-                    
-                    # 截断过长的文本内容，避免超出Milvus字段长度限制
-                    keywords_max_length = 1000  # 默认值
-                    
-                    # 尝试获取字段的实际长度限制
-                    try:
-                        schema = collection.schema
-                        keywords_field = next((f for f in schema.fields if f.name == "keywords"), None)
-                        if keywords_field and hasattr(keywords_field, 'max_length'):
-                            keywords_max_length = keywords_field.max_length
-                    except Exception as e:
-                        logger.warning(f"无法获取keywords字段长度限制: {str(e)}")
-                    
-                    # 计算安全截断长度（预留一些空间）
-                    safe_length = keywords_max_length - 100
-                    if safe_length < 100:
-                        safe_length = 100  # 确保至少有一些内容
-                        
-                    # 检查文本长度
-                    if len(text_content) > safe_length:
-                        logger.warning(f"文本长度({len(text_content)})超过安全长度({safe_length})，进行截断")
-                        text_content_truncated = text_content[:safe_length]
-                    else:
-                        text_content_truncated = text_content
-                    
-                    # 准备要插入的数据
-                    insert_data = []
-                    
-                    # 根据集合结构动态构建插入数据
-                    field_names = getattr(app.state, 'milvus_fields', [])
-                    
-                    # 基本字段
-                    data_dict = {
-                        "id": [doc_unique_id], 
-                        "file_path": [dest_path],
-                        "embedding": [embedding]
-                    }
-                    
-                    # 添加keywords字段(如果存在)
-                    if "keywords" in field_names:
-                        data_dict["keywords"] = [text_content_truncated]
-                        
-                    # 添加subject字段(如果存在)
-                    if "subject" in field_names:
-                        data_dict["subject"] = [subj]  # 直接使用科目文件夹名称
-                    
-                    # 构造插入列表
-                    for field in field_names:
-                        if field in data_dict:
-                            insert_data.append(data_dict[field])
-                    
-                    # 执行插入
-                    if insert_data:
-                        collection.insert(insert_data)
-                        logger.info(f"文件已添加到Milvus向量数据库: {new_filename}")
-                except Exception as e:
-                    logger.error(f"添加到Milvus时出错(文件仍然已保存): {str(e)}")
-                
-                uploaded_files.append({
-                    "filename": new_filename,
-                    "original": json_file,
-                    "subject": subj
-                })
-        
-        if not uploaded_files:
+        if not uploaded_files and not duplicate_files and not unchanged:
             logger.warning("没有找到有效的历史错题文件")
             return {"success": False, "message": "没有找到有效的历史错题文件"}
         
-        logger.info(f"成功上传了 {len(uploaded_files)} 个历史错题文件")
+        message = f"成功上传了 {len(uploaded_files)} 个历史错题文件"
+        if duplicate_files:
+            message += f"，{len(duplicate_files)} 个文件与已有文档相同"
+        if unchanged:
+            message += f"，跳过 {unchanged} 个已同步的文件"
+        logger.info(message)
         return {
             "success": True, 
             "files": uploaded_files, 
             "count": len(uploaded_files),
-            "message": f"成功上传了 {len(uploaded_files)} 个历史错题文件"
+            "duplicates": duplicate_files,
+            "unchanged": unchanged,
+            "message": message
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"上传历史错题失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"上传历史错题失败: {str(e)}")
 
-# Search documents endpoint
-@app.post("/documents/search/")
-async def search_documents(query: SearchQuery):
-    try:
-        # 生成查询向量
-        query_embedding = generate_embedding(query.keyword)
-        
-        # 在Milvus中搜索
-        collection = app.state.collection
-        search_params = {"metric_type": "L2", "params": {"nprobe": 16}}
-        
-        # 获取输出字段列表，确保包含必要字段
-        output_fields = ["file_path"]
-        
-        # 构建查询表达式，如果指定了学科，则按学科筛选
-        expr = None
-        if query.subject:
-            # 检查集合是否有subject字段
-            field_names = [field.name for field in collection.schema.fields]
-            if 'subject' in field_names:
-                expr = f'subject == "{query.subject}"'
-                logger.info(f"按学科筛选搜索: {query.subject}")
-                # 如果有subject字段，添加到输出字段
-                if "subject" not in output_fields:
-                    output_fields.append("subject")
-            else:
-                logger.warning(f"集合中不存在subject字段，无法按学科筛选")
-        
-        # 向量搜索
+# 对比文档存储和内存索引
+def scan_store_changes(space: StudentSpace,
+                       names: Optional[Set[str]] = None) -> Tuple[List[str], List[str], List[str]]:
+    """
+    返回 (存储中有但索引中没有的文档, 建立索引后被替换的文档, 索引中有但存储中已不存在的文档)
+    文档的 (大小, 创建时间) 与建立索引时不同即为被替换；names 不为None时只检查这些文档（需要通过 run_io 调用）
+    """
+    if names is None:
+        stats = space.documents.stat_all()
+        indexed = set(space.search_index.names())
+    else:
+        stats = {}
+        for file_name in names:
+            try:
+                stats[file_name] = space.documents.stat(file_name)
+            except KeyError:
+                continue
+        indexed = {file_name for file_name in names if file_name in space.search_index}
+    stored = set(stats)
+    changed = [name for name in stored & indexed if space.indexed_stats.get(name) != stats[name]]
+    return sorted(stored - indexed), sorted(changed), sorted(indexed - stored)
+
+# 段文件存储中直接写入存储目录的JSON文件的同步记录前缀
+LOOSE_SOURCE_PREFIX = "files:"
+
+# 导入直接写入存储目录的JSON文件
+def import_loose_files(space: StudentSpace, file_names: Optional[Set[str]] = None) -> List[str]:
+    """
+    使用段文件存储时，其他程序直接写入存储目录的JSON文件不在存储中，
+    把新增或内容变化的文件导入存储（原文件保留），按文件版本跳过已导入的文件，返回导入的文档名（需要通过 run_io 调用）
+    每个文档只有一个来源：文件导入后存储中的文档被替换或删除，或者文件出现前存储中已有内容不同的同名文档时，
+    文档归存储所有，之后文件的修改不再导入。file_names 不为None时只检查这些文件
+    """
+    if isinstance(space.documents, FileDocumentStore):
+        return []
+    source = FileDocumentStore(space.documents.root)
+    synced = space.catalog.sync_sources(LOOSE_SOURCE_PREFIX)
+    if file_names is None:
+        candidates = source.names()
+    else:
+        candidates = sorted(file_name for file_name in file_names if file_name.endswith('.json'))
+    imported = []
+    seen = set()
+    for file_name in candidates:
+        key = f"{LOOSE_SOURCE_PREFIX}{file_name}"
         try:
-            results = collection.search(
-                data=[query_embedding],
-                anns_field="embedding",
-                param=search_params,
-                limit=query.limit,
-                output_fields=output_fields,
-                expr=expr
-            )
-            logger.info(f"Milvus搜索成功，找到 {len(results[0])} 个结果")
+            file_version = json.loads(json.dumps(source.version(file_name)))
+        except KeyError:
+            continue
+        seen.add(key)
+        record = synced.get(key)
+        # 同步记录的版本为 [导入时的文件版本, 导入后存储中文档的 (大小, 创建时间)]，文档名为空表示文档归存储所有
+        if record is not None:
+            if not record[1]:
+                continue
+            imported_version, imported_stat = json.loads(record[0])
+            if imported_version == file_version:
+                continue
+            try:
+                store_stat = list(space.documents.stat(file_name))
+            except KeyError:
+                store_stat = None
+            if store_stat != imported_stat:
+                logger.info(f"文档 {file_name} 导入后在存储中被替换或删除，不再从存储目录中的文件导入")
+                space.catalog.record_sync_source(key, record[0], "")
+                continue
+        try:
+            json_data = source.get(file_name)
+        except KeyError:
+            continue
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            # 文件可能还在写入，下一次事件时重试
+            logger.warning(f"读取存储目录中的文件 {file_name} 失败: {str(e)}")
+            continue
+        if record is None and space.documents.exists(file_name):
+            # 创建存储时已经导入过、内容相同的文件只记录版本；内容不同的文档归存储所有
+            if space.documents.get(file_name) != json_data:
+                logger.warning(f"存储中已有内容不同的文档 {file_name}，不导入存储目录中的同名文件")
+                space.catalog.record_sync_source(key, json.dumps([file_version, None]), "")
+                continue
+        else:
+            created = source.stat(file_name)[1] if not space.documents.exists(file_name) else None
+            space.documents.put(file_name, subject_from_filename(file_name), json_data, created=created)
+            imported.append(file_name)
+        space.catalog.record_sync_source(
+            key, json.dumps([file_version, list(space.documents.stat(file_name))]), file_name
+        )
+    if file_names is None:
+        missing = [key for key in synced if key not in seen]
+    else:
+        checked = {f"{LOOSE_SOURCE_PREFIX}{file_name}" for file_name in candidates}
+        missing = [key for key in synced if key in checked and key not in seen]
+    if missing:
+        space.catalog.remove_sync_sources(missing)
+    return imported
+
+# 登记其他进程写入文档存储的文档
+def adopt_document(space: StudentSpace, file_name: str) -> Optional[Tuple[str, Union[Dict, List], str]]:
+    """
+    把存储中未登记的文档加入索引和元数据目录（需要通过 run_io 调用）
+    上传接口在保存前已经登记了内容哈希并负责插入向量；没有登记哈希的文档是直接写入存储的，
+    登记哈希后返回 (逻辑路径, 文档内容, 学科) 用于插入向量存储，否则返回None
+    """
+    stat = space.documents.stat(file_name)
+    file_text = space.documents.get_text(file_name)
+    json_data = json.loads(file_text)
+    subject = parse_file_name(file_name)[0]
+    space.mark_indexed(file_name, stat)
+    register_document(space, file_name, file_text, json_data, subject)
+    digest = content_hash(json_data)
+    if space.catalog.find_by_hash(digest) == file_name:
+        return None
+    if space.catalog.claim_hash(digest, file_name) != file_name:
+        # 内容与已有文档重复，记录下来，启动时不再重复解析
+        space.catalog.record_duplicate(file_name, digest, json.dumps(space.documents.version(file_name)))
+        return None
+    return space.documents.path_for(file_name), json_data, subject
+
+# 增量同步文档存储的变化
+async def sync_store_changes(space: StudentSpace, names: Optional[Set[str]] = None) -> Tuple[int, int]:
+    """
+    新出现的文档加入索引（需要时插入向量存储），被替换的文档重新索引，
+    已删除的文档移出索引、元数据目录和向量存储；使用段文件存储时先导入直接写入存储目录的JSON文件
+    names 不为None时只同步这些文档（和同名的文件），否则对比整个存储
+    返回 (加入或重新索引的文档数, 移除的文档数)
+    """
+    async with app.state.sync_lock:
+        imported = await run_io(import_loose_files, space, names)
+        if imported:
+            logger.info(f"导入了存储目录中新增或修改的 {len(imported)} 个JSON文件")
+        added, changed, removed = await run_io(scan_store_changes, space, names)
+        # 被替换和已删除的文档先移出索引，原来的向量全部删除；被替换的文档再按新内容加入
+        for file_name in changed + removed:
+            space.search_index.remove_document(file_name)
+            space.bm25_index.remove_document(file_name)
+            space.indexed_stats.pop(file_name, None)
+            await run_io(space.catalog.remove, file_name)
+        if changed or removed:
+            try:
+                await run_io(app.state.collection.delete_files,
+                             [space.documents.path_for(file_name) for file_name in changed + removed])
+            except Exception as e:
+                logger.error(f"删除已修改或已删除文档的向量失败: {str(e)}")
+        inserter = VectorBatchInserter(app.state.collection, space.student_id)
+        for file_name in added + changed:
+            try:
+                adopted = await run_io(adopt_document, space, file_name)
+            except (json.JSONDecodeError, KeyError) as e:
+                # 文件可能还在写入，下一次事件时重试
+                logger.warning(f"读取新文档 {file_name} 失败: {str(e)}")
+                continue
+            if adopted is not None:
+                await inserter.add_document(*adopted)
+        await inserter.flush()
+        if added or changed or removed:
+            app.state.search_cache.bump_generation()
+            logger.info(f"文档存储变化: 加入 {len(added)} 个文档，重新索引 {len(changed)} 个文档，移除 {len(removed)} 个文档")
+    return len(added) + len(changed), len(removed)
+
+# 存储目录变化时增量同步
+async def on_storage_change(changes: Dict[str, Optional[Set[str]]]):
+    """
+    错题文档目录变化时同步默认空间中变化的文档；错题目录变化时把变化的错题同步到默认空间
+    changes 为 {根目录: 变化的文件路径或文档名}，None 表示需要对比整个存储
+    """
+    space = await get_space(DEFAULT_STUDENT)
+    names = {
+        root: None if paths is None else {os.path.basename(path) for path in paths}
+        for root, paths in changes.items()
+    }
+    if config.JSON_STORAGE_PATH in names:
+        await sync_store_changes(space, names[config.JSON_STORAGE_PATH])
+    if config.ERROR_QUESTION_PATH in names:
+        changed = names[config.ERROR_QUESTION_PATH]
+        subjects = await run_io(app.state.error_documents.subjects) if changed is None else None
+        uploaded_files, _, _ = await sync_history_sources(space, subjects, changed)
+        if uploaded_files:
+            logger.info(f"自动同步了 {len(uploaded_files)} 个新的历史错题文件")
+
+# 搜索结果可以通过fields参数选择返回的字段
+SEARCH_RESULT_FIELDS = ["id", "subject", "file_name", "distance", "score", "question_id", "question_type",
+                        "knowledge_points", "preview", "question", "content", "size", "created"]
+
+# 解析fields参数
+def parse_result_fields(fields: Optional[Union[str, List[str]]]) -> Optional[List[str]]:
+    """
+    解析逗号分隔的字段名（或字段列表），未指定时返回None表示返回默认字段
+    包含未知字段时抛出ValueError
+    """
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    fields = [field.strip() for field in fields if field.strip()]
+    unknown = [field for field in fields if field not in SEARCH_RESULT_FIELDS]
+    if unknown:
+        raise ValueError(f"未知的字段: {unknown}，可选字段: {SEARCH_RESULT_FIELDS}")
+    return fields or None
+
+# 只保留请求的字段
+def project_result(result: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return result
+    return {field: result[field] for field in fields if field in result}
+
+# 搜索结果的翻页游标
+def encode_search_cursor(mode: str, keyword: str, subject: Optional[str], position: Any,
+                         student_id: str = DEFAULT_STUDENT) -> str:
+    """mode为keyword时position是上一页最后检查的文档名，为vector和hybrid时是已返回的结果数量"""
+    return encode_token({"mode": mode, "keyword": keyword, "subject": subject or None, "position": position,
+                         "student": student_id})
+
+def decode_search_cursor(cursor: str, keyword: str, subject: Optional[str],
+                         student_id: str = DEFAULT_STUDENT) -> Tuple[str, Any]:
+    """解析搜索游标，返回 (搜索方式, 位置)，游标无效或与查询条件不一致时抛出ValueError"""
+    state = decode_token(cursor)
+    if not isinstance(state, dict) or state.get("mode") not in ("keyword", "vector", "hybrid"):
+        raise ValueError(f"无效的游标: {cursor}")
+    if state.get("keyword") != keyword or state.get("subject") != (subject or None) \
+            or state.get("student", DEFAULT_STUDENT) != student_id:
+        raise ValueError("游标与当前的查询条件不一致")
+    return state["mode"], state.get("position")
+
+# 从文件名中提取学科和文档ID
+def parse_file_name(file_name: str) -> Tuple[str, str]:
+    """支持学科_ID格式(math_1.json)和数字序号格式(1.json)，返回 (学科, 文档ID)"""
+    # 纯数字序号格式没有学科
+    subject = subject_from_filename(file_name) if '_' in file_name else "未分类"
+    return subject, doc_id_from_filename(file_name)
+
+# 在文档中查找第一道包含所有查询词的题目
+def find_matching_question(json_data: Union[Dict, List], terms: List[str]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """只匹配题干、选项和知识点，按 expand_questions 相同的编号规则返回 (题目编号, 题目)"""
+    for question_id, item in numbered_questions(json_data):
+        text = "\n".join(question_fields(item)).lower()
+        if all(term in text for term in terms):
+            return question_id, item
+    return None
+
+# 读取关键词搜索的候选文档
+def load_keyword_result(space: StudentSpace, file_name: str, terms: List[str],
+                        fields: Optional[List[str]]) -> Dict[str, Any]:
+    """
+    读取倒排索引命中的文档，文档不存在时抛出KeyError
+    未指定fields时返回整个文档；指定时只生成请求的字段（需要通过 run_io 调用）
+    """
+    documents = space.documents
+    content = space.document_cache.get(file_name)
+    subject, doc_id = parse_file_name(file_name)
+    result = {"id": doc_id, "subject": subject, "file_name": file_name}
+    if fields is None:
+        result["content"] = content
+        return result
+    
+    if {"question_id", "question_type", "knowledge_points", "preview", "question"} & set(fields):
+        match = find_matching_question(content, terms)
+        if match is not None:
+            question_id, question = match
+            result.update({
+                "question_id": question_id,
+                "question_type": str(question.get("type", "")),
+                "knowledge_points": question.get("knowledge_points", []),
+                "preview": extract_question_text(question)[:100],
+                "question": question
+            })
+        else:
+            result["preview"] = build_preview(content)
+    if "content" in fields:
+        result["content"] = content
+    if "size" in fields or "created" in fields:
+        result["size"], result["created"] = documents.stat(file_name)
+    return project_result(result, fields)
+
+# 基于倒排索引的关键词搜索
+async def keyword_search(space: StudentSpace, keyword: str, subject: Optional[str], limit: int,
+                         after: Optional[str] = None,
+                         fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    通过学生空间的倒排索引查找题干、选项或知识点包含所有查询词（按空白切分）的文档
+    索引返回的就是匹配结果，只读取当前页的文档
+    匹配的文档按文件名排序，after 为上一页最后一个文档名
+    返回 (文档列表, 下一页起点)，没有更多文档时起点为None
+    """
+    terms = query_terms(keyword)
+    matches = await run_io(space.search_index.lookup, keyword, subject)
+    if after:
+        matches = matches[bisect.bisect_right(matches, after):]
+    logger.info(f"倒排索引命中 {len(matches)} 个文件")
+    
+    # 限制结果数量，剩余的文档留给下一页
+    page = matches[:limit]
+    next_after = page[-1] if len(matches) > limit else None
+    
+    documents = []
+    for file_name in page:
+        try:
+            documents.append(await run_io(load_keyword_result, space, file_name, terms, fields))
+        except KeyError:
+            logger.warning(f"文档不存在，可能已被删除: {file_name}")
+            space.search_index.remove_document(file_name)
+            space.bm25_index.remove_document(file_name)
         except Exception as e:
-            logger.error(f"Milvus搜索失败，切换到备用搜索: {str(e)}")
-            raise e  # 直接抛出异常，让备用搜索处理
-        
-        # 获取文件路径
-        file_paths = [hit.entity.get('file_path') for hit in results[0]]
-        
-        # 加载文档
-        documents = []
-        for file_path in file_paths:
+            logger.error(f"处理文档 {file_name} 时出错: {str(e)}")
+    
+    return documents, next_after
+
+# 读取命中题目所在的文档
+def load_hit_document(space: StudentSpace, file_name: str,
+                      with_stat: bool) -> Tuple[Any, Optional[Tuple[int, float]]]:
+    """通过解析缓存读取文档，需要时同时返回 (文档大小, 创建时间)，文档不存在时抛出KeyError（需要通过 run_io 调用）"""
+    content = space.document_cache.get(file_name)
+    return content, space.documents.stat(file_name) if with_stat else None
+
+# 读取命中题目所在的文档，生成搜索结果
+async def hydrate_hits(space: StudentSpace, hits: List[Dict[str, Any]],
+                       fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """
+    hits 每项包含 file_name、question_id 以及原样返回的得分（distance 或 score）
+    按题目返回结果，只返回命中的题目；同一文档只读取一次，
+    不同文档在线程池中并发读取（最多 HYDRATE_CONCURRENCY 个），并使用解析缓存
+    """
+    with_stat = fields is not None and ("size" in fields or "created" in fields)
+    semaphore = asyncio.Semaphore(config.HYDRATE_CONCURRENCY)
+    
+    async def load(file_name: str):
+        async with semaphore:
             try:
-                # 检查文件是否存在
-                if not os.path.exists(file_path):
-                    logger.warning(f"文件不存在，可能已被删除: {file_path}")
-                    continue
-                    
-                async with aiofiles.open(file_path, 'r') as f:
-                    content = await f.read()
-                    file_name = os.path.basename(file_path)
-                    
-                    # 处理文件名格式，支持数字序号格式(1.json)和学科_ID格式(math_1.json)
-                    if '_' in file_name:
-                        # 学科_ID格式
-                        subject, doc_id = file_name.split('_', 1)
-                        doc_id = doc_id.split('.')[0]  # 去掉.json后缀
-                    else:
-                        # 纯数字序号格式
-                        doc_id = file_name.split('.')[0]  # 去掉.json后缀
-                        subject = "未分类"
-                    
-                    documents.append({
-                        "id": doc_id,
-                        "subject": subject,
-                        "file_name": file_name,
-                        "content": json.loads(content)
-                    })
-            except FileNotFoundError:
-                logger.error(f"文件不存在: {file_path}")
+                return await run_io(load_hit_document, space, file_name, with_stat)
+            except KeyError:
+                logger.warning(f"文档不存在，可能已被删除: {file_name}")
             except Exception as e:
-                logger.error(f"处理文件 {file_path} 时出错: {str(e)}")
+                logger.error(f"处理文件 {file_name} 时出错: {str(e)}")
+            return None
+    
+    file_names = list(dict.fromkeys(hit["file_name"] for hit in hits))
+    loaded_files = dict(zip(file_names, await asyncio.gather(*(load(name) for name in file_names))))
+    
+    documents = []
+    for hit in hits:
+        file_name = hit["file_name"]
+        if loaded_files[file_name] is None:
+            continue
+        content, file_stat = loaded_files[file_name]
+        
+        subject, doc_id = parse_file_name(file_name)
+        result = {"id": doc_id, "subject": subject, "file_name": file_name}
+        result.update((key, hit[key]) for key in ("distance", "score") if key in hit)
+        question_id = hit.get("question_id")
+        question = find_question(content, question_id) if question_id else None
+        if question is not None:
+            # 逐题命中：只返回该题目
+            result.update({
+                "question_id": question_id,
+                "question_type": str(question.get("type", "")),
+                "knowledge_points": question.get("knowledge_points", []),
+                "preview": extract_question_text(question)[:100],
+                "question": question
+            })
+            if fields is not None and "content" in fields:
+                result["content"] = content
+        elif fields is None or "content" in fields:
+            # 旧数据没有题目编号，返回整个文档
+            result["content"] = content
+        
+        if fields is not None:
+            if "preview" not in result:
+                result["preview"] = build_preview(content)
+            if file_stat is not None:
+                result["size"], result["created"] = file_stat
+        documents.append(project_result(result, fields))
+    
+    return documents
+
+# BM25索引使用的题目文本
+def bm25_questions(json_data: Union[Dict, List]) -> List[Tuple[str, str]]:
+    """每道题目的题干、选项和知识点"""
+    return [(record["question_id"], f"{record['text']} {record['knowledge_points']}")
+            for record in expand_questions(json_data)]
+
+# 在学生的数据中进行向量搜索
+def search_space_vectors(space: StudentSpace, vector: List[float], limit: int,
+                         subject: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    按 student_id 限定搜索范围（Milvus按分区键只扫描对应分区），需要通过 run_io 调用
+    旧集合没有student_id字段时按文件路径过滤掉其他学生的结果
+    """
+    collection = app.state.collection
+    hits = collection.search(vector, limit=limit, subject=subject,
+                             output_fields=collection.metadata.hit_output_fields,
+                             student_id=space.student_id)
+    if not collection.metadata.has_student:
+        hits = [hit for hit in hits if space.owns_path(hit.get("file_path", ""))]
+    return hits
+
+# 混合搜索
+async def hybrid_search(space: StudentSpace, query: SearchQuery, offset: int,
+                        fields: Optional[List[str]]) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    BM25和向量搜索各取前 HYBRID_CANDIDATES 个题目，按倒数排名融合（RRF）后排序
+    向量搜索失败时只使用BM25排名
+    返回 (结果列表, 下一页的offset)，没有更多结果时offset为None
+    """
+    depth = max(config.HYBRID_CANDIDATES, offset + query.limit + 1)
+    subject = query.subject or None
+    keyword_hits = await run_io(
+        space.bm25_index.search, query.keyword, subject, depth, config.BM25_MAX_CANDIDATES
+    )
+    
+    try:
+        query_embedding = await run_io(generate_embedding, query.keyword)
+        vector_hits = await run_io(search_space_vectors, space, query_embedding, depth, subject)
+    except Exception as e:
+        logger.warning(f"混合搜索中的向量搜索失败，只使用BM25排名: {str(e)}")
+        vector_hits = []
+    
+    # 倒数排名融合，以 (文件名, 题目编号) 标识题目
+    ranked = reciprocal_rank_fusion([
+        [(hit["file_name"], hit["question_id"]) for hit in keyword_hits],
+        [(os.path.basename(hit.get("file_path", "")), hit.get("question_id", "")) for hit in vector_hits]
+    ], config.RRF_K)
+    logger.info(f"混合搜索: BM25 {len(keyword_hits)} 个候选，向量 {len(vector_hits)} 个候选，融合后 {len(ranked)} 个")
+    
+    next_offset = offset + query.limit if len(ranked) > offset + query.limit else None
+    hits = [{"file_name": file_name, "question_id": question_id, "score": score}
+            for (file_name, question_id), score in ranked[offset:offset + query.limit]]
+    return await hydrate_hits(space, hits, fields), next_offset
+
+# 向量搜索
+async def vector_search(space: StudentSpace, query: SearchQuery, offset: int,
+                        fields: Optional[List[str]]) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    在学生的数据中按题目向量搜索，跳过前 offset 个命中
+    返回 (结果列表, 下一页的offset)，没有更多命中时offset为None
+    """
+    # 生成查询向量
+    query_embedding = await run_io(generate_embedding, query.keyword)
+    
+    # 如果指定了学科，则按学科筛选
+    if query.subject:
+        logger.info(f"按学科筛选搜索: {query.subject}")
+    
+    # 向量搜索，多取一条用于判断是否还有下一页
+    try:
+        hits = await run_io(
+            search_space_vectors,
+            space,
+            query_embedding,
+            offset + query.limit + 1,
+            query.subject
+        )
+        logger.info(f"向量搜索成功，找到 {len(hits)} 个结果")
+    except Exception as e:
+        logger.error(f"向量搜索失败，切换到备用搜索: {str(e)}")
+        raise e  # 直接抛出异常，让备用搜索处理
+    next_offset = offset + query.limit if len(hits) > offset + query.limit else None
+    hits = [{
+        "file_name": os.path.basename(hit.get("file_path", "")),
+        "question_id": hit.get("question_id", ""),
+        "distance": hit.get("distance")
+    } for hit in hits[offset:offset + query.limit]]
+    
+    documents = await hydrate_hits(space, hits, fields)
+    return documents, next_offset
+
+# Search documents endpoint
+@app.post("/documents/search/")
+async def search_documents(query: SearchQuery):
+    """
+    向量搜索，失败时使用关键词搜索
+    fields 选择返回的字段（未指定时返回完整结果），cursor 为上一页返回的next_cursor
+    student_id 指定时只搜索该学生的错题
+    """
+    space = await get_space(query.student_id)
+    try:
+        fields = parse_result_fields(query.fields)
+        mode, position = decode_search_cursor(query.cursor, query.keyword, query.subject, space.student_id) \
+            if query.cursor else ("vector", 0)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    cache = app.state.search_cache
+    cache_key = ("search_documents", space.student_id, query.keyword, query.subject, query.limit,
+                 tuple(fields) if fields else None, query.cursor)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"搜索缓存命中: {cache_key}")
+        return cached
+    generation = cache.generation
+    
+    if mode == "hybrid":
+        # 上一页来自混合搜索
+        return await hybrid_search_documents(query)
+    
+    try:
+        if mode == "keyword":
+            # 上一页来自备用关键词搜索，继续按关键词翻页
+            raise LookupError("游标来自关键词搜索")
+        documents, next_offset = await vector_search(space, query, position, fields)
+        next_cursor = None
+        if next_offset is not None:
+            next_cursor = encode_search_cursor("vector", query.keyword, query.subject, next_offset,
+                                               space.student_id)
         
-        return {"results": documents}
+        response = {"results": documents, "next_cursor": next_cursor}
+        cache.put(cache_key, response, generation)
+        return response
     
     except Exception as e:
         logger.error(f"搜索文档失败: {str(e)}")
-        # 备用文件系统搜索
+        # 备用关键词搜索（基于倒排索引）
         try:
-            # 获取所有文档
-            files = os.listdir(config.JSON_STORAGE_PATH)
-            json_files = [f for f in files if f.endswith('.json')]
-            
-            # 如果指定了学科，按学科筛选
-            if query.subject:
-                json_files = [f for f in json_files if f.startswith(f"{query.subject}_")]
-            
-            # 加载并过滤文档
-            documents = []
-            for file_name in json_files:
-                file_path = os.path.join(config.JSON_STORAGE_PATH, file_name)
-                # 检查文件是否存在
-                if not os.path.exists(file_path):
-                    logger.warning(f"备用搜索：文件不存在，可能已被删除: {file_path}")
-                    continue
-                    
-                try:
-                    async with aiofiles.open(file_path, 'r') as f:
-                        content = await f.read()
-                        # 检查关键词是否在内容中
-                        if query.keyword.lower() in content.lower():
-                            # 从文件名中提取信息
-                            # 处理文件名格式，支持数字序号格式(1.json)和学科_ID格式(math_1.json)
-                            if '_' in file_name:
-                                # 学科_ID格式
-                                subject, doc_id = file_name.split('_', 1)
-                                doc_id = doc_id.split('.')[0]  # 去掉.json后缀
-                            else:
-                                # 纯数字序号格式
-                                doc_id = file_name.split('.')[0]  # 去掉.json后缀
-                                subject = "未分类"
-                            
-                            documents.append({
-                                "id": doc_id,
-                                "subject": subject,
-                                "file_name": file_name,
-                                "content": json.loads(content)
-                            })
-                        
-                        # 限制结果数量
-                        if len(documents) >= query.limit:
-                            break
-                except Exception as e:
-                    logger.error(f"备用搜索：处理文件 {file_path} 时出错: {str(e)}")
-                    continue
-            
-            return {"results": documents}
+            after = position if mode == "keyword" else None
+            documents, next_after = await keyword_search(space, query.keyword, query.subject, query.limit,
+                                                         after, fields)
+            next_cursor = None
+            if next_after is not None:
+                next_cursor = encode_search_cursor("keyword", query.keyword, query.subject, next_after,
+                                                   space.student_id)
+            response = {"results": documents, "next_cursor": next_cursor}
+            cache.put(cache_key, response, generation)
+            return response
         except Exception as e2:
             logger.error(f"备用搜索也失败: {str(e2)}")
             raise HTTPException(status_code=500, detail=f"Failed to search documents: {str(e)}, {str(e2)}")
 
+# 混合搜索接口
+@app.post("/documents/hybrid-search/")
+async def hybrid_search_documents(query: SearchQuery):
+    """
+    BM25关键词得分与向量相似度按倒数排名融合后排序，结果中的score为融合得分
+    fields、cursor 和 student_id 的用法与 /documents/search/ 相同
+    """
+    space = await get_space(query.student_id)
+    try:
+        fields = parse_result_fields(query.fields)
+        mode, position = decode_search_cursor(query.cursor, query.keyword, query.subject, space.student_id) \
+            if query.cursor else ("hybrid", 0)
+        if mode != "hybrid":
+            raise ValueError("游标不是混合搜索返回的")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    cache = app.state.search_cache
+    cache_key = ("hybrid_search", space.student_id, query.keyword, query.subject or None, query.limit,
+                 tuple(fields) if fields else None, query.cursor)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"搜索缓存命中: {cache_key}")
+        return cached
+    generation = cache.generation
+    
+    try:
+        documents, next_offset = await hybrid_search(space, query, position, fields)
+    except Exception as e:
+        logger.error(f"混合搜索失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"混合搜索失败: {str(e)}")
+    next_cursor = None
+    if next_offset is not None:
+        next_cursor = encode_search_cursor("hybrid", query.keyword, query.subject, next_offset, space.student_id)
+    
+    response = {"results": documents, "next_cursor": next_cursor}
+    cache.put(cache_key, response, generation)
+    return response
+
 # 前端API接口的搜索
 @app.post("/api/search/")
 async def api_search(
     keyword: str = Form(...), 
     subject: str = Form(None),
-    limit: int = Form(10)
+    limit: int = Form(10),
+    fields: Optional[str] = Form(None, description="逗号分隔的返回字段，如 id,subject,preview,question"),
+    cursor: Optional[str] = Form(None, description="上一页返回的next_cursor"),
+    mode: Optional[str] = Form(None, description="hybrid 表示按BM25和向量相似度排序，默认只做关键词匹配"),
+    student_id: Optional[str] = Form(None, description="只搜索该学生的错题")
 ):
     try:
-        query = SearchQuery(keyword=keyword, subject=subject, limit=limit)
+        space = await get_space(student_id)
+        try:
+            field_list = parse_result_fields(fields)
+            if mode not in (None, "", "keyword", "hybrid"):
+                raise ValueError(f"不支持的搜索方式: {mode}")
+            if cursor:
+                # 翻页时按游标记录的搜索方式继续
+                mode, position = decode_search_cursor(cursor, keyword, subject, space.student_id)
+            else:
+                mode, position = mode or "keyword", None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = SearchQuery(keyword=keyword, subject=subject, limit=limit, fields=field_list, cursor=cursor,
+                            student_id=space.student_id)
+        if mode == "vector":
+            # 上一页来自向量搜索
+            return await search_documents(query)
+        if mode == "hybrid":
+            return await hybrid_search_documents(query)
+        
+        cache = app.state.search_cache
+        cache_key = ("api_search", space.student_id, keyword, subject or None, limit,
+                     tuple(field_list) if field_list else None, cursor)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"搜索缓存命中: {cache_key}")
+            return cached
+        generation = cache.generation
         
         # 直接尝试备用搜索方法
         try:
-            # 获取所有文档
-            logger.info(f"使用备用搜索方法：关键词={keyword}, 学科={subject}, 限制={limit}")
-            files = os.listdir(config.JSON_STORAGE_PATH)
-            json_files = [f for f in files if f.endswith('.json')]
+            logger.info(f"使用索引搜索方法：关键词={keyword}, 学科={subject}, 限制={limit}")
+            search_subject = None
             
             # 如果指定了学科，按学科筛选
             if subject and subject.strip():
-                # 使用两种筛选方式: 
-                # 1. 学科_ID.json 格式
-                # 2. 如果文件内容包含学科信息
-                subject_files = []
-                
-                # 首先检查文件名是否以学科为前缀
-                subject_files = [f for f in json_files if f.startswith(f"{subject}_")]
-                logger.info(f"按文件名前缀筛选到 {len(subject_files)} 个 {subject} 学科文件")
-                
-                # 如果没有找到符合条件的文件，则检查所有文件
-                if not subject_files:
-                    logger.info(f"未找到学科为 {subject} 的文件，进行全文搜索")
-                    json_files = json_files
+                if space.search_index.has_subject(subject):
+                    search_subject = subject
                 else:
-                    json_files = subject_files
+                    # 如果没有找到符合条件的文件，则检查所有文件
+                    logger.info(f"未找到学科为 {subject} 的文件，进行全文搜索")
             
-            # 加载并过滤文档
-            documents = []
-            for file_name in json_files:
-                file_path = os.path.join(config.JSON_STORAGE_PATH, file_name)
-                # 检查文件是否存在
-                if not os.path.exists(file_path):
-                    logger.warning(f"文件不存在: {file_path}")
-                    continue
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        
-                        # 检查关键词是否在内容中
-                        if keyword.lower() in content.lower():
-                            # 从文件名中提取信息
-                            # 处理文件名格式，支持数字序号格式(1.json)和学科_ID格式(math_1.json)
-                            if '_' in file_name:
-                                # 学科_ID格式
-                                file_subject, doc_id = file_name.split('_', 1)
-                                doc_id = doc_id.split('.')[0]  # 去掉.json后缀
-                            else:
-                                # 纯数字序号格式
-                                doc_id = file_name.split('.')[0]  # 去掉.json后缀
-                                file_subject = "未分类"
-                            
-                            documents.append({
-                                "id": doc_id,
-                                "subject": file_subject,
-                                "file_name": file_name,
-                                "content": json.loads(content)
-                            })
-                            
-                            # 限制结果数量
-                            if len(documents) >= limit:
-                                break
-                except Exception as e:
-                    logger.error(f"处理文件 {file_path} 时出错: {str(e)}")
+            documents, next_after = await keyword_search(space, keyword, search_subject, limit, position, field_list)
+            next_cursor = None
+            if next_after is not None:
+                next_cursor = encode_search_cursor("keyword", keyword, subject, next_after, space.student_id)
             
             logger.info(f"搜索完成，找到 {len(documents)} 个结果")
-            return {"results": documents}
+            response = {"results": documents, "next_cursor": next_cursor}
+            cache.put(cache_key, response, generation)
+            return response
             
         except Exception as e:
             logger.error(f"备用搜索方法失败: {str(e)}")
             # 如果备用方法失败，尝试标准搜索
             return await search_documents(query)
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"API搜索失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
@@ -1033,7 +1413,11 @@ async def api_search(
 async def get_search(
     keyword: str = Query(...),
     subject: Optional[str] = Query(None),
-    limit: int = Query(10)
+    limit: int = Query(10),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段"),
+    cursor: Optional[str] = Query(None, description="上一页返回的next_cursor"),
+    mode: Optional[str] = Query(None, description="hybrid 表示按BM25和向量相似度排序"),
+    student_id: Optional[str] = Query(None, description="只搜索该学生的错题")
 ):
     # 直接使用POST API搜索，避免代码重复
     try:
@@ -1041,140 +1425,124 @@ async def get_search(
         form_data = {
             'keyword': keyword,
             'subject': subject if subject else '',
-            'limit': str(limit)
+            'limit': limit,
+            'fields': fields,
+            'cursor': cursor,
+            'mode': mode,
+            'student_id': student_id
         }
         
         # 调用POST方法
         return await api_search(**form_data)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"GET搜索接口错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
 
+# 搜索缓存的命中统计
+@app.get("/search/cache/")
+async def get_search_cache_stats():
+    """
+    返回搜索缓存的命中次数、未命中次数等，用于调整 SEARCH_CACHE_SIZE
+    documents 为默认空间的文档解析缓存统计，students 为已打开的学生空间各自的统计
+    """
+    spaces = app.state.spaces.open_spaces()
+    return {
+        **app.state.search_cache.stats(),
+        "documents": next(space.document_cache.stats() for space in spaces if space.student_id == DEFAULT_STUDENT),
+        "students": {space.student_id: space.document_cache.stats() for space in spaces
+                     if space.student_id != DEFAULT_STUDENT}
+    }
+
 # 获取所有文档
 @app.get("/documents/")
-async def get_all_documents():
-    """获取所有文档"""
+async def get_all_documents(
+    limit: int = Query(config.DOCUMENTS_PAGE_SIZE, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="上一页返回的next_cursor"),
+    subject: Optional[str] = Query(None),
+    student_id: Optional[str] = Query(None, description="只列出该学生的文档")
+):
+    """分页获取文档列表（按创建时间倒序）"""
+    space = await get_space(student_id)
     try:
-        logger.info("获取所有文档")
-        documents = []
-        json_files = glob.glob(os.path.join(config.JSON_STORAGE_PATH, "*.json"))
-        logger.info(f"找到 {len(json_files)} 个JSON文件")
-        
-        for file_path in json_files:
-            try:
-                filename = os.path.basename(file_path)
-                file_size = os.path.getsize(file_path)
-                file_created = os.path.getctime(file_path)
-                logger.debug(f"处理文件: {filename}")
-                
-                # 从文件名中提取信息
-                doc_id = filename
-                subject = ""  # 默认为空字符串而不是"未分类"
-                if '_' in filename:
-                    # 学科_ID格式
-                    subject, doc_id_part = filename.split('_', 1)
-                    doc_id = doc_id_part.split('.')[0]  # 去掉.json后缀
-                else:
-                    # 纯数字序号格式
-                    doc_id = filename.split('.')[0]  # 去掉.json后缀
-                
-                # 读取内容并生成预览
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    json_data = json.loads(content)
-                
-                # 提取预览内容
-                preview = ""
-                try:
-                    if isinstance(json_data, list) and len(json_data) > 0:
-                        first_item = json_data[0]
-                        if isinstance(first_item, dict):
-                            # 尝试获取内容字段
-                            for field in ['content', 'question', 'title', 'description']:
-                                if field in first_item and first_item[field]:
-                                    preview = str(first_item[field])[:100] + '...'
-                                    break
-                            # 如果没有找到特定字段，使用第一个非空值
-                            if not preview and first_item:
-                                for value in first_item.values():
-                                    if value:
-                                        preview = str(value)[:100] + '...'
-                                        break
-                    elif isinstance(json_data, dict):
-                        values = list(json_data.values())
-                        if values:
-                            preview = str(values[0])[:100] + '...'
-                except Exception as e:
-                    logger.warning(f"生成预览内容时出错: {str(e)}")
-                    # 不设置默认的预览内容
-                
-                documents.append({
-                    "id": doc_id,
-                    "filename": filename,
-                    "file_name": filename,  # 提供两种名称格式确保兼容性
-                    "subject": subject,
-                    "size": file_size,
-                    "preview": preview,
-                    "created": file_created
-                })
-            except Exception as e:
-                logger.error(f"处理文件 {file_path} 时出错: {e}")
+        logger.info(f"获取文档列表: limit={limit}, subject={subject or '全部'}")
+        try:
+            rows, next_cursor = await run_io(space.catalog.list_documents, limit, cursor, subject)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # 按创建时间排序
-        documents.sort(key=lambda x: x["created"], reverse=True)
+        documents = [{
+            "id": row["doc_id"],
+            "filename": row["file_name"],
+            "file_name": row["file_name"],  # 提供两种名称格式确保兼容性
+            "subject": row["subject"],
+            "size": row["size"],
+            "preview": row["preview"],
+            "created": row["created"]
+        } for row in rows]
         
+        total = await run_io(space.catalog.count, subject)
         logger.info(f"返回 {len(documents)} 个文档")
-        return {"documents": documents, "count": len(documents)}
+        return {
+            "documents": documents,
+            "count": len(documents),
+            "total": total,
+            "next_cursor": next_cursor
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取所有文档失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取文档失败: {str(e)}")
 
+# 根据文档ID查找文档名
+def resolve_document_name(space: StudentSpace, doc_id: str) -> str:
+    """根据文档ID查找学生空间中的文档，找不到时抛出404（需要通过 run_io 调用）"""
+    documents = space.documents
+    # 尝试不同的可能名称
+    possible_names = [
+        doc_id,  # 完整名称（如果doc_id已经包含.json后缀）
+        f"{doc_id}.json",  # 添加.json后缀
+    ]
+    
+    # 如果doc_id是纯数字，还要尝试找到对应学科的文档
+    if doc_id.isdigit():
+        # 查找所有可能匹配的文档
+        suffix = f"_{doc_id}.json"
+        matching_names = sorted(name for name in documents.names() if name.endswith(suffix))
+        if matching_names:
+            possible_names.append(matching_names[0])  # 添加第一个匹配的文档
+    
+    # 尝试每个可能的名称
+    for name in possible_names:
+        if documents.exists(name):
+            return name
+    
+    logger.error(f"文档不存在: 尝试了以下名称: {possible_names}")
+    raise HTTPException(status_code=404, detail="文档不存在")
+
 # 获取文档内容
 @app.get("/document/{doc_id}")
-async def get_document(doc_id: str):
+async def get_document(doc_id: str, student_id: Optional[str] = Query(None)):
     """获取文档内容"""
+    space = await get_space(student_id)
     try:
         logger.info(f"获取文档内容: {doc_id}")
         
-        # 尝试不同的可能路径
-        possible_paths = [
-            os.path.join(config.JSON_STORAGE_PATH, doc_id),  # 完整路径（如果doc_id已经包含.json后缀）
-            os.path.join(config.JSON_STORAGE_PATH, f"{doc_id}.json"),  # 添加.json后缀
-        ]
-        
-        # 如果doc_id是纯数字，还要尝试找到对应学科的文件
-        if doc_id.isdigit():
-            # 查找所有可能匹配的文件
-            pattern = f"*_{doc_id}.json"
-            matching_files = glob.glob(os.path.join(config.JSON_STORAGE_PATH, pattern))
-            if matching_files:
-                possible_paths.append(matching_files[0])  # 添加第一个匹配的文件
+        filename = await run_io(resolve_document_name, space, doc_id)
+        file_path = space.documents.path_for(filename)
         
-        # 尝试每个可能的路径
-        file_path = None
-        for path in possible_paths:
-            if os.path.exists(path):
-                file_path = path
-                break
-        
-        if not file_path:
-            logger.error(f"文档不存在: 尝试了以下路径: {possible_paths}")
-            raise HTTPException(status_code=404, detail="文档不存在")
-        
-        # 获取文件基本信息
-        file_stat = os.stat(file_path)
-        file_size = file_stat.st_size
-        file_created = file_stat.st_ctime
+        # 获取文档基本信息
+        file_size, file_created = await run_io(space.documents.stat, filename)
         
         # 从文件名中提取学科信息
         subject = ""  # 默认为空字符串而不是"未分类"
-        filename = os.path.basename(file_path)
         if '_' in filename:
             # 学科_ID格式
             subject, _ = filename.split('_', 1)
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = json.load(f)
+        content = await run_io(space.documents.get, filename)
         
         # 生成预览内容
         preview = ""
@@ -1202,6 +1570,8 @@ async def get_document(doc_id: str):
             "size": file_size,
             "created": file_created
         }
+    except HTTPException:
+        raise
     except json.JSONDecodeError:
         logger.error(f"无效的JSON格式: {doc_id}")
         raise HTTPException(status_code=400, detail="无效的JSON格式")
@@ -1209,37 +1579,95 @@ async def get_document(doc_id: str):
         logger.error(f"获取文档失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取文档失败: {str(e)}")
 
+# 获取文档中的单道题目
+@app.get("/document/{doc_id}/question/{question_id}")
+async def get_document_question(doc_id: str, question_id: str, student_id: Optional[str] = Query(None)):
+    """获取文档中的单道题目，搜索结果可以只加载命中的题目"""
+    space = await get_space(student_id)
+    try:
+        file_name = await run_io(resolve_document_name, space, doc_id)
+        content = await run_io(space.documents.get, file_name)
+        
+        question = find_question(content, question_id)
+        if question is None:
+            raise HTTPException(status_code=404, detail="题目不存在")
+        
+        return {
+            "id": doc_id,
+            "file_name": file_name,
+            "question_id": question_id,
+            "question": question
+        }
+    except HTTPException:
+        raise
+    except json.JSONDecodeError:
+        logger.error(f"无效的JSON格式: {doc_id}")
+        raise HTTPException(status_code=400, detail="无效的JSON格式")
+    except Exception as e:
+        logger.error(f"获取题目失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取题目失败: {str(e)}")
+
+# 删除所有学生空间中的文档
+def clear_storage_directory():
+    """
+    清空默认空间和存储目录中的所有学生空间（文档、索引、元数据目录），
+    并删除JSON存储目录中的所有文件（需要通过 run_io 调用）
+    """
+    spaces = app.state.spaces
+    for student_id in [DEFAULT_STUDENT] + spaces.student_ids():
+        spaces.get(student_id).clear()
+    for file in os.listdir(config.JSON_STORAGE_PATH):
+        file_path = os.path.join(config.JSON_STORAGE_PATH, file)
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+            logger.info(f"删除文件: {file_path}")
+
 # 清理所有数据
 @app.post("/cleanup/")
-async def cleanup_data():
-    """清理所有数据"""
+async def cleanup_data(student_id: Optional[str] = Query(None, description="只清理该学生的数据")):
+    """清理所有数据；指定student_id时只清理该学生的文档、索引和向量"""
+    if student_id:
+        return await cleanup_student(await get_space(student_id))
     try:
         logger.info("清理所有数据")
-        # 清空JSON存储目录
-        for file in os.listdir(config.JSON_STORAGE_PATH):
-            file_path = os.path.join(config.JSON_STORAGE_PATH, file)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-                logger.info(f"删除文件: {file_path}")
+        # 清空JSON存储目录和所有学生空间
+        await run_io(clear_storage_directory)
+        # 文件已全部删除，编号重新从1开始
+        await run_io(get_allocator().reset, "wrong_docs:")
+        await run_io(get_allocator().reset, "students:")
         
-        # 尝试清空Milvus集合
+        # 尝试清空向量存储
         try:
-            collection = app.state.collection
-            # 由于Milvus可能会限制删除方式，我们尝试释放并删除整个集合
-            collection.release()
-            utility.drop_collection(config.COLLECTION_NAME)
-            logger.info(f"删除并重建Milvus集合: {config.COLLECTION_NAME}")
-            
-            # 重新初始化Milvus
-            app.state.collection = await init_milvus()
+            await run_io(app.state.collection.reset)
         except Exception as e:
-            logger.warning(f"清理Milvus数据时出错: {str(e)}")
+            logger.warning(f"清理向量存储数据时出错: {str(e)}")
             logger.info("继续执行，仅清理了文件")
         
+        # 数据全部清理后，缓存的搜索结果失效
+        app.state.search_cache.bump_generation()
+        
         return {"success": True, "message": "所有数据已成功清理"}
     except Exception as e:
         logger.error(f"清理数据失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"清理数据失败: {str(e)}")
 
+# 清理一个学生的数据
+async def cleanup_student(space: StudentSpace):
+    """删除学生空间中的文档、索引和元数据目录，以及向量存储中该学生的记录"""
+    try:
+        logger.info(f"清理学生 {space.student_id} 的数据")
+        await run_io(space.clear)
+        await run_io(get_allocator().reset, space.sequence_prefix)
+        try:
+            await run_io(app.state.collection.delete_student, space.student_id)
+            await run_io(app.state.collection.flush)
+        except Exception as e:
+            logger.warning(f"清理向量存储中学生 {space.student_id} 的数据时出错: {str(e)}")
+        app.state.search_cache.bump_generation()
+        return {"success": True, "message": f"学生 {space.student_id} 的数据已成功清理"}
+    except Exception as e:
+        logger.error(f"清理学生数据失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"清理数据失败: {str(e)}")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=5003) 
\ No newline at end of file
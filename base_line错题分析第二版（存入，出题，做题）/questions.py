@@ -0,0 +1,107 @@
+"""
+错题文档的题目拆分。
+
+错题文档有两种结构：题目列表，或包含questions列表的试卷对象。
+索引、向量化、搜索结果定位题目都通过这里取出题目并按相同的规则编号（题目的id字段，没有时使用从1开始的序号），
+向量存储中的question_id 和搜索结果中的题目因此始终对应同一道题。
+"""
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+def question_items(json_data: Any) -> Optional[List[Any]]:
+    """文档中的题目列表，不是题目列表或试卷对象时返回None"""
+    if isinstance(json_data, dict) and isinstance(json_data.get("questions"), list):
+        return json_data["questions"]
+    if isinstance(json_data, list):
+        return json_data
+    return None
+
+
+def numbered_questions(json_data: Any) -> List[Tuple[str, Dict[str, Any]]]:
+    """文档中的每道题目及其编号 [(题目编号, 题目)]，跳过不是对象的条目"""
+    items = question_items(json_data) or []
+    return [(str(item.get("id", index)), item) for index, item in enumerate(items, 1) if isinstance(item, dict)]
+
+
+def extract_text_content(json_data: Union[Dict, List]) -> str:
+    """
+    提取文档中最重要的文本字段用于向量化
+    列表只处理前5个条目，避免生成过长的文本
+    """
+    text_content = ""
+    if isinstance(json_data, list):
+        # 限制处理的条目数量，避免生成过长的文本
+        items_to_process = json_data[:5] if len(json_data) > 5 else json_data
+        for item in items_to_process:
+            if isinstance(item, dict):
+                # 只使用最重要的字段
+                important_fields = ['content', 'question', 'title', 'description']
+                for field in important_fields:
+                    if field in item and item[field]:
+                        text_content += str(item[field]) + " "
+                        break
+                # 如果没有找到重要字段，添加前3个值
+                if not text_content and len(item) > 0:
+                    text_content += " ".join(str(v) for v in list(item.values())[:3] if v)
+    elif isinstance(json_data, dict):
+        # 只使用最重要的字段或前5个值
+        important_fields = ['content', 'question', 'title', 'description']
+        for field in important_fields:
+            if field in json_data and json_data[field]:
+                text_content += str(json_data[field]) + " "
+                break
+        # 如果没有找到重要字段，添加前5个值
+        if not text_content:
+            text_content += " ".join(str(v) for v in list(json_data.values())[:5] if v)
+    return text_content
+
+
+def extract_question_text(item: Dict[str, Any]) -> str:
+    """题干（或标题、描述）加上选项，没有这些字段时使用前3个值"""
+    parts = []
+    for field in ['content', 'question', 'title', 'description']:
+        if field in item and item[field]:
+            parts.append(str(item[field]))
+            break
+    options = item.get('options')
+    if isinstance(options, list):
+        parts.extend(str(option) for option in options if option)
+    if not parts:
+        parts = [str(v) for v in list(item.values())[:3] if v]
+    return " ".join(parts)
+
+
+def expand_questions(json_data: Union[Dict, List]) -> List[Dict[str, str]]:
+    """
+    把错题文档拆分为逐题记录，每道题单独生成向量
+    支持题目列表和包含questions列表的试卷对象，其他格式作为一条记录处理
+    """
+    records = []
+    for question_id, item in numbered_questions(json_data):
+        knowledge_points = item.get("knowledge_points") or []
+        if isinstance(knowledge_points, list):
+            knowledge_points = ",".join(str(point) for point in knowledge_points)
+        records.append({
+            "question_id": question_id,
+            "text": extract_question_text(item),
+            "knowledge_points": str(knowledge_points),
+            "question_type": str(item.get("type", ""))
+        })
+
+    # 无法拆分的文档整体作为一条记录
+    if not records:
+        records.append({
+            "question_id": "",
+            "text": extract_text_content(json_data),
+            "knowledge_points": "",
+            "question_type": ""
+        })
+    return records
+
+
+def find_question(json_data: Union[Dict, List], question_id: str) -> Optional[Dict[str, Any]]:
+    """按 expand_questions 相同的编号规则查找题目"""
+    for current_id, item in numbered_questions(json_data):
+        if current_id == question_id:
+            return item
+    return None
@@ -0,0 +1,87 @@
+"""
+搜索结果缓存。
+
+按 (接口, 关键词, 学科, 数量) 缓存搜索结果，LRU淘汰并设置过期时间。
+缓存带有全局写入代数：任何写入（保存文档、插入向量、清理数据）都会让代数加一，
+之前代数下缓存的结果全部失效，不需要逐条判断写入影响了哪些关键词。
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class SearchCache:
+    """带TTL和写入代数失效的LRU缓存，线程安全"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (写入代数, 过期时间, 结果)
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def generation(self) -> int:
+        """当前写入代数，计算结果前读取，写回缓存时原样传给 put"""
+        return self._generation
+
+    def bump_generation(self):
+        """数据发生变化，使之前缓存的所有结果失效"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """查询缓存，未命中、已过期或属于旧代数时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                generation, expires_at, value = entry
+                if generation == self._generation and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any, generation: int):
+        """
+        写入缓存
+        generation 是开始计算结果时的代数，计算期间如果发生了写入，结果可能不完整，不写入缓存
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存（不改变写入代数）"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计，用于调整缓存大小"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,390 @@
+"""
+错题文档的内存倒排索引。
+
+启动时读取一次文档存储建立字符n-gram倒排表，之后由各个写入接口增量更新，
+关键词搜索只需要对命中的倒排链求交集，不再逐个读取存储中的所有文档。
+索引只覆盖题目的题干、选项和知识点，不包含JSON的键名和其他字段。
+
+BM25Index 以题目为单位对题干和知识点做BM25打分，用于混合搜索的关键词排序；
+reciprocal_rank_fusion 把BM25和向量搜索的排名融合为混合搜索的排名。
+"""
+import re
+import json
+import math
+import heapq
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from questions import question_items
+
+logger = logging.getLogger(__name__)
+
+# 索引的最长n-gram，不超过这个长度的查询词可以直接由倒排链确定结果
+MAX_GRAM = 3
+
+
+def subject_from_filename(file_name: str) -> str:
+    """从 学科_ID.json 格式的文件名中提取学科，纯数字文件名返回空字符串"""
+    if '_' in file_name:
+        return file_name.split('_', 1)[0]
+    return ""
+
+
+def _string_values(value: Any) -> List[str]:
+    """递归收集JSON中的字符串和数字值（不包含键名）"""
+    if isinstance(value, dict):
+        return [text for item in value.values() for text in _string_values(item)]
+    if isinstance(value, list):
+        return [text for item in value for text in _string_values(item)]
+    if value is None or isinstance(value, bool):
+        return []
+    return [str(value)]
+
+
+def question_fields(item: Dict[str, Any]) -> List[str]:
+    """单道题目参与搜索的字段：题干（content，旧数据使用question或title）、选项和知识点"""
+    fields = []
+    for field in ['content', 'question', 'title']:
+        if item.get(field):
+            fields.extend(_string_values(item[field]))
+            break
+    for field in ['options', 'knowledge_points']:
+        if item.get(field):
+            fields.extend(_string_values(item[field]))
+    return fields
+
+
+def document_fields(json_data: Any) -> List[str]:
+    """
+    文档中参与搜索的文本片段
+    支持题目列表和包含questions列表的试卷对象，其他格式使用所有字符串值
+    """
+    items = question_items(json_data)
+    if items is None:
+        return _string_values(json_data)
+    return [text for item in items if isinstance(item, dict) for text in question_fields(item)]
+
+
+def char_ngrams(text: str) -> Set[str]:
+    """
+    提取文本的字符一元组到三元组
+    中文题干没有空格分词，按字符切分可以直接支持任意子串查询
+    """
+    grams = set()
+    for n in range(1, MAX_GRAM + 1):
+        grams.update(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+
+def query_ngrams(term: str) -> Set[str]:
+    """查询词使用不超过 MAX_GRAM 的最长n-gram，较长的n-gram倒排链更短"""
+    n = min(len(term), MAX_GRAM)
+    return {term[i:i + n] for i in range(len(term) - n + 1)}
+
+
+def query_terms(keyword: str) -> List[str]:
+    """按空白切分查询词，多个查询词之间是“且”的关系"""
+    return keyword.lower().split()
+
+
+class InvertedIndex:
+    """
+    以文件名为文档标识的字符n-gram倒排索引
+    倒排链只保存整数文档编号；索引保存每个文档参与搜索的小写文本，
+    查询词超过 MAX_GRAM 个字符时在内存中确认完整子串，不需要再读取文档
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Set[int]] = {}
+        self._doc_ids: Dict[str, int] = {}       # 文件名 -> 文档编号
+        self._doc_names: Dict[int, str] = {}     # 文档编号 -> 文件名
+        self._doc_grams: Dict[int, Set[str]] = {}
+        self._doc_texts: Dict[int, str] = {}
+        self._doc_subjects: Dict[int, str] = {}
+        self._subject_docs: Dict[str, Set[int]] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+
+    def add_document(self, file_name: str, fields: Iterable[str], subject: Optional[str] = None):
+        """添加或替换一个文档的索引，fields 为 document_fields 返回的文本片段"""
+        if subject is None:
+            subject = subject_from_filename(file_name)
+        # 每个片段单独切分n-gram，不产生跨越字段边界的n-gram
+        fields = [field.lower() for field in fields]
+        grams = set()
+        for field in fields:
+            grams.update(char_ngrams(field))
+        with self._lock:
+            self._remove_locked(file_name)
+            doc_id = self._next_id
+            self._next_id += 1
+            self._doc_ids[file_name] = doc_id
+            self._doc_names[doc_id] = file_name
+            self._doc_grams[doc_id] = grams
+            self._doc_texts[doc_id] = "\n".join(fields)
+            self._doc_subjects[doc_id] = subject
+            self._subject_docs.setdefault(subject, set()).add(doc_id)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(doc_id)
+
+    def remove_document(self, file_name: str):
+        """从索引中删除一个文档"""
+        with self._lock:
+            self._remove_locked(file_name)
+
+    def _remove_locked(self, file_name: str):
+        doc_id = self._doc_ids.pop(file_name, None)
+        if doc_id is None:
+            return
+        del self._doc_names[doc_id]
+        del self._doc_texts[doc_id]
+        for gram in self._doc_grams.pop(doc_id, ()):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self._postings[gram]
+        subject = self._doc_subjects.pop(doc_id)
+        self._subject_docs[subject].discard(doc_id)
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._postings.clear()
+            self._doc_ids.clear()
+            self._doc_names.clear()
+            self._doc_grams.clear()
+            self._doc_texts.clear()
+            self._doc_subjects.clear()
+            self._subject_docs.clear()
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self._doc_ids
+
+    def names(self) -> List[str]:
+        """已索引的文件名"""
+        with self._lock:
+            return list(self._doc_ids)
+
+    def has_subject(self, subject: str) -> bool:
+        """索引中是否存在指定学科的文档"""
+        with self._lock:
+            return bool(self._subject_docs.get(subject))
+
+    def lookup(self, keyword: str, subject: Optional[str] = None) -> List[str]:
+        """
+        返回题干、选项或知识点中包含所有查询词的文件名（按文件名排序）
+        对所有查询词的n-gram倒排链求交集，超过 MAX_GRAM 个字符的查询词再确认完整子串
+        """
+        terms = query_terms(keyword)
+        with self._lock:
+            postings = [self._postings.get(gram, set()) for term in terms for gram in query_ngrams(term)]
+            if subject:
+                postings.append(self._subject_docs.get(subject, set()))
+            if not postings:
+                # 空关键词匹配所有文档
+                return sorted(self._doc_ids)
+
+            # 从最短的倒排链开始求交集
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                if not candidates:
+                    break
+                candidates &= posting
+
+            long_terms = [term for term in terms if len(term) > MAX_GRAM]
+            if long_terms:
+                candidates = [doc_id for doc_id in candidates
+                              if all(term in self._doc_texts[doc_id] for term in long_terms)]
+            return sorted(self._doc_names[doc_id] for doc_id in candidates)
+
+    def build_from_store(self, store) -> int:
+        """读取文档存储中的所有文档重建索引，返回索引的文档数量"""
+        self.clear()
+        for file_name in store.names():
+            try:
+                self.add_document(file_name, document_fields(json.loads(store.get_text(file_name))))
+            except Exception as e:
+                logger.error(f"建立索引时读取文档 {file_name} 失败: {str(e)}")
+        logger.info(f"倒排索引建立完成，共 {len(self)} 个文档")
+        return len(self)
+
+# 英文单词和数字作为整体，连续的中文按字符二元组切分
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """BM25使用的分词，单个汉字组成的片段保留为一元组"""
+    tokens = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if run[0].isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    以 (文件名, 题目编号) 为单位的BM25倒排索引
+    查询时按文档频率从低到高处理查询词，候选题目数量达到 max_candidates 后
+    不再加入新的候选，只给已有候选累加得分；高频词只取词频最高的 max_candidates 个题目，
+    打分开销不会随题库增长而增长
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, int]] = {}  # 词 -> {题目编号: 词频}
+        self._champions: Dict[str, List[int]] = {}      # 高频词词频最高的题目，写入该词时失效
+        self._units: Dict[int, Tuple[str, str]] = {}    # 题目编号 -> (文件名, 题目编号)
+        self._unit_terms: Dict[int, Dict[str, int]] = {}
+        self._unit_lengths: Dict[int, int] = {}
+        self._unit_subjects: Dict[int, str] = {}
+        self._file_units: Dict[str, List[int]] = {}
+        self._total_length = 0
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._units)
+
+    def add_document(self, file_name: str, questions: Iterable[Tuple[str, str]], subject: Optional[str] = None):
+        """添加或替换一个文档的所有题目，questions 为 (题目编号, 题干和知识点文本)"""
+        if subject is None:
+            subject = subject_from_filename(file_name)
+        tokenized = [(question_id, tokenize(text)) for question_id, text in questions]
+        with self._lock:
+            self._remove_locked(file_name)
+            unit_ids = []
+            for question_id, tokens in tokenized:
+                unit_id = self._next_id
+                self._next_id += 1
+                terms: Dict[str, int] = {}
+                for token in tokens:
+                    terms[token] = terms.get(token, 0) + 1
+                self._units[unit_id] = (file_name, question_id)
+                self._unit_terms[unit_id] = terms
+                self._unit_lengths[unit_id] = len(tokens)
+                self._unit_subjects[unit_id] = subject
+                self._total_length += len(tokens)
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[unit_id] = tf
+                    self._champions.pop(term, None)
+                unit_ids.append(unit_id)
+            self._file_units[file_name] = unit_ids
+
+    def remove_document(self, file_name: str):
+        """删除一个文档的所有题目"""
+        with self._lock:
+            self._remove_locked(file_name)
+
+    def _remove_locked(self, file_name: str):
+        for unit_id in self._file_units.pop(file_name, ()):
+            for term in self._unit_terms.pop(unit_id):
+                posting = self._postings[term]
+                del posting[unit_id]
+                if not posting:
+                    del self._postings[term]
+                self._champions.pop(term, None)
+            self._total_length -= self._unit_lengths.pop(unit_id)
+            del self._units[unit_id]
+            del self._unit_subjects[unit_id]
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._postings.clear()
+            self._champions.clear()
+            self._units.clear()
+            self._unit_terms.clear()
+            self._unit_lengths.clear()
+            self._unit_subjects.clear()
+            self._file_units.clear()
+            self._total_length = 0
+
+    def _champions_locked(self, term: str, count: int, avgdl: float) -> List[int]:
+        """高频词中归一化词频最高的 count 个题目"""
+        champions = self._champions.get(term)
+        if champions is None or len(champions) < count:
+            posting = self._postings[term]
+            lengths = self._unit_lengths
+            champions = heapq.nlargest(
+                count, posting,
+                key=lambda unit_id: posting[unit_id] / (posting[unit_id] + self.k1 * (
+                    1 - self.b + self.b * lengths[unit_id] / avgdl))
+            )
+            self._champions[term] = champions
+        return champions[:count]
+
+    def search(self, query: str, subject: Optional[str] = None, limit: int = 10,
+               max_candidates: int = 1000) -> List[Dict[str, Any]]:
+        """返回BM25得分最高的题目，每项包含 file_name、question_id 和 score"""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._units:
+                return []
+            n_units = len(self._units)
+            avgdl = max(self._total_length / n_units, 1.0)
+            terms = sorted((term for term in terms if term in self._postings), key=lambda t: len(self._postings[t]))
+
+            scores: Dict[int, float] = {}
+            for term in terms:
+                posting = self._postings[term]
+                df = len(posting)
+                idf = math.log(1 + (n_units - df + 0.5) / (df + 0.5))
+                if len(scores) < max_candidates:
+                    # 还可以加入新的候选题目
+                    if df > max_candidates:
+                        unit_ids = self._champions_locked(term, max_candidates, avgdl)
+                    else:
+                        unit_ids = posting
+                else:
+                    # 候选已满，只给已有候选累加得分
+                    unit_ids = [unit_id for unit_id in scores if unit_id in posting]
+                for unit_id in unit_ids:
+                    if unit_id not in scores:
+                        if len(scores) >= max_candidates:
+                            continue
+                        if subject and self._unit_subjects[unit_id] != subject:
+                            continue
+                    tf = posting[unit_id]
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._unit_lengths[unit_id] / avgdl)
+                    scores[unit_id] = scores.get(unit_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            # 得分相同时按加入索引的顺序排列，保证分页结果稳定
+            top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+            return [{"file_name": self._units[unit_id][0], "question_id": self._units[unit_id][1], "score": score}
+                    for unit_id, score in top]
+
+    def build_from_store(self, store, extract: Callable[[Any], Iterable[Tuple[str, str]]]) -> int:
+        """读取文档存储中的所有文档重建索引，extract 把文档内容转换为 (题目编号, 文本) 列表"""
+        self.clear()
+        for file_name in store.names():
+            try:
+                self.add_document(file_name, extract(json.loads(store.get_text(file_name))))
+            except Exception as e:
+                logger.error(f"建立BM25索引时读取文档 {file_name} 失败: {str(e)}")
+        logger.info(f"BM25索引建立完成，共 {len(self)} 道题目")
+        return len(self)
+
+
+def reciprocal_rank_fusion(ranked_lists: Iterable[Iterable[Hashable]], k: int) -> List[Tuple[Hashable, float]]:
+    """
+    倒数排名融合：每个排名列表贡献 1 / (k + 排名)，同一项在一个列表中只计第一次出现
+    返回按得分从高到低排列的 [(项, 得分)]，得分相同时按项排序，分页结果稳定
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranked in ranked_lists:
+        seen = set()
+        for key in ranked:
+            if key in seen:
+                continue
+            seen.add(key)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + len(seen))
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
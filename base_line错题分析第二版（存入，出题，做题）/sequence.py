@@ -0,0 +1,115 @@
+"""
+持久化的文档编号分配器。
+
+每个命名空间（如某个学科的错题目录）维护一个递增序列，保存在SQLite中。
+分配时在 BEGIN IMMEDIATE 事务里读取并递增，对同一进程内的并发请求和
+多个worker进程都是原子的，分配一个编号是O(1)的，不需要扫描目录。
+"""
+import os
+import re
+import sqlite3
+import logging
+import threading
+from typing import Callable, Iterable, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def max_existing_id(names: Iterable[str], prefix: str) -> int:
+    """
+    在已有的文档名中查找 前缀_数字.json 格式的名称，返回最大的数字
+    只在命名空间第一次分配编号时调用，用于兼容已有文档
+    """
+    pattern = re.compile(rf'^{re.escape(prefix)}_(\d+)\.json$')
+    ids = []
+    for file_name in names:
+        match = pattern.match(file_name)
+        if match:
+            ids.append(int(match.group(1)))
+    return max(ids) if ids else 0
+
+
+class SequenceAllocator:
+    """基于SQLite事务的按命名空间递增编号分配器"""
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # isolation_level=None 由我们显式控制事务
+        self._conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sequences (namespace TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+
+    def next_id(self, namespace: str, seed: Optional[Callable[[], int]] = None) -> int:
+        """
+        分配命名空间中的下一个编号
+        命名空间第一次使用时，以 seed() 的返回值（已有的最大编号）作为起点
+        """
+        return self.next_ids(namespace, 1, seed)[0]
+
+    def next_ids(self, namespace: str, count: int, seed: Optional[Callable[[], int]] = None) -> range:
+        """在一个事务中分配 count 个连续编号"""
+        with self._lock:
+            # BEGIN IMMEDIATE 立即获取写锁，其他进程的分配请求会等待直到本事务提交
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM sequences WHERE namespace = ?", (namespace,)
+                ).fetchone()
+                if row is None:
+                    current = seed() if seed else 0
+                    logger.info(f"初始化编号序列 {namespace}，起始值: {current}")
+                    self._conn.execute(
+                        "INSERT INTO sequences (namespace, value) VALUES (?, ?)", (namespace, current + count)
+                    )
+                else:
+                    current = row[0]
+                    self._conn.execute(
+                        "UPDATE sequences SET value = ? WHERE namespace = ?", (current + count, namespace)
+                    )
+                self._conn.execute("COMMIT")
+                return range(current + 1, current + count + 1)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def reset(self, namespace_prefix: str = ""):
+        """删除以指定前缀开头的所有序列（清理数据时使用）"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM sequences WHERE namespace LIKE ? ESCAPE '\\'",
+                (namespace_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%',)
+            )
+
+
+_allocator: Optional[SequenceAllocator] = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator() -> SequenceAllocator:
+    """进程内共享的编号分配器"""
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = SequenceAllocator(config.SEQUENCE_DB_PATH)
+        return _allocator
+
+
+def next_file_id(namespace: str, prefix: str, list_names: Callable[[], Iterable[str]]) -> int:
+    """
+    为 prefix_<编号>.json 文档分配下一个编号
+    list_names 返回已有的文档名，只在命名空间第一次分配编号时调用
+    """
+    return get_allocator().next_id(namespace, seed=lambda: max_existing_id(list_names(), prefix))
+
+
+def next_file_ids(namespace: str, prefix: str, list_names: Callable[[], Iterable[str]], count: int) -> range:
+    """为一批 prefix_<编号>.json 文档一次分配 count 个连续编号"""
+    return get_allocator().next_ids(namespace, count, seed=lambda: max_existing_id(list_names(), prefix))
@@ -29,6 +29,30 @@ function formatJSON(json) {
     });
 }
 
+// 当前学生ID，未填写时使用默认空间
+function getStudentId() {
+    const input = document.getElementById('studentId');
+    return input ? input.value.trim() : '';
+}
+
+// 请求中附加当前学生ID
+function appendStudentId(formData) {
+    const studentId = getStudentId();
+    if (studentId) {
+        formData.append('student_id', studentId);
+    }
+    return formData;
+}
+
+// 带学生ID查询参数的URL
+function withStudentId(url) {
+    const studentId = getStudentId();
+    if (!studentId) {
+        return url;
+    }
+    return url + (url.includes('?') ? '&' : '?') + 'student_id=' + encodeURIComponent(studentId);
+}
+
 // 在页面加载完成后执行
 document.addEventListener('DOMContentLoaded', function() {
     // 加载科目列表
@@ -73,6 +97,7 @@ document.addEventListener('DOMContentLoaded', function() {
             const formData = new FormData();
             formData.append('file', file);
             formData.append('keywords', keywordsInput.value);  // 变量名保持不变，但实际是备注
+            appendStudentId(formData);
             
             fetch('/upload/', {
                 method: 'POST',
@@ -144,25 +169,76 @@ document.addEventListener('DOMContentLoaded', function() {
             });
             
             formData.append('keywords', keywordsInput.value);  // 变量名保持不变，但实际是备注
+            formData.append('stream', 'true');  // 逐行返回每个文件的处理结果
+            appendStudentId(formData);
             
             // 显示上传进度信息
             console.log(`准备上传 ${jsonFiles.length} 个JSON文件`);
+            const progress = document.getElementById('directoryUploadProgress');
+            const progressBar = progress ? progress.querySelector('.progress-bar') : null;
+            const progressStatus = document.getElementById('directoryUploadStatus');
+            const failedFiles = [];
+            if (progress) {
+                progressBar.style.width = '0%';
+                progressStatus.textContent = `正在上传 ${jsonFiles.length} 个文件...`;
+                progress.style.display = 'block';
+            }
+            
+            // 处理服务器返回的一行结果
+            let summary = null;
+            const handleLine = line => {
+                if (!line.trim()) return;
+                const item = JSON.parse(line);
+                if (item.type === 'summary') {
+                    summary = item;
+                    return;
+                }
+                if (item.status === 'error') {
+                    failedFiles.push(item.file);
+                }
+                if (progress) {
+                    progressBar.style.width = `${Math.round(item.done / item.total * 100)}%`;
+                    progressStatus.textContent = `已处理 ${item.done} / ${item.total} 个文件` +
+                        (failedFiles.length ? `，失败 ${failedFiles.length} 个` : '');
+                }
+            };
             
             fetch('/upload-directory/', {
                 method: 'POST',
                 body: formData
             })
-            .then(response => {
+            .then(async response => {
                 if (!response.ok) {
-                    return response.json().then(data => {
-                        console.error('服务器返回错误:', data);
-                        throw new Error(data.detail || '上传文件夹失败');
-                    });
+                    const data = await response.json();
+                    console.error('服务器返回错误:', data);
+                    throw new Error(data.detail || '上传文件夹失败');
                 }
-                return response.json();
+                // 逐块读取NDJSON响应，每收到一行更新一次进度
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const { done, value } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+                    const lines = buffer.split('\n');
+                    buffer = lines.pop();
+                    lines.forEach(handleLine);
+                }
+                handleLine(buffer + decoder.decode());
+                if (!summary) {
+                    throw new Error('上传过程中连接中断');
+                }
+                return summary;
             })
             .then(data => {
-                console.log('上传成功:', data);
+                console.log('上传完成:', data);
+                if (failedFiles.length) {
+                    console.warn('处理失败的文件:', failedFiles);
+                }
+                if (!data.success) {
+                    throw new Error(data.message);
+                }
                 showSuccess(successAlert, `<i class="bi bi-check-circle"></i> ${data.message}`);
                 uploadDirectoryForm.reset();
                 // 重置文件上传区域的文本
@@ -179,6 +255,11 @@ document.addEventListener('DOMContentLoaded', function() {
                 // 恢复按钮状态
                 submitBtn.disabled = false;
                 submitBtn.innerHTML = originalBtnText;
+                if (progress) {
+                    setTimeout(() => {
+                        progress.style.display = 'none';
+                    }, 5000);
+                }
             });
         });
     }
@@ -203,6 +284,7 @@ document.addEventListener('DOMContentLoaded', function() {
             const formData = new FormData();
             formData.append('subject', subjectSelect.value);
             formData.append('keywords', keywordsInput.value);
+            appendStudentId(formData);
             
             fetch('/upload-history/', {
                 method: 'POST',
@@ -244,46 +326,13 @@ document.addEventListener('DOMContentLoaded', function() {
             const keyword = document.getElementById('searchKeyword').value;
             const limit = document.getElementById('searchLimit').value;
             const searchResults = document.getElementById('searchResults');
-            const searchLoading = document.getElementById('searchLoading');
             
             if (!keyword) {
                 return;
             }
             
-            // 显示加载中
-            searchLoading.style.display = 'block';
             searchResults.innerHTML = '';
-            
-            // 构建表单数据
-            const formData = new FormData();
-            formData.append('keyword', keyword);
-            formData.append('limit', limit);
-            
-            fetch('/api/search/', {
-                method: 'POST',
-                body: formData
-            })
-                .then(response => {
-                    if (!response.ok) {
-                        throw new Error('搜索请求失败');
-                    }
-                    return response.json();
-                })
-                .then(data => {
-                    // 隐藏加载中
-                    searchLoading.style.display = 'none';
-                    // 使用新函数显示结果
-                    displaySearchResults(data);
-                })
-                .catch(error => {
-                    console.error('搜索错误:', error);
-                    searchLoading.style.display = 'none';
-                    searchResults.innerHTML = `
-                        <div class="alert alert-danger">
-                            <i class="bi bi-exclamation-triangle"></i> 搜索失败: ${error.message}
-                        </div>
-                    `;
-                });
+            searchDocuments(keyword, limit);
         });
     }
     
@@ -332,8 +381,8 @@ function loadSubjects() {
         });
 }
 
-// 获取所有文档
-function getAllDocuments() {
+// 获取所有文档（分页加载，传入cursor时追加下一页）
+function getAllDocuments(cursor) {
     const allDocuments = document.getElementById('allDocuments');
     const loadingElement = document.getElementById('allDocsLoading');
     
@@ -341,9 +390,18 @@ function getAllDocuments() {
     
     // 显示加载中
     loadingElement.style.display = 'block';
-    allDocuments.innerHTML = '';
+    if (!cursor) {
+        allDocuments.innerHTML = '';
+    }
+    
+    // 移除旧的"加载更多"按钮
+    const oldLoadMore = document.getElementById('loadMoreDocuments');
+    if (oldLoadMore) {
+        oldLoadMore.remove();
+    }
     
-    fetch('/documents/')
+    const url = withStudentId(cursor ? `/documents/?cursor=${encodeURIComponent(cursor)}` : '/documents/');
+    fetch(url)
         .then(response => {
             if (!response.ok) {
                 throw new Error('获取文档列表失败');
@@ -354,7 +412,7 @@ function getAllDocuments() {
             // 隐藏加载中
             loadingElement.style.display = 'none';
             
-            if (!data.documents || data.documents.length === 0) {
+            if (!cursor && (!data.documents || data.documents.length === 0)) {
                 allDocuments.innerHTML = `
                     <div class="empty-state">
                         <i class="bi bi-folder"></i>
@@ -384,11 +442,23 @@ function getAllDocuments() {
                 return createDocumentCard(doc);
             }).join('');
             
-            allDocuments.innerHTML = `
-                <div class="row">
-                    ${documentsHTML}
-                </div>
-            `;
+            let row = allDocuments.querySelector('.row');
+            if (!row) {
+                row = document.createElement('div');
+                row.className = 'row';
+                allDocuments.appendChild(row);
+            }
+            row.insertAdjacentHTML('beforeend', documentsHTML);
+            
+            // 还有更多文档时显示"加载更多"按钮
+            if (data.next_cursor) {
+                const loadMore = document.createElement('button');
+                loadMore.id = 'loadMoreDocuments';
+                loadMore.className = 'btn btn-outline-secondary btn-sm';
+                loadMore.textContent = `加载更多（共 ${data.total} 个文档）`;
+                loadMore.addEventListener('click', () => getAllDocuments(data.next_cursor));
+                allDocuments.appendChild(loadMore);
+            }
         })
         .catch(error => {
             console.error('获取文档失败:', error);
@@ -481,7 +551,7 @@ function createDocumentCard(doc) {
                         ${subject}
                     </div>
                     ${preview}
-                    <a href="/document/${id}" class="btn btn-outline-primary btn-sm" target="_blank">
+                    <a href="${withStudentId(`/document/${id}`)}" class="btn btn-outline-primary btn-sm" target="_blank">
                         <i class="bi bi-eye"></i> 查看文档
                     </a>
                 </div>
@@ -523,13 +593,76 @@ function showError(element, message) {
     }
 }
 
+// 搜索文档，cursor为上一页返回的next_cursor
+function searchDocuments(keyword, limit, cursor) {
+    const searchResults = document.getElementById('searchResults');
+    const searchLoading = document.getElementById('searchLoading');
+    
+    // 显示加载中
+    searchLoading.style.display = 'block';
+    const oldLoadMore = document.getElementById('loadMoreSearchResults');
+    if (oldLoadMore) {
+        oldLoadMore.remove();
+    }
+    
+    // 构建表单数据，只请求结果卡片用到的字段
+    const formData = new FormData();
+    formData.append('keyword', keyword);
+    formData.append('limit', limit);
+    formData.append('fields', 'id,subject,file_name,preview,size,created');
+    // 按BM25关键词得分和向量相似度排序
+    formData.append('mode', 'hybrid');
+    if (cursor) {
+        formData.append('cursor', cursor);
+    }
+    appendStudentId(formData);
+    
+    fetch('/api/search/', {
+        method: 'POST',
+        body: formData
+    })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('搜索请求失败');
+            }
+            return response.json();
+        })
+        .then(data => {
+            // 隐藏加载中
+            searchLoading.style.display = 'none';
+            // 使用新函数显示结果，翻页时追加到已有结果后面
+            displaySearchResults(data, Boolean(cursor));
+            
+            if (data.next_cursor) {
+                const loadMore = document.createElement('button');
+                loadMore.id = 'loadMoreSearchResults';
+                loadMore.className = 'btn btn-outline-secondary btn-sm';
+                loadMore.textContent = '加载更多';
+                loadMore.addEventListener('click', () => searchDocuments(keyword, limit, data.next_cursor));
+                searchResults.appendChild(loadMore);
+            }
+        })
+        .catch(error => {
+            console.error('搜索错误:', error);
+            searchLoading.style.display = 'none';
+            searchResults.insertAdjacentHTML('beforeend', `
+                <div class="alert alert-danger">
+                    <i class="bi bi-exclamation-triangle"></i> 搜索失败: ${error.message}
+                </div>
+            `);
+        });
+}
+
 // 显示搜索结果的函数
-function displaySearchResults(data) {
+function displaySearchResults(data, append) {
     const searchResults = document.getElementById('searchResults');
     
     if (!searchResults) return;
     
+    const resultsRow = append ? document.getElementById('searchResultsRow') : null;
+    
     if (!data.results || data.results.length === 0) {
+        if (resultsRow) return;
         searchResults.innerHTML = `
             <div class="empty-state">
                 <i class="bi bi-search"></i>
@@ -559,9 +692,16 @@ function displaySearchResults(data) {
         return createDocumentCard(doc);
     }).join('');
     
+    if (resultsRow) {
+        resultsRow.insertAdjacentHTML('beforeend', resultsHTML);
+        const count = resultsRow.children.length;
+        document.getElementById('searchResultsCount').textContent = `找到 ${count} 个匹配的文档`;
+        return;
+    }
+    
     searchResults.innerHTML = `
-        <h5 class="mb-3">找到 ${data.results.length} 个匹配的文档</h5>
-        <div class="row">
+        <h5 class="mb-3" id="searchResultsCount">找到 ${data.results.length} 个匹配的文档</h5>
+        <div class="row" id="searchResultsRow">
             ${resultsHTML}
         </div>
     `;
@@ -0,0 +1,176 @@
+"""
+按学生划分的错题数据空间。
+
+每个学生有独立的文档存储目录（config.STUDENT_STORAGE_PATH/<student_id>/）、
+文档元数据目录、解析缓存、关键词倒排索引和BM25索引，向量存储中的记录带有 student_id 字段，
+搜索只在一个学生的数据中进行，查询开销取决于该学生的数据量而不是全校的数据量。
+
+未指定 student_id 的请求使用默认空间，即原来的 wrong_docs 目录和 catalog.db，已有数据不需要迁移。
+学生空间在第一次访问时打开并建立索引。
+"""
+import os
+import re
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import config
+from catalog import DocumentCatalog
+from document_store import DocumentCache, DocumentStore, create_document_store
+from search_index import BM25Index, InvertedIndex
+
+logger = logging.getLogger(__name__)
+
+# 学生ID用作目录名和向量存储的过滤条件，只允许字母、数字、下划线和短横线
+STUDENT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# 默认空间的学生ID
+DEFAULT_STUDENT = ""
+
+
+def normalize_student_id(student_id: Optional[str]) -> str:
+    """未指定时返回默认空间的ID，格式不正确时抛出ValueError"""
+    if not student_id:
+        return DEFAULT_STUDENT
+    if not STUDENT_ID_PATTERN.match(student_id):
+        raise ValueError(f"无效的student_id: {student_id}，只能包含字母、数字、下划线和短横线（最多64个字符）")
+    return student_id
+
+
+class StudentSpace:
+    """一个学生的文档存储、解析缓存、倒排索引、BM25索引和文档元数据目录"""
+
+    def __init__(self, student_id: str, documents: DocumentStore, catalog: DocumentCatalog):
+        self.student_id = student_id
+        self.documents = documents
+        self.catalog = catalog
+        self.document_cache = DocumentCache(documents)
+        self.search_index = InvertedIndex()
+        self.bm25_index = BM25Index()
+        # 建立索引时文档的 (大小, 创建时间)，与存储中的不同说明文档被替换，需要重新索引
+        self.indexed_stats: Dict[str, Tuple[int, float]] = {}
+        # 建立索引时文档存储变更记录的位置，之后其他进程的写入从这里开始同步
+        self.change_cursor = 0
+
+    def sequence_namespace(self, subject: str) -> str:
+        """分配文档编号使用的序列命名空间"""
+        if self.student_id == DEFAULT_STUDENT:
+            return f"wrong_docs:{subject}"
+        return f"students:{self.student_id}:{subject}"
+
+    @property
+    def sequence_prefix(self) -> str:
+        """清理数据时重置的序列命名空间前缀"""
+        if self.student_id == DEFAULT_STUDENT:
+            return "wrong_docs:"
+        return f"students:{self.student_id}:"
+
+    def owns_path(self, file_path: str) -> bool:
+        """向量存储中记录的文件路径是否属于该空间，旧集合没有student_id字段时用来过滤搜索结果"""
+        return file_path == self.documents.path_for(os.path.basename(file_path))
+
+    def mark_indexed(self, file_name: str, stat: Optional[Tuple[int, float]] = None):
+        """记录文档已按当前内容建立索引，stat 为读取文档之前取得的 documents.stat()"""
+        try:
+            self.indexed_stats[file_name] = stat if stat is not None else self.documents.stat(file_name)
+        except KeyError:
+            self.indexed_stats.pop(file_name, None)
+
+    def build(self, bm25_questions: Callable[[Any], Iterable[Tuple[str, str]]]):
+        """读取文档存储建立索引，补录文档目录"""
+        # 在读取文档之前记录，建立索引期间被替换的文档会在下一次同步时重新索引
+        self.change_cursor = self.documents.change_cursor()
+        self.indexed_stats = self.documents.stat_all()
+        self.search_index.build_from_store(self.documents)
+        self.bm25_index.build_from_store(self.documents, bm25_questions)
+        self.catalog.sync_store(self.documents)
+
+    def clear(self):
+        """删除该学生的所有文档、索引和目录记录"""
+        self.documents.clear()
+        self.search_index.clear()
+        self.bm25_index.clear()
+        self.document_cache.clear()
+        self.catalog.clear()
+        self.indexed_stats.clear()
+
+    def close(self):
+        self.documents.close()
+
+
+class StudentSpaces:
+    """
+    学生空间的注册表，第一次访问时打开学生的存储并建立索引
+    段文件存储的压缩由注册表的一个后台线程统一执行，不为每个学生单独启动线程
+    """
+
+    def __init__(self, bm25_questions: Callable[[Any], Iterable[Tuple[str, str]]]):
+        self.bm25_questions = bm25_questions
+        self._lock = threading.Lock()
+        self._spaces: Dict[str, StudentSpace] = {}
+        self._stop_compactor = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+
+    def _open(self, student_id: str) -> StudentSpace:
+        if student_id == DEFAULT_STUDENT:
+            documents = create_document_store(config.JSON_STORAGE_PATH)
+            catalog = DocumentCatalog(config.CATALOG_DB_PATH)
+        else:
+            root = os.path.join(config.STUDENT_STORAGE_PATH, student_id)
+            documents = create_document_store(root)
+            catalog = DocumentCatalog(os.path.join(root, "catalog.db"))
+        space = StudentSpace(student_id, documents, catalog)
+        space.build(self.bm25_questions)
+        logger.info(f"学生空间已打开: {student_id or '默认'}，共 {len(space.search_index)} 个文档")
+        return space
+
+    def get(self, student_id: str) -> StudentSpace:
+        """返回学生空间，student_id 需要先经过 normalize_student_id 校验（需要在线程池中调用）"""
+        with self._lock:
+            space = self._spaces.get(student_id)
+            if space is None:
+                space = self._open(student_id)
+                self._spaces[student_id] = space
+            return space
+
+    def open_spaces(self) -> List[StudentSpace]:
+        """已经打开的学生空间"""
+        with self._lock:
+            return list(self._spaces.values())
+
+    def student_ids(self) -> List[str]:
+        """存储目录中的所有学生ID（包括尚未打开的）"""
+        root = config.STUDENT_STORAGE_PATH
+        if not os.path.isdir(root):
+            return []
+        return sorted(name for name in os.listdir(root)
+                      if os.path.isdir(os.path.join(root, name)) and STUDENT_ID_PATTERN.match(name))
+
+    def start_compactor(self, interval: Optional[float] = None):
+        """启动后台线程，定期压缩所有已打开空间的段文件"""
+        interval = interval or config.SEGMENT_COMPACT_INTERVAL
+        if self._compactor is not None:
+            return
+
+        def run():
+            while not self._stop_compactor.wait(interval):
+                for space in self.open_spaces():
+                    if not hasattr(space.documents, "compact"):
+                        continue
+                    try:
+                        space.documents.compact()
+                    except Exception as e:
+                        logger.error(f"学生 {space.student_id or '默认'} 的段文件压缩失败: {str(e)}")
+
+        self._stop_compactor.clear()
+        self._compactor = threading.Thread(target=run, name="student-compactor", daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        """停止压缩线程并关闭所有空间"""
+        if self._compactor is not None:
+            self._stop_compactor.set()
+            self._compactor.join()
+            self._compactor = None
+        for space in self.open_spaces():
+            space.close()
@@ -0,0 +1,125 @@
+"""
+基于Aho-Corasick自动机的学科分类器。
+
+所有学科关键词在创建时编译成一个多模式匹配自动机，对文本只扫描一遍就能统计
+每个关键词的出现次数，不再对每个关键词分别调用一次 str.count。
+不属于任何关键词的字符会让自动机回到根状态，扫描时直接用正则跳过这些字符。
+"""
+import re
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Sequence
+
+
+class SubjectClassifier:
+    """按关键词出现次数给文本打分，返回得分最高的学科"""
+
+    def __init__(self, subjects: Dict[str, Sequence[str]], default: str = "other"):
+        self.subjects = list(subjects)
+        self.default = default
+
+        # 建立关键词前缀树，outputs记录以该状态结尾的关键词属于哪些学科
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for subject_index, keywords in enumerate(subjects.values()):
+            for keyword in keywords:
+                keyword = keyword.lower()
+                if not keyword:
+                    continue
+                state = 0
+                for ch in keyword:
+                    next_state = goto[state].get(ch)
+                    if next_state is None:
+                        next_state = len(goto)
+                        goto[state][ch] = next_state
+                        goto.append({})
+                        outputs.append([])
+                    state = next_state
+                outputs[state].append(subject_index)
+
+        # 按广度优先计算失败指针，并把失败转移展开成完整的状态转移表
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            if state:
+                delta[state] = {**delta[fail[state]], **goto[state]}
+            for ch, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(ch, 0) if state else 0
+                # 以失败状态结尾的关键词同时也以当前状态结尾（如“阅读”之于“阅读理解”）
+                outputs[child] = outputs[child] + outputs[fail[child]]
+                queue.append(child)
+
+        self._delta = delta
+        self._outputs = outputs
+        alphabet = "".join(sorted({ch for transitions in goto for ch in transitions}))
+        self._runs = re.compile(f"[{re.escape(alphabet)}]+") if alphabet else None
+
+    def scores(self, text: str) -> Dict[str, int]:
+        """统计每个学科的关键词出现次数"""
+        visits = [0] * len(self._delta)
+        if self._runs is not None:
+            delta = self._delta
+            for run in self._runs.findall(text.lower()):
+                state = 0
+                for ch in run:
+                    state = delta[state].get(ch, 0)
+                    visits[state] += 1
+
+        totals = [0] * len(self.subjects)
+        for state, count in enumerate(visits):
+            if count:
+                for subject_index in self._outputs[state]:
+                    totals[subject_index] += count
+        return dict(zip(self.subjects, totals))
+
+    def classify(self, text: str) -> str:
+        """返回得分最高的学科，得分相同时取 subjects 中靠前的学科，没有匹配时返回default"""
+        scores = self.scores(text)
+        best = max(scores.items(), key=lambda item: item[1]) if scores else None
+        if best is None or best[1] == 0:
+            return self.default
+        return best[0]
+
+    def classify_batch(self, texts: Iterable[str]) -> List[str]:
+        """批量判断多个文档的学科"""
+        return [self.classify(text) for text in texts]
+
+
+def _count_scores(subjects: Dict[str, Sequence[str]], text: str) -> Dict[str, int]:
+    """原来的逐关键词 str.count 实现，只用于对比测试"""
+    text_lower = text.lower()
+    return {subject: sum(text_lower.count(keyword.lower()) for keyword in keywords)
+            for subject, keywords in subjects.items()}
+
+
+if __name__ == "__main__":
+    # 与逐关键词 str.count 的实现对比：python subject_classifier.py
+    import json
+    from config import SUBJECTS
+
+    classifier = SubjectClassifier(SUBJECTS)
+    question = {
+        "id": 1, "type": "choice",
+        "content": "已知函数f(x)=x^2-2ax+3在区间[1,2]上单调递增，求实数a的取值范围，并说明其几何意义。",
+        "options": ["A. a≤1", "B. a≥1", "C. a≤2", "D. a≥2"],
+        "knowledge_points": ["函数", "单调性"]
+    }
+    for n_questions in (10, 100, 1000):
+        text = json.dumps([question] * n_questions, ensure_ascii=False)
+        assert classifier.scores(text) == _count_scores(SUBJECTS, text)
+        repeat = max(1, 2000 // n_questions)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            _count_scores(SUBJECTS, text)
+        count_time = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            classifier.scores(text)
+        automaton_time = (time.perf_counter() - start) / repeat
+
+        print(f"{len(text):>8} 字符: str.count {count_time * 1000:8.3f} ms, "
+              f"自动机 {automaton_time * 1000:8.3f} ms, 加速 {count_time / automaton_time:5.2f}x")
@@ -2,6 +2,7 @@ import json
 import re
 import os  # 导入 os 模块用于文件系统操作
 from openai import OpenAI  # 确保你安装了 openai-python SDK，适配 GLM
+from document_store import create_document_store  # 错题文档存储（段文件或JSON文件）
 
 # ===== 1. 初始化 GLM 客户端（替换成你的 API KEY 和 Base URL） =====
 client = OpenAI(
@@ -13,10 +14,10 @@ client = OpenAI(
 # ===== 2. 读取错题数据 =====
 def load_wrong_questions(directory_path, subject=None):
     """
-    从指定目录加载错题数据，并可选地按科目筛选。
+    从指定目录的错题文档存储中加载错题数据，并可选地按科目筛选。
 
     Args:
-        directory_path (str): 包含错题JSON文件的目录路径。
+        directory_path (str): 错题文档存储的目录路径（如 wrong_docs）。
         subject (str, optional): 要筛选的科目名称（英文小写，如 "math", "english", "chinese"）。
                                  只有文件名中包含该科目的文件才会被加载。
                                  默认为 None，表示加载所有文件。
@@ -35,32 +36,32 @@ def load_wrong_questions(directory_path, subject=None):
         subject_lower = subject.lower()
         print(f"🔍 仅加载科目为 '{subject}' 的错题...")
 
-    for filename in os.listdir(directory_path):
-        if filename.endswith(".json"):
-            file_path = os.path.join(directory_path, filename)
-
+    store = create_document_store(directory_path)
+    try:
+        for filename in sorted(store.names()):
             # 如果指定了科目，并且文件名（转换为小写）中不包含该科目（转换为小写），则跳过此文件
             if subject and subject_lower not in filename.lower():
                 print(f"跳过文件：'{filename}' (不包含科目 '{subject}')")
                 continue
 
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # 检查 JSON 数据是列表还是包含 "questions" 键的字典
-                    if isinstance(data, list):
-                        all_wrong_questions.extend(data)
-                        print(f"✅ 从 '{filename}' 加载了 {len(data)} 道题目。")
-                    elif isinstance(data, dict) and "questions" in data and isinstance(data["questions"], list):
-                        all_wrong_questions.extend(data["questions"])
-                        print(f"✅ 从 '{filename}' 加载了 {len(data['questions'])} 道题目。")
-                    else:
-                        print(
-                            f"⚠️ 文件 '{filename}' 的内容格式不符合预期（既不是题目列表也不是包含 'questions' 键的字典），跳过。")
+                data = store.get(filename)
+                # 检查 JSON 数据是列表还是包含 "questions" 键的字典
+                if isinstance(data, list):
+                    all_wrong_questions.extend(data)
+                    print(f"✅ 从 '{filename}' 加载了 {len(data)} 道题目。")
+                elif isinstance(data, dict) and "questions" in data and isinstance(data["questions"], list):
+                    all_wrong_questions.extend(data["questions"])
+                    print(f"✅ 从 '{filename}' 加载了 {len(data['questions'])} 道题目。")
+                else:
+                    print(
+                        f"⚠️ 文件 '{filename}' 的内容格式不符合预期（既不是题目列表也不是包含 'questions' 键的字典），跳过。")
             except json.JSONDecodeError as e:
                 print(f"❌ 解析文件 '{filename}' 失败：{e}")
             except Exception as e:
                 print(f"❌ 读取文件 '{filename}' 时发生错误：{e}")
+    finally:
+        store.close()
 
     print(f"✨ 共加载了 {len(all_wrong_questions)} 道符合条件的错题。")
     return all_wrong_questions
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试直接导入应用目录中的模块（与 main.py 的导入方式相同）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
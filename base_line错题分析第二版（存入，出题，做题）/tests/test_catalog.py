@@ -0,0 +1,122 @@
+"""
+文档元数据目录的测试：按 (创建时间, 文件名) 倒序的游标分页，按内容哈希识别重复的文档。
+"""
+import pytest
+
+from catalog import DocumentCatalog, content_hash, encode_token
+from document_store import FileDocumentStore
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return DocumentCatalog(str(tmp_path / "catalog.db"))
+
+
+def add(catalog, subject, doc_id, created):
+    catalog.upsert(f"{subject}_{doc_id}.json", subject, 100, created, f"{subject} 第{doc_id}题")
+
+
+def walk(catalog, limit, subject=None):
+    """按游标逐页读取，返回所有页的文件名"""
+    pages = []
+    cursor = None
+    while True:
+        rows, cursor = catalog.list_documents(limit, cursor, subject)
+        pages.append([row["file_name"] for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_cover_every_document_once_in_order(catalog):
+    # 部分文档的创建时间相同，按文件名倒序区分
+    for i in range(1, 24):
+        add(catalog, "math" if i % 3 else "physics", i, 1000.0 + i // 2)
+    expected = [row["file_name"] for row in catalog.list_documents(100)[0]]
+    assert len(expected) == 23
+
+    pages = walk(catalog, 5)
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    assert [name for page in pages for name in page] == expected
+    assert catalog.list_documents(23)[1] is None
+
+
+def test_subject_filter_pages(catalog):
+    for i in range(1, 13):
+        add(catalog, "math" if i % 2 else "physics", i, 2000.0 + i)
+    pages = walk(catalog, 4, subject="physics")
+    assert pages == [["physics_12.json", "physics_10.json", "physics_8.json", "physics_6.json"],
+                     ["physics_4.json", "physics_2.json"]]
+    assert catalog.count("physics") == 6
+
+
+def test_new_documents_do_not_shift_later_pages(catalog):
+    for i in range(1, 11):
+        add(catalog, "math", i, 3000.0 + i)
+    first, cursor = catalog.list_documents(4)
+    # 翻页期间写入的新文档排在最前面，不会让后面的页重复或漏掉文档
+    add(catalog, "math", 99, 9999.0)
+    second, cursor = catalog.list_documents(4, cursor)
+    third, cursor = catalog.list_documents(4, cursor)
+    names = [row["file_name"] for row in first + second + third]
+    assert names == [f"math_{i}.json" for i in range(10, 0, -1)]
+    assert cursor is None
+
+
+def test_invalid_cursor_is_rejected(catalog):
+    add(catalog, "math", 1, 1.0)
+    with pytest.raises(ValueError):
+        catalog.list_documents(10, "not-a-cursor")
+    with pytest.raises(ValueError):
+        catalog.list_documents(10, encode_token({"created": 1}))
+
+
+def test_content_hash_ignores_formatting_and_key_order():
+    a = [{"id": 1, "content": "函数单调性", "knowledge_points": ["导数"]}]
+    b = [{"knowledge_points": ["导数"], "content": "函数单调性", "id": 1}]
+    assert content_hash(a) == content_hash(b)
+    assert content_hash(a) != content_hash([{**a[0], "content": "函数奇偶性"}])
+
+
+def test_first_claim_owns_the_hash(catalog):
+    digest = content_hash([{"content": "数列"}])
+    assert catalog.claim_hash(digest, "math_1.json") == "math_1.json"
+    # 相同内容的第二次保存得到已有的文档
+    assert catalog.claim_hash(digest, "math_2.json") == "math_1.json"
+    assert catalog.find_by_hash(digest) == "math_1.json"
+    catalog.release_hash(digest, "math_1.json")
+    assert catalog.find_by_hash(digest) is None
+    assert catalog.claim_hash(digest, "math_2.json") == "math_2.json"
+
+
+class CountingStore(FileDocumentStore):
+    """记录读取过的文档"""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.reads = []
+
+    def get(self, name):
+        self.reads.append(name)
+        return super().get(name)
+
+
+def test_sync_store_records_duplicates_and_reclaims_after_owner_removed(catalog, tmp_path):
+    store = CountingStore(str(tmp_path / "docs"))
+    same = [{"id": 1, "content": "等差数列求和"}]
+    store.put("math_1.json", "math", same)
+    store.put("math_2.json", "math", same)
+    store.put("math_3.json", "math", [{"id": 1, "content": "三角函数"}])
+    assert catalog.sync_store(store) == 3
+    assert catalog.find_by_hash(content_hash(same)) == "math_1.json"
+    assert catalog.find_by_hash(content_hash(store.get("math_3.json"))) == "math_3.json"
+
+    # 已知的重复文档没有变化，再次同步时不重新读取
+    store.reads.clear()
+    assert catalog.sync_store(store) == 0
+    assert store.reads == []
+
+    # 持有哈希的文档被删除后，重复的文档重新登记这个哈希
+    store.delete("math_1.json")
+    catalog.sync_store(store)
+    assert catalog.find_by_hash(content_hash(same)) == "math_2.json"
+    assert catalog.count() == 2
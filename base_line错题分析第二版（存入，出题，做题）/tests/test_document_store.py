@@ -0,0 +1,176 @@
+"""
+文档存储的测试：两种存储的基本读写，段文件存储的压缩、索引重建、不完整记录的恢复和变更记录。
+"""
+import os
+import sys
+import subprocess
+
+import pytest
+
+from document_store import (DocumentStore, FileDocumentStore, SegmentDocumentStore, SEGMENT_DIR_NAME,
+                            create_document_store)
+
+
+def question(i, text="函数单调性"):
+    return [{"id": 1, "content": f"{text}第{i}题", "answer": "A"}]
+
+
+@pytest.mark.parametrize("backend", ["files", "segments"])
+def test_put_get_replace_delete(tmp_path, backend):
+    store = create_document_store(str(tmp_path), backend=backend)
+    try:
+        store.put("math_1.json", "math", question(1))
+        store.put("history_1.json", "history", question(1, "朝代"))
+        with pytest.raises(FileExistsError):
+            store.put("math_1.json", "math", question(2), overwrite=False)
+        assert store.put_many([("math_1.json", "math", question(3)), ("math_2.json", "math", question(2))],
+                              overwrite=False) == ["math_1.json"]
+
+        version = store.version("math_1.json")
+        store.put("math_1.json", "math", question(9))
+        assert store.get("math_1.json") == question(9)
+        assert store.version("math_1.json") != version
+
+        store.delete("history_1.json")
+        with pytest.raises(KeyError):
+            store.get("history_1.json")
+        with pytest.raises(KeyError):
+            store.delete("history_1.json")
+        assert sorted(store.names()) == ["math_1.json", "math_2.json"]
+        assert store.subjects() == ["math"]
+        assert set(store.stat_all()) == {"math_1.json", "math_2.json"}
+    finally:
+        store.close()
+
+
+def test_compaction_keeps_live_documents_and_deletions(tmp_path):
+    root = str(tmp_path)
+    store = SegmentDocumentStore(root, max_segment_bytes=200)
+    try:
+        for round_ in range(5):
+            for i in range(4):
+                store.put(f"math_{i}.json", "math", question(round_ * 10 + i))
+        store.delete("math_3.json")
+        segment_dir = os.path.join(root, SEGMENT_DIR_NAME, "math")
+        before = len(os.listdir(segment_dir))
+
+        assert store.compact() > 0
+        assert len(os.listdir(segment_dir)) < before
+        assert sorted(store.names()) == ["math_0.json", "math_1.json", "math_2.json"]
+        for i in range(3):
+            assert store.get(f"math_{i}.json") == question(40 + i)
+
+        # 压缩后重建索引，被删除的文档不会重新出现
+        assert store.rebuild_index() == 3
+        assert not store.exists("math_3.json")
+        assert store.get("math_2.json") == question(42)
+    finally:
+        store.close()
+
+
+def test_index_is_rebuilt_from_segments(tmp_path):
+    root = str(tmp_path)
+    store = SegmentDocumentStore(root)
+    store.put("math_1.json", "math", question(1))
+    store.put("math_1.json", "math", question(2))
+    store.put("math_2.json", "math", question(3))
+    store.delete("math_2.json")
+    store.close()
+
+    os.remove(os.path.join(root, SEGMENT_DIR_NAME, "index.db"))
+    store = SegmentDocumentStore(root)
+    try:
+        assert store.names() == ["math_1.json"]
+        assert store.get("math_1.json") == question(2)
+    finally:
+        store.close()
+
+
+def test_torn_record_is_skipped_on_rebuild(tmp_path):
+    root = str(tmp_path)
+    store = SegmentDocumentStore(root)
+    store.put("math_1.json", "math", question(1))
+    segment = os.path.join(root, SEGMENT_DIR_NAME, "math", "000001.jsonl")
+    store.close()
+    # 模拟写入记录的中途进程退出
+    with open(segment, "ab") as f:
+        f.write(b'{"name": "math_2.json", "subject": "math", "created": 1.0, "doc": [{"con')
+    os.remove(os.path.join(root, SEGMENT_DIR_NAME, "index.db"))
+
+    store = SegmentDocumentStore(root)
+    try:
+        assert store.names() == ["math_1.json"]
+        # 不完整的记录被截掉，之后追加的文档在再次重建索引后仍然存在
+        store.put("math_3.json", "math", question(3))
+        assert store.get("math_3.json") == question(3)
+        assert store.rebuild_index() == 2
+        assert store.get("math_3.json") == question(3)
+    finally:
+        store.close()
+
+
+def test_uncommitted_tail_is_truncated_before_next_append(tmp_path):
+    root = str(tmp_path)
+    store = SegmentDocumentStore(root)
+    try:
+        store.put("math_1.json", "math", question(1))
+        segment = os.path.join(root, SEGMENT_DIR_NAME, "math", "000001.jsonl")
+        # 模拟另一个进程追加了记录但在提交索引之前退出
+        with open(segment, "ab") as f:
+            f.write(b'{"name": "math_2.json", "subject": "math", "created": 1.0, "doc": [{"con')
+        store.put("math_3.json", "math", question(3))
+        assert store.rebuild_index() == 2
+        assert sorted(store.names()) == ["math_1.json", "math_3.json"]
+        assert store.get("math_3.json") == question(3)
+    finally:
+        store.close()
+
+
+def test_files_are_migrated_into_segments(tmp_path):
+    root = str(tmp_path)
+    files = FileDocumentStore(root)
+    files.put("math_1.json", "math", question(1))
+    store = create_document_store(root, backend="segments")
+    try:
+        assert store.get("math_1.json") == question(1)
+    finally:
+        store.close()
+
+
+def test_incomplete_store_cannot_be_instantiated():
+    class ReadOnlyStore(DocumentStore):
+        def get_text(self, name):
+            return "[]"
+
+    with pytest.raises(TypeError):
+        ReadOnlyStore()
+
+
+def test_change_log_reports_writes_from_other_processes(tmp_path):
+    root = str(tmp_path)
+    store = SegmentDocumentStore(root, max_segment_bytes=200)
+    try:
+        cursor = store.change_cursor()
+        # 本进程的写入由写入方处理，不出现在变更记录中
+        store.put("math_1.json", "math", question(1))
+        names, cursor = store.changes_since(cursor)
+        assert names == []
+        app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, "-c", (
+            "from document_store import SegmentDocumentStore\n"
+            f"store = SegmentDocumentStore({root!r})\n"
+            "store.put('math_2.json', 'math', [{'id': 1, 'content': '另一个进程写入的题目'}])\n"
+            "store.delete('math_1.json')\n"
+            "store.close()\n"
+        )], cwd=app_dir, check=True)
+        names, cursor = store.changes_since(cursor)
+        assert sorted(names) == ["math_1.json", "math_2.json"]
+        assert store.changes_since(cursor) == ([], cursor)
+        # 压缩搬移记录不算变更
+        for i in range(3, 6):
+            store.put(f"math_{i}.json", "math", question(i))
+        _, cursor = store.changes_since(cursor)
+        assert store.compact(min_garbage_ratio=0.0) > 0
+        assert store.changes_since(cursor) == ([], cursor)
+    finally:
+        store.close()
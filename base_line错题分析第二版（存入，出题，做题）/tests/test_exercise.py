@@ -0,0 +1,171 @@
+"""
+做题服务（exercise.py）的接口测试：试卷的ETag和304响应，按 exam_id 或科目判题，不会随机选择试卷判题；
+批量判题的成绩、错误率和错题写入。
+"""
+import os
+import sys
+import json
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+import sequence
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    {"id": 1, "type": "single", "score": 5, "content": "函数 y=x^2 的对称轴是", "options": ["A. x=0", "B. y=0"],
+     "knowledge_points": ["二次函数"], "correct_answer": "A"},
+    {"id": 2, "type": "single", "score": 5, "content": "等差数列的通项公式", "options": ["A. a+nd", "B. a+(n-1)d"],
+     "knowledge_points": ["数列"], "correct_answer": "B"},
+    {"id": 3, "type": "fill", "score": 10, "content": "log2(8) =", "knowledge_points": ["对数"],
+     "correct_answer": "3"},
+]
+
+
+@pytest.fixture(scope="module")
+def exercise(tmp_path_factory):
+    """在临时目录中导入 exercise.py：错题目录、编号序列、暂存文件和试卷目录都指向临时目录"""
+    root = tmp_path_factory.mktemp("exercise")
+    patch = pytest.MonkeyPatch()
+    patch.chdir(APP_DIR)
+    patch.setattr(config, "ERROR_QUESTION_PATH", str(root / "error_question"))
+    patch.setattr(config, "WRONG_QUEUE_SPILL_PATH", str(root / "wrong_question_pending.jsonl"))
+    patch.setattr(config, "SEQUENCE_DB_PATH", str(root / "sequences.db"))
+    patch.setattr(sequence, "_allocator", None)
+    sys.modules.pop("exercise", None)
+    module = importlib.import_module("exercise")
+    exam_dir = root / "exams"
+    exam_dir.mkdir()
+    with open(exam_dir / "new_questions_math.json", "w", encoding="utf-8") as f:
+        json.dump(QUESTIONS, f, ensure_ascii=False)
+    with open(exam_dir / "new_questions_history.json", "w", encoding="utf-8") as f:
+        json.dump([{**QUESTIONS[0], "correct_answer": "B"}], f, ensure_ascii=False)
+    patch.setattr(module, "TEST_FILES_DIR", str(exam_dir))
+    yield module
+    module.wrong_question_writer.close()
+    module.error_documents.close()
+    sys.modules.pop("exercise", None)
+    patch.undo()
+
+
+@pytest.fixture
+def client(exercise):
+    return TestClient(exercise.app)
+
+
+def wrong_files(exercise, subject="math"):
+    exercise.wrong_question_writer.flush()
+    return sorted(exercise.error_documents.names(subject))
+
+
+def test_submit_without_exam_or_subject_is_rejected(exercise, client):
+    before = wrong_files(exercise)
+    response = client.post("/submit", json=["B", "A", "1"])
+    assert response.status_code == 400
+    assert "exam_id" in response.json()["error"]
+    assert wrong_files(exercise) == before
+
+
+def test_submit_by_exam_id_grades_issued_exam(exercise, client):
+    exam = client.get("/exam", params={"subject": "math"}).json()
+    assert all("correct_answer" not in q for q in exam["questions"])
+    before = wrong_files(exercise)
+    response = client.post("/submit", params={"exam_id": exam["exam_id"]}, json=["A", "A", " 3 "])
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["right_count"], result["wrong_count"]) == (2, 1)
+    assert [item["is_correct"] for item in result["results"]] == [True, False, True]
+    new_files = sorted(set(wrong_files(exercise)) - set(before))
+    assert len(new_files) == 1
+    assert [q["id"] for q in exercise.error_documents.get(new_files[0])] == [2]
+
+
+def test_submit_by_subject_and_unknown_exam_id(client):
+    result = client.post("/submit", params={"subject": "math"}, json=["A", "B", "3"]).json()
+    assert result["right_count"] == 3
+    response = client.post("/submit", params={"exam_id": "0" * 32}, json=["A", "B", "3"])
+    assert response.status_code == 404
+
+
+def test_submit_batch_grades_class_and_writes_wrong_questions_once(exercise, client, monkeypatch):
+    calls = []
+    save = exercise.save_wrong_question_groups
+
+    def spy(groups, subject_name):
+        calls.append(len(groups))
+        return save(groups, subject_name)
+
+    monkeypatch.setattr(exercise, "save_wrong_question_groups", spy)
+    submitted = []
+    submit = exercise.wrong_question_writer.submit
+
+    def spy_submit(item):
+        submitted.append(item)
+        submit(item)
+
+    monkeypatch.setattr(exercise.wrong_question_writer, "submit", spy_submit)
+    exam_id = client.get("/exam", params={"subject": "math"}).json()["exam_id"]
+    before = set(wrong_files(exercise))
+    submissions = [
+        {"student_id": "s1", "answers": ["A", "B", "3"]},
+        {"student_id": "s2", "answers": ["B", "B", "3"]},
+        {"student_id": "s3", "answers": ["B", "A", " 3"]},
+        {"student_id": "s4", "answers": ["B", "A", "4"]},
+        {"student_id": "s5", "answers": ["A"]},
+        {"student_id": "../bad", "answers": ["A", "B", "3"]},
+    ]
+    result = client.post("/submit/batch", params={"exam_id": exam_id}, json=submissions).json()
+
+    assert result["graded"] == 4
+    assert [r.get("right_count") for r in result["results"][:4]] == [3, 2, 1, 0]
+    assert result["average_right"] == 1.5
+    assert result["results"][2]["wrong_question_ids"] == [1, 2]
+    assert [set(r) for r in result["results"][4:]] == [{"student_id", "error"}] * 2
+    assert [(q["id"], q["wrong_count"], q["error_rate"]) for q in result["questions"]] == [
+        (1, 3, 0.75), (2, 2, 0.5), (3, 1, 0.25)
+    ]
+
+    # 三个有错题的学生各保存一个错题文件，整批作为一项入队、只写入一次
+    new_files = sorted(set(wrong_files(exercise)) - before)
+    assert [(subject, len(groups)) for subject, groups in submitted] == [("math", 3)]
+    assert calls == [3]
+    saved = {exercise.error_documents.get(name)[0]["student_id"]: exercise.error_documents.get(name)
+             for name in new_files}
+    assert sorted(saved) == ["s2", "s3", "s4"]
+    assert [q["id"] for q in saved["s4"]] == [1, 2, 3]
+
+
+def test_exam_etag_and_not_modified(exercise, client):
+    response = client.get("/exam", params={"subject": "history"}, headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    exam = response.json()
+    exam_id = exam["exam_id"]
+    etag = response.headers["ETag"]
+    assert etag == f'W/"{exam_id}"'
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    # 弱比较：强ETag、列表中的ETag和 * 都匹配
+    for if_none_match in (etag, f'"{exam_id}"', f'"other", {etag}', "*"):
+        not_modified = client.get("/exam", params={"subject": "history"}, headers={"If-None-Match": if_none_match})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert not_modified.headers["ETag"] == etag
+    assert client.get("/exam", params={"subject": "history"},
+                      headers={"If-None-Match": 'W/"other"'}).status_code == 200
+
+    compressed = client.get("/exam", params={"subject": "history"}, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["ETag"] == etag
+    assert compressed.json() == exam
+
+    # 试卷文件重新生成后ETag变化，旧的ETag不再返回304
+    with open(os.path.join(exercise.TEST_FILES_DIR, "new_questions_history.json"), "w", encoding="utf-8") as f:
+        json.dump([{**QUESTIONS[0], "content": "重新生成的题目", "correct_answer": "B"}], f, ensure_ascii=False)
+    changed = client.get("/exam", params={"subject": "history"}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["questions"][0]["content"] == "重新生成的题目"
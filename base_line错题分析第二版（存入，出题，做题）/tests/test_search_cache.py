@@ -0,0 +1,52 @@
+"""
+搜索结果缓存的测试：写入代数失效、计算期间发生写入的结果不缓存、TTL和LRU淘汰。
+"""
+import time
+
+from search_cache import SearchCache
+
+
+def test_write_invalidates_cached_results():
+    cache = SearchCache(max_entries=8, ttl=60)
+    key = ("keyword", "函数", None, 10)
+    cache.put(key, ["math_1.json"], cache.generation)
+    assert cache.get(key) == ["math_1.json"]
+
+    cache.bump_generation()
+    assert cache.get(key) is None
+    assert cache.stats()["generation"] == 1
+
+
+def test_result_computed_across_a_write_is_not_cached():
+    cache = SearchCache(max_entries=8, ttl=60)
+    key = ("hybrid", "数列", "math", 10)
+    generation = cache.generation
+    # 计算结果期间保存了新文档，结果可能缺少新文档
+    cache.bump_generation()
+    cache.put(key, ["math_1.json"], generation)
+    assert cache.get(key) is None
+
+    cache.put(key, ["math_1.json", "math_2.json"], cache.generation)
+    assert cache.get(key) == ["math_1.json", "math_2.json"]
+
+
+def test_ttl_and_lru_eviction():
+    cache = SearchCache(max_entries=2, ttl=0.05)
+    cache.put("a", 1, cache.generation)
+    cache.put("b", 2, cache.generation)
+    assert cache.get("a") == 1
+    cache.put("c", 3, cache.generation)
+    # b 最久没有被访问，被淘汰
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_zero_size_disables_cache():
+    cache = SearchCache(max_entries=0, ttl=60)
+    cache.put("a", 1, cache.generation)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,49 @@
+"""
+混合搜索排名的测试：BM25题目排序、学科筛选，以及倒数排名融合（RRF）的顺序。
+"""
+import pytest
+
+from search_index import BM25Index, reciprocal_rank_fusion
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add_document("math_1.json", [("1", "等比数列求和公式 数列"), ("2", "三角函数的周期")])
+    index.add_document("math_2.json", [("1", "等差数列通项 数列 数列求和")])
+    index.add_document("physics_1.json", [("1", "匀加速直线运动的位移")])
+    index.add_document("math_3.json", [("1", "导数与函数单调性 导数 导数")])
+    return index
+
+
+def test_bm25_ranks_questions_by_relevance(index):
+    hits = index.search("数列求和", limit=10)
+    assert [(hit["file_name"], hit["question_id"]) for hit in hits] == [("math_2.json", "1"), ("math_1.json", "1")]
+    assert hits[0]["score"] > hits[1]["score"] > 0
+    assert index.search("位移", subject="math") == []
+    assert [hit["file_name"] for hit in index.search("位移", subject="physics")] == ["physics_1.json"]
+
+
+def test_removed_document_leaves_ranking(index):
+    index.remove_document("math_2.json")
+    assert [(hit["file_name"], hit["question_id"]) for hit in index.search("数列求和")] == [("math_1.json", "1")]
+
+
+def test_rrf_prefers_items_ranked_by_both_lists():
+    keyword = ["a", "b", "c"]
+    vector = ["c", "d", "a"]
+    fused = reciprocal_rank_fusion([keyword, vector], k=60)
+    assert [key for key, _ in fused] == ["a", "c", "b", "d"]
+    scores = dict(fused)
+    assert scores["a"] == pytest.approx(1 / 61 + 1 / 63)
+    assert scores["c"] == pytest.approx(1 / 63 + 1 / 61)
+    assert scores["b"] == pytest.approx(1 / 62)
+
+
+def test_rrf_counts_repeated_items_once_and_breaks_ties_by_key():
+    # 向量搜索中同一题目的多个命中只计排名最靠前的一次，之后的项排名不受影响
+    fused = reciprocal_rank_fusion([[("math_2.json", "1"), ("math_2.json", "1"), ("math_1.json", "1")]], k=0)
+    assert fused == [(("math_2.json", "1"), 1.0), (("math_1.json", "1"), 0.5)]
+    # 得分相同时按项排序
+    assert [key for key, _ in reciprocal_rank_fusion([["b"], ["a"]], k=60)] == ["a", "b"]
+    assert reciprocal_rank_fusion([[], []], k=60) == []
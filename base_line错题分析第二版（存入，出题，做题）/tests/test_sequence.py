@@ -0,0 +1,101 @@
+"""
+SequenceAllocator 的并发测试：多个线程、多个进程同时分配编号，所有编号都不重复且连续。
+"""
+import multiprocessing
+import threading
+
+from sequence import SequenceAllocator
+
+NAMESPACE = "error_question:math"
+
+
+def _allocate(db_path, count, block, results):
+    """在单独的进程中打开分配器并分配编号（模拟多个worker进程）"""
+    allocator = SequenceAllocator(db_path)
+    ids = []
+    for _ in range(count):
+        if block > 1:
+            ids.extend(allocator.next_ids(NAMESPACE, block))
+        else:
+            ids.append(allocator.next_id(NAMESPACE))
+    results.put(ids)
+
+
+def _run_threads(n_threads, target):
+    barrier = threading.Barrier(n_threads)
+
+    def run():
+        barrier.wait()
+        target()
+
+    threads = [threading.Thread(target=run) for _ in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_threads_sharing_one_allocator(tmp_path):
+    allocator = SequenceAllocator(str(tmp_path / "sequence.db"))
+    ids = []
+    lock = threading.Lock()
+
+    def allocate():
+        local = [allocator.next_id(NAMESPACE) for _ in range(200)]
+        with lock:
+            ids.extend(local)
+
+    _run_threads(16, allocate)
+    assert len(ids) == len(set(ids)) == 16 * 200
+    assert sorted(ids) == list(range(1, 16 * 200 + 1))
+
+
+def test_threads_with_separate_connections(tmp_path):
+    db_path = str(tmp_path / "sequence.db")
+    ids = []
+    lock = threading.Lock()
+
+    def allocate():
+        # 每个线程一个连接，互斥只依赖SQLite的写锁
+        allocator = SequenceAllocator(db_path)
+        local = [allocator.next_id(NAMESPACE) for _ in range(100)]
+        with lock:
+            ids.extend(local)
+
+    _run_threads(8, allocate)
+    assert sorted(ids) == list(range(1, 8 * 100 + 1))
+
+
+def test_processes_never_collide(tmp_path):
+    db_path = str(tmp_path / "sequence.db")
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    # 一半进程逐个分配，一半进程按块分配
+    workers = [context.Process(target=_allocate, args=(db_path, 100, 1 if i % 2 == 0 else 5, results))
+               for i in range(8)]
+    for worker in workers:
+        worker.start()
+    ids = []
+    for _ in workers:
+        ids.extend(results.get(timeout=120))
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    expected = 4 * 100 + 4 * 100 * 5
+    assert len(ids) == len(set(ids)) == expected
+    assert sorted(ids) == list(range(1, expected + 1))
+
+
+def test_seed_used_only_once(tmp_path):
+    allocator = SequenceAllocator(str(tmp_path / "sequence.db"))
+    calls = []
+
+    def seed():
+        calls.append(1)
+        return 41
+
+    assert allocator.next_id(NAMESPACE, seed) == 42
+    assert list(allocator.next_ids(NAMESPACE, 3, seed)) == [43, 44, 45]
+    assert allocator.next_id("error_question:history") == 1
+    assert len(calls) == 1
@@ -0,0 +1,100 @@
+"""
+NumpyVectorStore 的持久化测试：插入只追加日志，重新打开后数据一致，删除后重写快照。
+"""
+import os
+
+import numpy as np
+
+import vector_store
+from vector_store import NumpyVectorStore
+
+DIM = 8
+
+
+def make_rows(start, count, student_id=""):
+    rng = np.random.default_rng(start)
+    return {
+        "id": [f"id{i}" for i in range(start, start + count)],
+        "file_path": [f"wrong_docs/math_{i}.json" for i in range(start, start + count)],
+        "embedding": rng.random((count, DIM), dtype=np.float32).tolist(),
+        "subject": ["math"] * count,
+        "student_id": [student_id] * count,
+    }
+
+
+def open_store(path):
+    return NumpyVectorStore(path=path, dim=DIM, index_type="FLAT")
+
+
+def all_ids(store):
+    return sorted(hit["id"] for hit in store.search([0.5] * DIM, limit=10 ** 6))
+
+
+def test_flush_appends_to_log_instead_of_rewriting_snapshot(tmp_path):
+    path = str(tmp_path / "vectors")
+    store = open_store(path)
+    store.insert(make_rows(0, 10))
+    store.flush()
+    store.insert(make_rows(10, 5))
+    store.flush()
+
+    # 还没有快照，两批数据都在日志中
+    assert not os.path.exists(f"{path}.npy")
+    assert os.path.getsize(store._log_vectors_file) == 15 * DIM * 4
+
+    reopened = open_store(path)
+    assert len(reopened) == 15
+    assert all_ids(reopened) == all_ids(store)
+
+
+def test_log_is_merged_into_snapshot_when_it_grows(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "NUMPY_LOG_MIN_ROWS", 20)
+    path = str(tmp_path / "vectors")
+    store = open_store(path)
+    for start in range(0, 50, 10):
+        store.insert(make_rows(start, 10))
+        store.flush()
+
+    assert os.path.exists(f"{path}.npy")
+    snapshot_rows = len(np.load(f"{path}.npy"))
+    assert 0 < snapshot_rows <= 50
+    assert len(open_store(path)) == 50
+
+
+def test_delete_rewrites_snapshot_and_drops_old_log(tmp_path):
+    path = str(tmp_path / "vectors")
+    store = open_store(path)
+    store.insert(make_rows(0, 10))
+    store.insert(make_rows(10, 10, student_id="s1"))
+    store.flush()
+    old_log = store._log_vectors_file
+
+    store.delete_files(["wrong_docs/math_3.json"])
+    store.delete_student("s1")
+    store.flush()
+    assert not os.path.exists(old_log)
+
+    reopened = open_store(path)
+    assert len(reopened) == 9
+    assert "id3" not in all_ids(reopened)
+
+    # 快照之后的插入追加到新一代日志
+    reopened.insert(make_rows(100, 2))
+    reopened.flush()
+    assert len(open_store(path)) == 11
+
+
+def test_torn_log_tail_is_dropped(tmp_path):
+    path = str(tmp_path / "vectors")
+    store = open_store(path)
+    store.insert(make_rows(0, 4))
+    store.flush()
+    # 模拟写入向量之后、写入字段之前进程退出
+    with open(store._log_vectors_file, "ab") as f:
+        f.write(np.ones(DIM + 3, dtype=np.float32).tobytes())
+
+    reopened = open_store(path)
+    assert len(reopened) == 4
+    reopened.insert(make_rows(4, 1))
+    reopened.flush()
+    assert all_ids(open_store(path)) == [f"id{i}" for i in range(5)]
@@ -0,0 +1,124 @@
+"""
+目录监视的测试：只报告变化的文件，忽略段文件目录和SQLite日志，连续写入合并为一次回调。
+"""
+import os
+import json
+import time
+import asyncio
+
+import pytest
+
+import config
+from document_store import SEGMENT_DIR_NAME
+from watcher import InotifyWatcher, PollingWatcher, merge_changes, watch_directories
+
+
+def write(path, data="[]"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data)
+
+
+def write_internal_files(root):
+    """服务自己写入的段文件、索引数据库及其日志"""
+    write(os.path.join(root, SEGMENT_DIR_NAME, "math", "000001.jsonl"), "{}\n")
+    write(os.path.join(root, SEGMENT_DIR_NAME, "index.db"), "")
+    write(os.path.join(root, "index.db-wal"), "")
+    write(os.path.join(root, "index.db-shm"), "")
+    write(os.path.join(root, "math_1.json.lock"), "")
+
+
+def test_polling_reports_changed_files_only(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, "math_1.json"))
+    write(os.path.join(root, "math_2.json"))
+    watcher = PollingWatcher([root])
+    write_internal_files(root)
+    assert watcher.poll() == {}
+
+    write(os.path.join(root, "math_1.json"), json.dumps([{"content": "修改后的题目"}]))
+    os.remove(os.path.join(root, "math_2.json"))
+    write(os.path.join(root, "physics", "physics_1.json"))
+    assert watcher.poll() == {root: {"math_1.json", "math_2.json", os.path.join("physics", "physics_1.json")}}
+    assert watcher.poll() == {}
+
+
+def test_inotify_ignores_internal_files(tmp_path):
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, SEGMENT_DIR_NAME))
+    try:
+        watcher = InotifyWatcher([root])
+    except (OSError, AttributeError):
+        pytest.skip("inotify不可用")
+    try:
+        write_internal_files(root)
+        assert watcher.read_changes() == {}
+        write(os.path.join(root, "math_1.json"))
+        # 新建的目录中已经写入的文件同样报告
+        write(os.path.join(root, "physics", "physics_1.json"))
+        assert watcher.read_changes() == {root: {"math_1.json", os.path.join("physics", "physics_1.json")}}
+    finally:
+        watcher.close()
+
+
+def test_merge_changes_full_rescan_wins():
+    changes = {"a": {"x.json"}}
+    merge_changes(changes, {"a": {"y.json"}, "b": {"z.json"}})
+    assert changes == {"a": {"x.json", "y.json"}, "b": {"z.json"}}
+    merge_changes(changes, {"a": None})
+    merge_changes(changes, {"a": {"w.json"}})
+    assert changes == {"a": None, "b": {"z.json"}}
+
+
+async def watch_while(root, action, debounce, max_delay):
+    """监视 root 期间执行 action，返回回调收到的所有变化"""
+    calls = []
+
+    async def on_change(changes):
+        calls.append(changes)
+
+    task = asyncio.ensure_future(watch_directories([root], on_change, debounce=debounce, max_delay=max_delay))
+    await asyncio.sleep(0.1)
+    try:
+        await action()
+        await asyncio.sleep(debounce + 0.5)
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    return calls
+
+
+def test_debounce_merges_burst_into_one_callback(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "WATCH_BACKEND", "polling")
+    monkeypatch.setattr(config, "WATCH_POLL_INTERVAL", 0.05)
+    root = str(tmp_path)
+
+    async def burst():
+        for i in range(3):
+            write(os.path.join(root, f"math_{i}.json"))
+            await asyncio.sleep(0.1)
+
+    calls = asyncio.run(watch_while(root, burst, debounce=0.4, max_delay=5.0))
+    assert calls == [{root: {"math_0.json", "math_1.json", "math_2.json"}}]
+
+
+def test_max_delay_bounds_waiting_under_continuous_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "WATCH_BACKEND", "polling")
+    monkeypatch.setattr(config, "WATCH_POLL_INTERVAL", 0.05)
+    root = str(tmp_path)
+
+    async def stream():
+        deadline = time.monotonic() + 1.5
+        i = 0
+        while time.monotonic() < deadline:
+            write(os.path.join(root, f"math_{i}.json"))
+            i += 1
+            await asyncio.sleep(0.1)
+
+    calls = asyncio.run(watch_while(root, stream, debounce=0.3, max_delay=0.5))
+    # 一直有写入时每 max_delay 秒同步一次，不会等到写入停止
+    assert len(calls) >= 2
+    assert all(paths for changes in calls for paths in changes.values())
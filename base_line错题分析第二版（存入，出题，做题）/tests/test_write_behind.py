@@ -0,0 +1,83 @@
+"""
+WriteBehindQueue 的测试：关闭与提交并发时不丢数据，写入失败的数据暂存后重新写入。
+"""
+import threading
+
+from write_behind import WriteBehindQueue
+
+
+class Recorder:
+    """记录写入的数据，前 fail_times 次写入抛出异常"""
+
+    def __init__(self, fail_times=0):
+        self.fail_times = fail_times
+        self.calls = 0
+        self.values = []
+        self.lock = threading.Lock()
+
+    def __call__(self, key, values):
+        with self.lock:
+            self.calls += 1
+            if self.calls <= self.fail_times:
+                raise IOError("磁盘暂时不可用")
+            self.values.extend(values)
+
+
+def test_close_racing_with_submit_loses_nothing():
+    for _ in range(20):
+        recorder = Recorder()
+        writer = WriteBehindQueue(recorder, max_items=4, max_batch=8, max_delay=0, put_timeout=0.01)
+        barrier = threading.Barrier(9)
+
+        def produce(worker):
+            barrier.wait()
+            for i in range(100):
+                writer.submit(("math", (worker, i)))
+
+        threads = [threading.Thread(target=produce, args=(worker,)) for worker in range(8)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        writer.close()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(recorder.values) == [(worker, i) for worker in range(8) for i in range(100)]
+
+
+def test_failed_group_is_spilled_and_retried(tmp_path):
+    spill_path = str(tmp_path / "pending.jsonl")
+    recorder = Recorder(fail_times=2)
+    writer = WriteBehindQueue(recorder, max_items=10, max_batch=10, max_delay=0, put_timeout=1,
+                              retries=1, spill_path=spill_path, retry_interval=3600)
+    writer.submit(("math", {"id": 1}))
+    writer.flush()
+    assert recorder.values == []
+    assert writer.stats()["spilled"] == 1
+
+    assert writer.retry_spilled() == 1
+    assert recorder.values == [{"id": 1}]
+    assert writer.stats()["spilled"] == 0
+    assert writer.stats()["failed"] == 0
+    writer.close()
+
+
+def test_spilled_data_is_written_by_next_instance(tmp_path):
+    spill_path = str(tmp_path / "pending.jsonl")
+    failing = Recorder(fail_times=100)
+    writer = WriteBehindQueue(failing, max_items=10, max_batch=10, max_delay=0, put_timeout=1,
+                              retries=0, spill_path=spill_path, retry_interval=3600)
+    writer.submit(("math", {"id": 1}))
+    writer.submit(("history", {"id": 2}))
+    writer.close()
+    assert failing.values == []
+
+    # 进程重启后，后台线程启动时重新写入暂存的数据
+    recorder = Recorder()
+    writer = WriteBehindQueue(recorder, max_items=10, max_batch=10, max_delay=0, put_timeout=1,
+                              spill_path=spill_path, retry_interval=3600)
+    writer.start()
+    writer.close()
+    assert sorted(recorder.values, key=lambda value: value["id"]) == [{"id": 1}, {"id": 2}]
+    assert not (tmp_path / "pending.jsonl").exists()
+    assert not (tmp_path / "pending.jsonl.retry").exists()
@@ -0,0 +1,666 @@
+"""
+向量存储抽象层。
+
+app.state.collection 持有一个 VectorStore 实例，具体后端由 config.VECTOR_STORE_BACKEND 决定：
+- "milvus": 连接 Milvus 服务器（原有实现）
+- "numpy":  进程内的NumPy矩阵，支持暴力搜索和IVF搜索，数据持久化到 .npy 快照和追加写入的日志文件，
+            适合小节点和CI等不部署Milvus服务器的环境
+
+每条记录带有 student_id 字段（默认空间为空字符串），搜索和删除可以限定在一个学生的数据中：
+Milvus 中 student_id 是分区键，NumPy 存储按学生维护行号列表。
+"""
+import os
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# 集合中的标量字段（embedding以外）
+SCALAR_FIELDS = ["id", "file_path", "keywords", "subject", "question_id", "knowledge_points", "question_type",
+                 "student_id"]
+
+# 插入时按需填充的可选字段：字段名 -> 缓冲行中的键
+OPTIONAL_INSERT_FIELDS = {
+    "keywords": "text_content",
+    "subject": "subject",
+    "question_id": "question_id",
+    "knowledge_points": "knowledge_points",
+    "question_type": "question_type",
+    "student_id": "student_id"
+}
+
+# 没有长度限制信息时使用的字段最大长度
+DEFAULT_MAX_LENGTH = 1000
+
+# NumPy存储的追加日志超过快照的行数（且至少达到这个行数）时，合并到快照中
+NUMPY_LOG_MIN_ROWS = 4096
+
+
+class CollectionMetadata:
+    """
+    集合结构的快照，创建（或重建）集合时生成一次，
+    插入和搜索直接使用这里预先算好的字段列表、截断长度和搜索参数，不再逐次查询集合结构
+    """
+
+    def __init__(self, field_names: List[str], max_lengths: Dict[str, int],
+                 search_params: Optional[Dict[str, Any]] = None):
+        self.field_names = list(field_names)
+        self.max_lengths = dict(max_lengths)
+        self.search_params = search_params
+        self.has_subject = "subject" in self.field_names
+        self.has_student = "student_id" in self.field_names
+
+        # keywords字段预留一些空间，其他字段按最大长度截断
+        keywords_max_length = self.max_lengths.get("keywords") or DEFAULT_MAX_LENGTH
+        self.keywords_safe_length = max(keywords_max_length - 100, 100)
+
+        # 插入模板：(字段名, 缓冲行中的键, 截断长度)，只包含集合中存在的可选字段
+        self.insert_template = []
+        for field, row_key in OPTIONAL_INSERT_FIELDS.items():
+            if field not in self.field_names:
+                continue
+            if field == "keywords":
+                limit = self.keywords_safe_length
+            elif field == "subject":
+                limit = None
+            else:
+                limit = self.max_lengths.get(field) or DEFAULT_MAX_LENGTH
+            self.insert_template.append((field, row_key, limit))
+
+        # 搜索结果定位题目需要的输出字段
+        self.hit_output_fields = ["file_path"] + (["question_id"] if "question_id" in self.field_names else [])
+
+
+class VectorStore(ABC):
+    """向量存储接口"""
+
+    metadata: CollectionMetadata
+
+    @property
+    def field_names(self) -> List[str]:
+        """集合中的字段名列表"""
+        return self.metadata.field_names
+
+    def get_field_max_length(self, field_name: str) -> Optional[int]:
+        """字符串字段的最大长度，不存在或无限制时返回None"""
+        return self.metadata.max_lengths.get(field_name)
+
+    @abstractmethod
+    def refresh_metadata(self):
+        """重新读取集合结构（集合重建或结构变化后调用）"""
+
+    @abstractmethod
+    def insert(self, data: Dict[str, List[Any]]):
+        """按列插入数据，data为 字段名 -> 值列表，集合中不存在的字段会被忽略"""
+
+    @abstractmethod
+    def search(self, vector: List[float], limit: int, subject: Optional[str] = None,
+               output_fields: Optional[List[str]] = None, student_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        向量搜索，返回按距离升序排列的命中结果
+        每个结果包含 id、distance 以及 output_fields 中的字段
+        student_id 不为None时只搜索该学生的数据（默认空间为空字符串）
+        """
+
+    @abstractmethod
+    def delete_student(self, student_id: str):
+        """删除一个学生的所有数据"""
+
+    @abstractmethod
+    def delete_files(self, file_paths: List[str]):
+        """删除指定文档（按 file_path）的所有向量，文档被修改或删除时调用"""
+
+    def flush(self):
+        """持久化尚未保存的数据"""
+
+    @abstractmethod
+    def reset(self):
+        """删除所有数据并重建空集合"""
+
+
+class MilvusVectorStore(VectorStore):
+    """基于Milvus服务器的向量存储"""
+
+    def __init__(self):
+        self.collection = self._init_collection()
+        self.refresh_metadata()
+
+    def _init_collection(self):
+        from pymilvus import Collection, connections, utility, FieldSchema, CollectionSchema, DataType
+
+        try:
+            # Connect to Milvus server
+            connections.connect(
+                alias="default",
+                host=config.MILVUS_HOST,
+                port=config.MILVUS_PORT
+            )
+            logger.info(f"成功连接到Milvus服务器: {config.MILVUS_HOST}:{config.MILVUS_PORT}")
+
+            # Check if collection exists, if not create it
+            if not utility.has_collection(config.COLLECTION_NAME):
+                logger.info(f"创建新的Milvus集合: {config.COLLECTION_NAME}")
+                # Define fields for the collection
+                fields = [
+                    FieldSchema(name="id", dtype=DataType.VARCHAR, is_primary=True, max_length=100),
+                    FieldSchema(name="file_path", dtype=DataType.VARCHAR, max_length=500),
+                    FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=config.EMBEDDING_DIM),
+                    FieldSchema(name="keywords", dtype=DataType.VARCHAR, max_length=4000),  # 进一步增加最大长度以支持更长的文本
+                    FieldSchema(name="subject", dtype=DataType.VARCHAR, max_length=50),  # 确保添加学科字段
+                    # 逐题索引：每道题一条记录
+                    FieldSchema(name="question_id", dtype=DataType.VARCHAR, max_length=100),
+                    FieldSchema(name="knowledge_points", dtype=DataType.VARCHAR, max_length=1000),
+                    FieldSchema(name="question_type", dtype=DataType.VARCHAR, max_length=50),
+                    # 分区键：按学生哈希到固定数量的分区，按学生搜索时只扫描对应的分区
+                    FieldSchema(name="student_id", dtype=DataType.VARCHAR, max_length=64, is_partition_key=True),
+                ]
+
+                # Create collection schema
+                schema = CollectionSchema(fields=fields, description="Wrong documents collection")
+
+                # Create collection
+                collection = Collection(name=config.COLLECTION_NAME, schema=schema,
+                                        num_partitions=config.MILVUS_NUM_PARTITIONS)
+
+                # 创建索引
+                index_params = {
+                    "metric_type": "L2",
+                    "index_type": "IVF_FLAT",
+                    "params": {"nlist": config.IVF_NLIST}
+                }
+                collection.create_index(field_name="embedding", index_params=index_params)
+                logger.info(f"创建索引成功")
+            else:
+                # Get existing collection
+                logger.info(f"使用现有的Milvus集合: {config.COLLECTION_NAME}")
+                collection = Collection(name=config.COLLECTION_NAME)
+
+                # 检查现有集合的字段结构
+                schema = collection.schema
+                field_names = [field.name for field in schema.fields]
+                logger.info(f"现有集合字段: {field_names}")
+
+                # 如果keywords字段长度不足，提示用户
+                if "keywords" in field_names:
+                    keywords_field = next((f for f in schema.fields if f.name == "keywords"), None)
+                    if keywords_field and hasattr(keywords_field, 'max_length'):
+                        logger.warning(f"警告: 'keywords'字段最大长度为{keywords_field.max_length}，可能导致长文本被截断")
+
+                # 如果缺少subject字段，记录警告
+                if "subject" not in field_names:
+                    logger.warning(f"警告: 现有集合缺少'subject'字段，某些功能可能无法正常工作")
+
+                # 旧集合没有逐题字段，搜索结果只能定位到文件
+                if "question_id" not in field_names:
+                    logger.warning(f"警告: 现有集合缺少'question_id'字段，需要清理后重新导入才能按题目搜索")
+
+                # 旧集合没有分区键，按学生搜索时会扫描所有学生的数据
+                if "student_id" not in field_names:
+                    logger.warning(f"警告: 现有集合缺少'student_id'字段，需要清理后重新导入才能按学生分区搜索")
+
+            # Load collection
+            collection.load()
+            logger.info(f"Milvus集合加载成功")
+            return collection
+        except Exception as e:
+            logger.error(f"初始化Milvus时出错: {str(e)}")
+            raise
+
+    def refresh_metadata(self):
+        fields = self.collection.schema.fields
+        max_lengths = {}
+        for field in fields:
+            # 字符串字段的最大长度保存在 max_length 属性或 params 中
+            max_length = getattr(field, 'max_length', None) or (getattr(field, 'params', None) or {}).get('max_length')
+            if max_length:
+                max_lengths[field.name] = int(max_length)
+        self.metadata = CollectionMetadata(
+            [field.name for field in fields],
+            max_lengths,
+            {"metric_type": "L2", "params": {"nprobe": config.IVF_NPROBE}}
+        )
+        logger.info(f"集合结构已缓存: {self.metadata.field_names}")
+
+    def insert(self, data: Dict[str, List[Any]]):
+        # 根据集合结构按字段顺序构造插入列表
+        insert_data = [data[field] for field in self.metadata.field_names if field in data]
+        if insert_data:
+            try:
+                self.collection.insert(insert_data)
+            except Exception:
+                # 集合结构可能已被外部修改，重新读取后由调用方重试
+                self.refresh_metadata()
+                raise
+
+    def search(self, vector: List[float], limit: int, subject: Optional[str] = None,
+               output_fields: Optional[List[str]] = None, student_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        output_fields = list(output_fields or [])
+
+        # 构建查询表达式，如果指定了学科，则按学科筛选
+        conditions = []
+        if subject:
+            if self.metadata.has_subject:
+                conditions.append(f'subject == "{subject}"')
+            else:
+                logger.warning(f"集合中不存在subject字段，无法按学科筛选")
+        # 按分区键过滤时Milvus只搜索该学生所在的分区
+        if student_id is not None and self.metadata.has_student:
+            conditions.append(f'student_id == "{student_id}"')
+        expr = " and ".join(conditions) or None
+
+        results = self.collection.search(
+            data=[vector],
+            anns_field="embedding",
+            param=self.metadata.search_params,
+            limit=limit,
+            output_fields=output_fields,
+            expr=expr
+        )
+
+        hits = []
+        for hit in results[0]:
+            item = {"id": hit.id, "distance": hit.distance}
+            for field in output_fields:
+                item[field] = hit.entity.get(field)
+            hits.append(item)
+        return hits
+
+    def delete_student(self, student_id: str):
+        if not self.metadata.has_student:
+            raise ValueError("集合中不存在student_id字段，无法按学生删除")
+        self.collection.delete(f'student_id == "{student_id}"')
+
+    def delete_files(self, file_paths: List[str]):
+        if not file_paths:
+            return
+        # JSON字符串列表就是Milvus表达式中的字符串列表
+        self.collection.delete(f"file_path in {json.dumps(list(file_paths), ensure_ascii=False)}")
+
+    def reset(self):
+        from pymilvus import utility
+
+        # 由于Milvus可能会限制删除方式，我们释放并删除整个集合后重建
+        self.collection.release()
+        utility.drop_collection(config.COLLECTION_NAME)
+        logger.info(f"删除并重建Milvus集合: {config.COLLECTION_NAME}")
+        self.collection = self._init_collection()
+        self.refresh_metadata()
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    进程内的NumPy向量存储
+    向量保存在 (n, dim) 的float32矩阵中，标量字段保存在并列的列表中，
+    数据量达到阈值后训练k-means质心，搜索时只扫描最近的nprobe个簇
+    按学生维护行号列表，按学生搜索时只计算该学生的向量
+
+    持久化：快照（.npy 向量矩阵和 .json 标量字段）加追加日志（.log.bin 原始float32向量和 .log.jsonl 每行一条记录），
+    flush() 只把新插入的行追加到日志，写入量与插入量成正比；日志行数超过快照时合并为新的快照。
+    删除数据后下一次 flush() 重写快照。快照记录日志的代数，重写快照后开始新一代日志，
+    旧日志即使因为中途退出没有删除也不会被重放
+    """
+
+    def __init__(self, path: Optional[str] = None, dim: Optional[int] = None,
+                 index_type: Optional[str] = None, nlist: Optional[int] = None,
+                 nprobe: Optional[int] = None):
+        self.path = path if path is not None else config.NUMPY_STORE_PATH
+        self.dim = dim or config.EMBEDDING_DIM
+        self.index_type = index_type or config.NUMPY_INDEX_TYPE
+        self.nlist = nlist or config.IVF_NLIST
+        self.nprobe = nprobe or config.IVF_NPROBE
+        self._lock = threading.RLock()
+        self._log_generation = 0
+        self.refresh_metadata()
+        self._clear()
+        self._load()
+
+    def _clear(self):
+        # 向量、学科编码和簇编号使用按倍数扩容的缓冲区，插入时不需要复制整个矩阵
+        self._size = 0
+        self._vector_buffer = np.zeros((0, self.dim), dtype=np.float32)
+        self._subject_buffer = np.zeros(0, dtype=np.int32)
+        self._assignment_buffer = np.zeros(0, dtype=np.int64)
+        self._subject_codes: Dict[str, int] = {}
+        self._student_rows: Dict[str, List[int]] = {}
+        self._student_arrays: Dict[str, np.ndarray] = {}
+        self._columns: Dict[str, List[Any]] = {field: [] for field in SCALAR_FIELDS}
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+        # 已经保存到快照和日志中的行数，之后的行在 flush() 时追加到日志
+        self._persisted = 0
+        self._snapshot_size = 0
+        # 内存中的数据不再以磁盘上的数据开头（删除了数据），需要重写快照
+        self._rewrite = False
+
+    @property
+    def _vectors(self) -> np.ndarray:
+        return self._vector_buffer[:self._size]
+
+    @property
+    def _subjects(self) -> np.ndarray:
+        return self._subject_buffer[:self._size]
+
+    @property
+    def _assignments(self) -> np.ndarray:
+        return self._assignment_buffer[:self._size]
+
+    def _reserve(self, capacity: int):
+        """确保缓冲区至少能容纳capacity条数据"""
+        if capacity <= len(self._vector_buffer):
+            return
+        new_capacity = max(capacity, 2 * len(self._vector_buffer), 1024)
+        for name in ("_vector_buffer", "_subject_buffer", "_assignment_buffer"):
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _append(self, vectors: np.ndarray, subjects: List[str], students: List[str]):
+        """追加向量、学科和学生，若已训练质心则同时分配到最近的簇"""
+        count = len(vectors)
+        self._reserve(self._size + count)
+        start, end = self._size, self._size + count
+        for row, student_id in enumerate(students, start):
+            self._student_rows.setdefault(student_id, []).append(row)
+            self._student_arrays.pop(student_id, None)
+        self._vector_buffer[start:end] = vectors
+        self._subject_buffer[start:end] = [
+            self._subject_codes.setdefault(subject, len(self._subject_codes)) for subject in subjects
+        ]
+        if self._centroids is not None:
+            self._assignment_buffer[start:end] = self._nearest(vectors, self._centroids)
+        self._size = end
+
+    @property
+    def _vectors_file(self) -> str:
+        return f"{self.path}.npy"
+
+    @property
+    def _meta_file(self) -> str:
+        return f"{self.path}.json"
+
+    def _log_files(self, generation: int) -> List[str]:
+        """一代追加日志的 [向量文件, 字段文件]"""
+        return [f"{self.path}.{generation}.log.bin", f"{self.path}.{generation}.log.jsonl"]
+
+    @property
+    def _log_vectors_file(self) -> str:
+        return self._log_files(self._log_generation)[0]
+
+    @property
+    def _log_meta_file(self) -> str:
+        return self._log_files(self._log_generation)[1]
+
+    def _remove_files(self, file_paths: List[str]):
+        for file_path in file_paths:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def _load(self):
+        """从快照恢复数据，再重放追加日志"""
+        if not self.path:
+            logger.info("NumPy向量存储未配置文件路径，数据只保存在内存中")
+            return
+        if os.path.exists(self._vectors_file):
+            vectors = np.load(self._vectors_file)
+            with open(self._meta_file, 'r', encoding='utf-8') as f:
+                columns = json.load(f)
+            if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+                raise ValueError(f"向量文件 {self._vectors_file} 的维度{vectors.shape}与配置的向量维度{self.dim}不一致")
+            # 旧版本文件中缺少的字段补为空字符串
+            self._columns = {field: list(columns.get(field, [""] * len(vectors))) for field in SCALAR_FIELDS}
+            self._append(vectors.astype(np.float32), self._columns["subject"], self._columns["student_id"])
+            self._snapshot_size = self._size
+            self._log_generation = columns.get("log_generation", 0)
+            if self._log_generation:
+                # 上一次重写快照后没来得及删除的旧日志
+                self._remove_files(self._log_files(self._log_generation - 1))
+        self._load_log()
+        self._persisted = self._size
+        if not self._size:
+            logger.info(f"NumPy向量存储为空: {self.path}")
+            return
+        self._train_if_needed()
+        logger.info(f"NumPy向量存储加载成功: {self.path}，共 {self._size} 条向量（日志中 {self._size - self._snapshot_size} 条）")
+
+    def _load_log(self):
+        """重放追加日志；进程在写入日志时退出留下的不完整记录被丢弃，下一次 flush() 重写快照"""
+        if not os.path.exists(self._log_vectors_file) or not os.path.exists(self._log_meta_file):
+            self._rewrite = os.path.exists(self._log_vectors_file) or os.path.exists(self._log_meta_file)
+            return
+        raw = np.fromfile(self._log_vectors_file, dtype=np.float32)
+        rows = []
+        with open(self._log_meta_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    break
+        count = min(len(raw) // self.dim, len(rows))
+        if count != len(rows) or count * self.dim != len(raw):
+            logger.warning(f"NumPy向量存储的追加日志不完整，只恢复前 {count} 条记录")
+            self._rewrite = True
+        if not count:
+            return
+        rows = rows[:count]
+        for field in SCALAR_FIELDS:
+            self._columns[field].extend(row.get(field, "") for row in rows)
+        self._append(raw[:count * self.dim].reshape(count, self.dim),
+                     [row.get("subject", "") for row in rows], [row.get("student_id", "") for row in rows])
+
+    def refresh_metadata(self):
+        # 字段固定，没有长度限制
+        self.metadata = CollectionMetadata(["id", "file_path", "embedding"] + SCALAR_FIELDS[2:], {})
+
+    def __len__(self) -> int:
+        return self._size
+
+    def insert(self, data: Dict[str, List[Any]]):
+        vectors = np.asarray(data["embedding"], dtype=np.float32).reshape(-1, self.dim)
+        count = len(vectors)
+        with self._lock:
+            for field in SCALAR_FIELDS:
+                self._columns[field].extend(data.get(field, [""] * count))
+            # 新数据分配到最近的质心，数据量翻倍时重新训练
+            self._append(vectors, data.get("subject", [""] * count), data.get("student_id", [""] * count))
+            self._train_if_needed()
+
+    @staticmethod
+    def _squared_distances(vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """计算一组向量到查询向量的L2距离平方"""
+        diff = vectors - query
+        return np.einsum('ij,ij->i', diff, diff)
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """计算每个向量最近的质心编号"""
+        distances = (
+            np.einsum('ij,ij->i', vectors, vectors)[:, None]
+            - 2 * vectors @ centroids.T
+            + np.einsum('ij,ij->i', centroids, centroids)[None, :]
+        )
+        return distances.argmin(axis=1)
+
+    def _train_if_needed(self):
+        """IVF索引：数据量足够且较上次训练翻倍时重新训练质心"""
+        n = len(self._vectors)
+        if self.index_type != "IVF_FLAT" or n < self.nlist * config.NUMPY_IVF_MIN_POINTS_PER_LIST:
+            self._centroids = None
+            return
+        if self._centroids is not None and n < self._trained_size * 2:
+            return
+        self._centroids, self._assignment_buffer[:n] = self._kmeans(self._vectors, self.nlist)
+        self._trained_size = n
+        logger.info(f"IVF质心训练完成: {self.nlist} 个簇，{n} 条向量")
+
+    @classmethod
+    def _kmeans(cls, vectors: np.ndarray, k: int, iterations: int = 10):
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+        assignments = cls._nearest(vectors, centroids)
+        for _ in range(iterations):
+            for c in range(k):
+                members = vectors[assignments == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            new_assignments = cls._nearest(vectors, centroids)
+            if np.array_equal(new_assignments, assignments):
+                break
+            assignments = new_assignments
+        return centroids, assignments
+
+    def _rows_of(self, student_id: str) -> np.ndarray:
+        """学生的行号数组，按需从行号列表生成并缓存"""
+        rows = self._student_arrays.get(student_id)
+        if rows is None:
+            rows = np.asarray(self._student_rows.get(student_id, []), dtype=np.int64)
+            self._student_arrays[student_id] = rows
+        return rows
+
+    def search(self, vector: List[float], limit: int, subject: Optional[str] = None,
+               output_fields: Optional[List[str]] = None, student_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if not len(self._vectors):
+                return []
+            if student_id is not None:
+                # 只在该学生的行中搜索
+                candidates = self._rows_of(student_id)
+            else:
+                candidates = np.arange(len(self._vectors))
+
+            # IVF：只在距离查询向量最近的nprobe个簇中搜索
+            if self._centroids is not None and len(candidates):
+                probes = np.argsort(self._squared_distances(self._centroids, query))[:self.nprobe]
+                candidates = candidates[np.isin(self._assignments[candidates], probes)]
+
+            # 按学科筛选
+            if subject:
+                code = self._subject_codes.get(subject)
+                if code is None:
+                    return []
+                candidates = candidates[self._subjects[candidates] == code]
+            if not len(candidates):
+                return []
+
+            distances = self._squared_distances(self._vectors[candidates], query)
+            k = min(limit, len(candidates))
+            # 距离相同的向量按插入顺序排列，保证不同limit下的结果顺序一致（分页依赖这一点）
+            threshold = np.partition(distances, k - 1)[k - 1]
+            top = np.flatnonzero(distances <= threshold)
+            top = top[np.lexsort((candidates[top], distances[top]))][:k]
+
+            hits = []
+            for i in top:
+                row = candidates[i]
+                item = {"id": self._columns["id"][row], "distance": float(distances[i])}
+                for field in output_fields or []:
+                    if field in self._columns:
+                        item[field] = self._columns[field][row]
+                hits.append(item)
+            return hits
+
+    def flush(self):
+        """把新插入的行追加到日志；删除过数据或日志行数超过快照时重写快照"""
+        with self._lock:
+            if not self.path or (self._persisted == self._size and not self._rewrite):
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            log_rows = self._size - self._snapshot_size
+            if self._rewrite or log_rows > max(self._snapshot_size, NUMPY_LOG_MIN_ROWS):
+                self._write_snapshot()
+                return
+            try:
+                self._append_log()
+            except Exception:
+                # 日志中可能只写入了一部分，下一次重写快照
+                self._rewrite = True
+                raise
+
+    def _append_log(self):
+        """把尚未保存的行追加到日志（需要持有锁），先写向量再写字段，恢复时按两者中较少的行数对齐"""
+        start, end = self._persisted, self._size
+        with open(self._log_vectors_file, 'ab') as f:
+            f.write(self._vector_buffer[start:end].tobytes())
+        lines = [json.dumps({field: self._columns[field][row] for field in SCALAR_FIELDS}, ensure_ascii=False) + "\n"
+                 for row in range(start, end)]
+        with open(self._log_meta_file, 'a', encoding='utf-8') as f:
+            f.writelines(lines)
+        self._persisted = end
+
+    def _write_snapshot(self):
+        """把全部数据保存为快照并删除日志（需要持有锁）"""
+        # 先写临时文件再替换，避免写入中途崩溃导致文件损坏
+        # np.save 会给没有 .npy 后缀的文件名自动补上后缀
+        np.save(f"{self.path}.tmp.npy", self._vectors)
+        with open(f"{self._meta_file}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({**self._columns, "log_generation": self._log_generation + 1}, f, ensure_ascii=False)
+        os.replace(f"{self.path}.tmp.npy", self._vectors_file)
+        os.replace(f"{self._meta_file}.tmp", self._meta_file)
+        # 新快照已经包含旧日志中的数据，之后追加到下一代日志
+        old_logs = self._log_files(self._log_generation)
+        self._log_generation += 1
+        self._remove_files(old_logs + self._log_files(self._log_generation))
+        self._snapshot_size = self._persisted = self._size
+        self._rewrite = False
+
+    def delete_student(self, student_id: str):
+        with self._lock:
+            rows = self._student_rows.get(student_id)
+            if not rows:
+                return
+            keep = np.ones(self._size, dtype=bool)
+            keep[rows] = False
+            self._keep_rows(keep)
+        logger.info(f"NumPy向量存储已删除学生 {student_id} 的 {len(rows)} 条向量")
+
+    def delete_files(self, file_paths: List[str]):
+        paths = set(file_paths)
+        if not paths:
+            return
+        with self._lock:
+            keep = np.fromiter((path not in paths for path in self._columns["file_path"]),
+                               dtype=bool, count=self._size)
+            removed = self._size - int(keep.sum())
+            if not removed:
+                return
+            self._keep_rows(keep)
+        logger.info(f"NumPy向量存储已删除 {len(paths)} 个文档的 {removed} 条向量")
+
+    def _keep_rows(self, keep: np.ndarray):
+        """只保留 keep 为True的行（需要持有锁）"""
+        vectors = self._vectors[keep]
+        columns = {field: [value for value, kept in zip(values, keep) if kept]
+                   for field, values in self._columns.items()}
+        # 重新追加保留的数据，质心按剩余数据重新训练
+        self._clear()
+        self._columns = columns
+        self._append(vectors, columns["subject"], columns["student_id"])
+        self._train_if_needed()
+        self._rewrite = True
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+            self._remove_files([self._vectors_file, self._meta_file] + self._log_files(self._log_generation))
+            self._log_generation = 0
+        logger.info(f"NumPy向量存储已清空: {self.path}")
+
+
+def create_vector_store(backend: Optional[str] = None) -> VectorStore:
+    """根据配置创建向量存储"""
+    backend = backend or config.VECTOR_STORE_BACKEND
+    if backend == "milvus":
+        return MilvusVectorStore()
+    if backend == "numpy":
+        return NumpyVectorStore()
+    raise ValueError(f"未知的向量存储后端: {backend}，可选: milvus, numpy")
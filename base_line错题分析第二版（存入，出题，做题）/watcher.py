@@ -0,0 +1,301 @@
+"""
+监视存储目录的变化。
+
+Linux 上通过 ctypes 调用 inotify（不需要额外的依赖），在事件循环中注册文件描述符读取事件；
+inotify 不可用时（非Linux系统、监视数量超过 fs.inotify.max_user_watches 等）退回到定期扫描目录的
+(mtime, size) 快照。一段时间内连续到达的事件合并为一次回调（防抖），
+回调参数是每个根目录下发生变化的文件，由调用方只同步这些文件。
+
+段文件存储的目录（.segments）和索引数据库不在监视范围内，服务自己写入文档不会触发同步；
+其他进程写入段文件存储的文档通过存储的变更记录发现（watch_change_logs）。
+"""
+import os
+import errno
+import struct
+import asyncio
+import logging
+import ctypes
+import ctypes.util
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import config
+from io_pool import run_io
+from document_store import SEGMENT_DIR_NAME, DocumentStore
+
+logger = logging.getLogger(__name__)
+
+# inotify 事件掩码（linux/inotify.h）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event 的固定部分：wd, mask, cookie, len
+_EVENT = struct.Struct("iIII")
+
+# 锁文件、临时文件和SQLite日志的变化不代表数据变化
+IGNORED_SUFFIXES = (".lock", ".tmp", "-journal", "-wal", "-shm")
+IGNORED_PREFIXES = ("index.db",)
+# 段文件存储由服务自己写入，不监视
+EXCLUDED_DIRS = (SEGMENT_DIR_NAME,)
+
+# 根目录 -> 变化的文件（相对于根目录的路径），None 表示不知道哪些文件变化了，需要全部重新同步
+Changes = Dict[str, Optional[Set[str]]]
+
+
+def is_ignored(name: str) -> bool:
+    return name.endswith(IGNORED_SUFFIXES) or name.startswith(IGNORED_PREFIXES)
+
+
+def walk_files(directory: str) -> Iterable[Tuple[str, List[str]]]:
+    """遍历目录，跳过不监视的目录，返回 (目录, 文件名列表)"""
+    for current, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
+        yield current, files
+
+
+def merge_changes(changes: Changes, more: Changes):
+    """把 more 合并到 changes 中"""
+    for root, paths in more.items():
+        if paths is None or root in changes and changes[root] is None:
+            changes[root] = None
+        else:
+            changes.setdefault(root, set()).update(paths)
+
+
+class InotifyWatcher:
+    """递归监视多个根目录，新建的子目录自动加入监视"""
+
+    def __init__(self, roots: Iterable[str]):
+        self.roots = list(roots)
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1失败: {os.strerror(error)}")
+        self._fd = fd
+        self._watches: Dict[int, Tuple[str, str]] = {}  # 监视描述符 -> (根目录, 目录)
+        try:
+            for root in self.roots:
+                os.makedirs(root, exist_ok=True)
+                self._add_tree(root, root)
+        except Exception:
+            self.close()
+            raise
+
+    def _add_tree(self, root: str, directory: str) -> List[str]:
+        """监视目录及其子目录，返回其中已有的文件"""
+        existing = []
+        for current, files in walk_files(directory):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOENT:
+                    # 目录在遍历过程中被删除
+                    continue
+                raise OSError(error, f"监视目录失败: {os.strerror(error)}", current)
+            self._watches[wd] = (root, current)
+            existing.extend(os.path.join(current, f) for f in files if not is_ignored(f))
+        return existing
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def read_changes(self) -> Changes:
+        """读取所有已到达的事件，返回每个根目录下发生变化的文件"""
+        changed: Changes = {}
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0"))
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # 事件队列溢出，不知道哪些目录变化了
+                    logger.warning("inotify事件队列溢出，重新同步所有目录")
+                    merge_changes(changed, {root: None for root in self.roots})
+                    continue
+                watch = self._watches.get(wd)
+                if watch is None:
+                    continue
+                if mask & IN_IGNORED:
+                    # 目录已被删除
+                    del self._watches[wd]
+                    continue
+                root, directory = watch
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and name not in EXCLUDED_DIRS:
+                        # 新目录中可能已经写入了文件，加入监视后按变化处理
+                        paths = self._add_tree(root, os.path.join(directory, name))
+                        merge_changes(changed, {root: {os.path.relpath(path, root) for path in paths}})
+                    elif mask & IN_MOVED_FROM and name not in EXCLUDED_DIRS:
+                        # 移走的目录中有哪些文件已经无法得知
+                        merge_changes(changed, {root: None})
+                    continue
+                if is_ignored(name):
+                    continue
+                merge_changes(changed, {root: {os.path.relpath(os.path.join(directory, name), root)}})
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """定期扫描根目录下所有文件的 (mtime, size)，与上一次的快照对比"""
+
+    def __init__(self, roots: Iterable[str]):
+        self.roots = list(roots)
+        self._snapshots = {root: self._snapshot(root) for root in self.roots}
+
+    @staticmethod
+    def _snapshot(root: str) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for directory, files in walk_files(root):
+            for file_name in files:
+                if is_ignored(file_name):
+                    continue
+                path = os.path.join(directory, file_name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                snapshot[os.path.relpath(path, root)] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def poll(self) -> Changes:
+        """返回自上一次扫描以来每个根目录下新增、修改或删除的文件（需要通过 run_io 调用）"""
+        changed: Changes = {}
+        for root in self.roots:
+            snapshot = self._snapshot(root)
+            previous = self._snapshots[root]
+            paths = {path for path in snapshot.keys() | previous.keys() if snapshot.get(path) != previous.get(path)}
+            if paths:
+                changed[root] = paths
+            self._snapshots[root] = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(roots: List[str], backend: Optional[str] = None):
+    """backend 为 auto 时优先使用inotify，不可用时使用轮询"""
+    backend = backend or config.WATCH_BACKEND
+    if backend in ("auto", "inotify"):
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError) as e:
+            if backend == "inotify":
+                raise
+            logger.warning(f"inotify不可用，改为每 {config.WATCH_POLL_INTERVAL} 秒扫描一次目录: {str(e)}")
+    elif backend != "polling":
+        raise ValueError(f"不支持的目录监视方式: {backend}")
+    return PollingWatcher(roots)
+
+
+async def watch_directories(roots: List[str], on_change: Callable[[Changes], Awaitable[None]],
+                            debounce: Optional[float] = None, max_delay: Optional[float] = None):
+    """
+    持续监视根目录，直到任务被取消
+    收到事件后等待 debounce 秒没有新事件再调用 on_change，持续有事件时最多等待 max_delay 秒；
+    on_change 执行期间到达的事件合并到下一次回调
+    """
+    debounce = config.WATCH_DEBOUNCE if debounce is None else debounce
+    max_delay = config.WATCH_MAX_DELAY if max_delay is None else max_delay
+    loop = asyncio.get_running_loop()
+    watcher = await run_io(create_watcher, roots)
+    changed: Changes = {}
+    arrived = asyncio.Event()
+
+    def record(more: Changes):
+        if more:
+            merge_changes(changed, more)
+            arrived.set()
+
+    poller = None
+    if isinstance(watcher, InotifyWatcher):
+        loop.add_reader(watcher.fileno(), lambda: record(watcher.read_changes()))
+        logger.info(f"开始通过inotify监视目录: {roots}")
+    else:
+        async def poll():
+            while True:
+                await asyncio.sleep(config.WATCH_POLL_INTERVAL)
+                try:
+                    record(await run_io(watcher.poll))
+                except Exception as e:
+                    logger.error(f"扫描目录失败: {str(e)}")
+        poller = asyncio.ensure_future(poll())
+        logger.info(f"开始通过轮询监视目录: {roots}")
+
+    try:
+        while True:
+            await arrived.wait()
+            # 防抖：一段时间内没有新事件，或等待时间达到上限后处理
+            deadline = loop.time() + max_delay
+            while True:
+                arrived.clear()
+                timeout = min(debounce, deadline - loop.time())
+                if timeout <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(arrived.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            batch = dict(changed)
+            changed.clear()
+            arrived.clear()
+            try:
+                await on_change(batch)
+            except Exception as e:
+                logger.error(f"处理目录变化失败: {str(e)}")
+    finally:
+        if poller is not None:
+            poller.cancel()
+        else:
+            loop.remove_reader(watcher.fileno())
+        watcher.close()
+
+
+async def watch_change_logs(stores: Dict[str, DocumentStore], cursors: Dict[str, int],
+                            on_change: Callable[[Changes], Awaitable[None]], interval: Optional[float] = None):
+    """
+    每隔 interval 秒读取文档存储的变更记录，直到任务被取消
+    其他进程写入或删除的文档名按 {根目录: 文档名} 交给 on_change；cursors 为开始同步时的变更记录位置
+    """
+    interval = config.WATCH_POLL_INTERVAL if interval is None else interval
+    cursors = dict(cursors)
+    while True:
+        await asyncio.sleep(interval)
+        changed: Changes = {}
+        for root, store in stores.items():
+            try:
+                names, cursors[root] = await run_io(store.changes_since, cursors[root])
+            except Exception as e:
+                logger.error(f"读取文档存储的变更记录失败: {str(e)}")
+                continue
+            if names:
+                changed[root] = set(names)
+        if changed:
+            try:
+                await on_change(changed)
+            except Exception as e:
+                logger.error(f"处理文档存储变化失败: {str(e)}")
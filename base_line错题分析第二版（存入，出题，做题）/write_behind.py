@@ -0,0 +1,232 @@
+"""
+后台批量写入队列（write-behind）。
+
+请求线程把要保存的数据放入内存中的有界队列后立即返回，不等待磁盘写入；
+后台线程取出已到达的数据，按键（如错题的科目）分组，每组调用一次写入函数（组提交）。
+写入慢时队列中积累的数据变多，下一批就更大，单次写入的开销被更多数据分摊。
+
+队列满时提交最多等待一段时间，仍然满时由请求线程直接写入，写入速度跟不上时把压力反馈给请求，
+内存占用不会无限增长。关闭时写完队列中的所有数据再退出。
+
+重试后仍然写入失败的数据追加到暂存文件（spill_path，每行一个 [键, [数据, ...]]），
+后台线程启动时和空闲时重新写入暂存的数据，数据不会因为一次写入失败而丢失。
+"""
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 通知后台线程退出的标记
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """
+    submit((键, 数据)) 入队后立即返回，后台线程调用 write_group(键, [数据, ...]) 写入
+    写入失败时重试 retries 次，仍然失败的数据保存到 spill_path 稍后重试（键和数据需要可以JSON序列化）
+    """
+
+    def __init__(self, write_group: Callable[[Hashable, List[Any]], None], max_items: int,
+                 max_batch: int, max_delay: float, put_timeout: float, retries: int = 3,
+                 spill_path: Optional[str] = None, retry_interval: float = 60.0,
+                 name: str = "write-behind"):
+        self.write_group = write_group
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self.spill_path = spill_path
+        self.retry_interval = retry_interval
+        self.name = name
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_items)
+        # 统计数据的锁，后台线程写入时也会获取
+        self._lock = threading.Lock()
+        # 关闭状态和正在入队的提交数，close() 等待正在入队的提交完成后才放入退出标记
+        self._state = threading.Condition(threading.Lock())
+        self._submitting = 0
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.written = 0
+        self.batches = 0
+        self.direct = 0
+        self.spilled = 0
+        self.failed = 0
+
+    def start(self):
+        """启动后台写入线程（第一次提交时自动启动）"""
+        with self._state:
+            self._start_locked()
+
+    def _start_locked(self):
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, item: Tuple[Hashable, Any]):
+        """提交 (键, 数据)；队列满且等待超时，或队列已关闭时在当前线程直接写入"""
+        with self._state:
+            queued = not self._closed
+            if queued:
+                self._start_locked()
+                self._submitting += 1
+        if queued:
+            try:
+                self._queue.put(item, timeout=self.put_timeout)
+                return
+            except queue.Full:
+                logger.warning(f"{self.name} 队列已满，在请求线程中直接写入")
+            finally:
+                with self._state:
+                    self._submitting -= 1
+                    self._state.notify_all()
+        with self._lock:
+            self.direct += 1
+        self._write([item])
+
+    def _write(self, items: List[Tuple[Hashable, Any]]):
+        """按键分组写入，每组单独重试，一组失败不影响其他组；重试后仍然失败的组保存到暂存文件"""
+        groups: Dict[Hashable, List[Any]] = {}
+        for key, value in items:
+            groups.setdefault(key, []).append(value)
+        for key, values in groups.items():
+            for attempt in range(self.retries + 1):
+                try:
+                    self.write_group(key, values)
+                    with self._lock:
+                        self.written += len(values)
+                        self.batches += 1
+                    break
+                except Exception as e:
+                    if attempt == self.retries:
+                        logger.error(f"{self.name} 写入失败（{key}）: {str(e)}")
+                        self._spill(key, values)
+                    else:
+                        logger.warning(f"{self.name} 写入失败，第 {attempt + 1} 次重试（{key}）: {str(e)}")
+                        time.sleep(min(0.1 * 2 ** attempt, 2.0))
+
+    def _spill(self, key: Hashable, values: List[Any]):
+        """把写入失败的一组数据追加到暂存文件，暂存文件也无法写入时记录完整数据到日志"""
+        if self.spill_path:
+            try:
+                line = json.dumps([key, values], ensure_ascii=False) + "\n"
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                with self._lock:
+                    self.spilled += len(values)
+                logger.error(f"{self.name} 的 {len(values)} 条数据已暂存到 {self.spill_path}，稍后重试")
+                return
+            except (OSError, TypeError, ValueError) as e:
+                logger.error(f"{self.name} 暂存失败: {str(e)}")
+        with self._lock:
+            self.failed += len(values)
+        logger.error(f"{self.name} 丢弃 {len(values)} 条数据（{key}）: {values!r}")
+
+    def retry_spilled(self) -> int:
+        """
+        重新写入暂存文件中的数据，返回读取的数据条数（由后台线程调用）
+        先把暂存文件改名再写入，写入期间新失败的数据追加到新的暂存文件；
+        重试中途进程退出时保留改名后的文件，下一次启动时继续重试
+        """
+        if not self.spill_path:
+            return 0
+        retry_path = f"{self.spill_path}.retry"
+        try:
+            if not os.path.exists(retry_path):
+                if not os.path.exists(self.spill_path):
+                    return 0
+                os.replace(self.spill_path, retry_path)
+            items = []
+            with open(retry_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        key, values = json.loads(line)
+                    except ValueError:
+                        # 进程在写入暂存文件时退出，最后一行不完整
+                        logger.error(f"{self.name} 跳过暂存文件中不完整的一行: {line!r}")
+                        continue
+                    items.extend((key, value) for value in values)
+        except OSError as e:
+            logger.error(f"{self.name} 读取暂存文件失败: {str(e)}")
+            return 0
+        if items:
+            logger.info(f"{self.name} 重新写入暂存的 {len(items)} 条数据")
+            with self._lock:
+                self.spilled -= min(self.spilled, len(items))
+            self._write(items)
+        os.remove(retry_path)
+        return len(items)
+
+    def _run(self):
+        self.retry_spilled()
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.retry_interval)
+            except queue.Empty:
+                # 空闲时重试暂存的数据
+                self.retry_spilled()
+                continue
+            if item is _STOP:
+                self._queue.task_done()
+                break
+            batch = [item]
+            # 收集已经到达的数据，最多等待 max_delay 秒凑成一批
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self):
+        """等待已提交的数据全部写入"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """
+        停止接收新数据（之后的提交直接写入），写完队列中的数据后停止后台线程
+        退出标记在所有正在入队的提交完成之后放入，之前入队的数据都会被写入
+        """
+        with self._state:
+            if self._closed:
+                return
+            self._closed = True
+            while self._submitting:
+                self._state.wait()
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+        logger.info(f"{self.name} 已关闭，共写入 {self.written} 条数据")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": self._queue.qsize(),
+                "written": self.written,
+                "batches": self.batches,
+                "direct": self.direct,
+                "spilled": self.spilled,
+                "failed": self.failed
+            }